@@ -0,0 +1,90 @@
+"""
+Задержка обработки обновлений при 200 одновременных пользователях:
+синхронные вызовы SQLite в цикле событий против асинхронного репозитория.
+
+Каждое обновление ученика имитирует работу обработчика: сетевой round trip к Telegram,
+запрос к базе (у половины обновлений, остальные — навигация по меню) и ответ.
+Параллельно администратор периодически открывает полный список учеников — тяжёлый
+запрос, который в синхронном режиме останавливает цикл событий для всех.
+
+Запуск: python -m benchmarks.bench_async
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import database
+from benchmarks.seed import seed_database
+from connection import init_pool, close_pool
+from repository import Repository
+
+USERS = 200
+UPDATES_PER_USER = 20
+DB_SHARE = 0.5  # Доля обновлений, которые обращаются к базе
+ADMIN_REQUESTS = 5  # Сколько раз администратор открывает список учеников
+ADMIN_PAUSE = 0.2
+NETWORK_DELAY = 0.005  # Имитация запроса к Bot API
+
+
+class SyncAccess:
+    """Поведение до репозитория: запросы выполняются прямо в цикле событий."""
+
+    async def get_student_by_tg(self, telegram_id):
+        return database.get_student_by_telegram_id(telegram_id)
+
+    async def get_all_users(self):
+        return database.get_all_users()
+
+
+async def simulate(access, telegram_ids):
+    rnd = random.Random(7)
+    latencies = []
+
+    async def student(telegram_id):
+        for _ in range(UPDATES_PER_USER):
+            await asyncio.sleep(rnd.uniform(0, 0.1))  # Пауза между нажатиями
+            started = time.perf_counter()
+            await asyncio.sleep(NETWORK_DELAY)
+            if rnd.random() < DB_SHARE:
+                await access.get_student_by_tg(telegram_id)
+            await asyncio.sleep(NETWORK_DELAY)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    async def admin():
+        for _ in range(ADMIN_REQUESTS):
+            await asyncio.sleep(ADMIN_PAUSE)
+            await access.get_all_users()
+
+    await asyncio.gather(admin(), *(student(telegram_id) for telegram_id in rnd.sample(telegram_ids, USERS)))
+    latencies.sort()
+    return latencies
+
+
+def report(label, latencies):
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f"  {label:<22} p50={p50:7.1f} мс  p99={p99:7.1f} мс  max={latencies[-1]:7.1f} мс")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        init_pool(path)
+        database.create_tables()
+        telegram_ids = seed_database(path, students=10_000)
+
+        repo = Repository()
+        sync_latencies = asyncio.run(simulate(SyncAccess(), telegram_ids))
+        repo_latencies = asyncio.run(simulate(repo, telegram_ids))
+        repo.close()
+        close_pool()
+
+    print(f"{USERS} пользователей x {UPDATES_PER_USER} обновлений, 10k учеников в базе")
+    report("sqlite в цикле событий", sync_latencies)
+    report("Repository (executor)", repo_latencies)
+
+
+if __name__ == '__main__':
+    main()
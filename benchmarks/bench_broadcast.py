@@ -0,0 +1,172 @@
+"""
+Рассылка варианта по ученикам экзамена через локальный фейковый Bot API.
+
+FakeBot ведёт себя как Telegram: отвечает с задержкой, ограничивает отправку 30 сообщениями
+в секунду на бота и 1 сообщением в секунду на чат (при превышении — RetryAfter),
+иногда падает с TimedOut, а часть учеников заблокировала бота (Forbidden).
+
+Сравниваются прежняя последовательная отправка и Broadcaster; затем рассылка
+прерывается на середине и продолжается так, как это происходит после перезапуска бота.
+Завершается с кодом 1, если Broadcaster не доставил сообщение кому-то из доступных учеников,
+доставил его дважды или оставил в базе статусы получателей, не совпадающие с доставкой.
+
+Запуск: python -m benchmarks.bench_broadcast
+"""
+import asyncio
+import collections
+import os
+import random
+import sys
+import tempfile
+import time
+import types
+
+from telegram.error import Forbidden, RetryAfter, TimedOut
+
+import database
+from benchmarks.seed import seed_database
+from broadcast import Broadcaster
+from connection import init_pool, close_pool
+from repository import repo
+
+STUDENTS = 300
+LATENCY = (0.03, 0.12)  # Время ответа Bot API, секунды
+GLOBAL_LIMIT = 30  # Сообщений в секунду на бота
+TIMEOUT_SHARE = 0.01
+BLOCKED_SHARE = 0.02
+
+
+class FakeBot:
+    """Bot API с лимитами Telegram. Считает доставленные сообщения и нарушения лимитов."""
+
+    def __init__(self, seed=1):
+        self.rnd = random.Random(seed)
+        self.window = collections.deque()  # Время принятых сообщений за последнюю секунду
+        self.last_per_chat = {}
+        self.delivered = collections.Counter()
+        self.rate_limited = 0
+        self.blocked = set()
+        self.message_id = 0
+
+    async def send_message(self, chat_id, text, reply_markup=None, **kwargs):
+        await asyncio.sleep(self.rnd.uniform(*LATENCY))
+        now = time.monotonic()
+        while self.window and now - self.window[0] >= 1:
+            self.window.popleft()
+        if len(self.window) >= GLOBAL_LIMIT or now - self.last_per_chat.get(chat_id, -1) < 1:
+            self.rate_limited += 1
+            raise RetryAfter(1)
+        if chat_id in self.blocked:
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        if self.rnd.random() < TIMEOUT_SHARE:
+            raise TimedOut()
+        self.window.append(now)
+        self.last_per_chat[chat_id] = now
+        self.delivered[chat_id] += 1
+        self.message_id += 1
+        return types.SimpleNamespace(message_id=self.message_id)
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        await asyncio.sleep(self.rnd.uniform(*LATENCY))
+
+
+async def sequential(bot, telegram_ids):
+    """Поведение до Broadcaster: по одному сообщению, ошибки только печатаются."""
+    for telegram_id in telegram_ids:
+        try:
+            await bot.send_message(chat_id=telegram_id, text="Вариант")
+        except Exception:
+            pass
+
+
+def report(label, bot, telegram_ids, elapsed):
+    """Печатает итоги и возвращает количество недоставленных и повторных сообщений."""
+    reachable = [t for t in telegram_ids if t not in bot.blocked]
+    missing = sum(1 for t in reachable if not bot.delivered[t])
+    duplicates = sum(bot.delivered[t] - 1 for t in telegram_ids if bot.delivered[t] > 1)
+    print(f"  {label:<28} {elapsed:6.1f} с  доставлено {len(reachable) - missing}/{len(reachable)}  "
+          f"не доставлено {missing}  дублей {duplicates}  RetryAfter {bot.rate_limited}")
+    return missing + duplicates
+
+
+async def check_progress(broadcast_id, bot, telegram_ids):
+    """Сверяет статусы получателей в базе с тем, что FakeBot действительно доставил."""
+    progress = await repo.get_broadcast_progress(broadcast_id)
+    expected = {'pending': 0, 'sent': sum(1 for t in telegram_ids if bot.delivered[t]), 'failed': len(bot.blocked)}
+    if progress != expected:
+        print(f"    статусы в базе {progress}, ожидалось {expected}")
+        return 1
+    return 0
+
+
+async def run(telegram_ids):
+    rnd = random.Random(3)
+    blocked = set(rnd.sample(telegram_ids, int(len(telegram_ids) * BLOCKED_SHARE)))
+
+    bot = FakeBot()
+    bot.blocked = blocked
+    started = time.perf_counter()
+    await sequential(bot, telegram_ids)
+    report("последовательно", bot, telegram_ids, time.perf_counter() - started)
+
+    bot = FakeBot()
+    bot.blocked = blocked
+    broadcaster = Broadcaster(progress_interval=2)
+    started = time.perf_counter()
+    await repo.start()
+    broadcast_id = await broadcaster.start(bot, "Вариант", telegram_ids, admin_chat_id=1)
+    await broadcaster.join()
+    failures = report("Broadcaster", bot, telegram_ids, time.perf_counter() - started)
+    failures += await check_progress(broadcast_id, bot, telegram_ids)
+    print(f"    повторов отправки: {broadcaster.retries}")
+
+    # Лимитер настроен выше лимита Telegram: рассылка держится за счёт обработки RetryAfter
+    bot = FakeBot()
+    bot.blocked = blocked
+    broadcaster = Broadcaster(rate=60, concurrency=30, progress_interval=2)
+    started = time.perf_counter()
+    broadcast_id = await broadcaster.start(bot, "Вариант", telegram_ids)
+    await broadcaster.join()
+    failures += report("Broadcaster, rate=60", bot, telegram_ids, time.perf_counter() - started)
+    failures += await check_progress(broadcast_id, bot, telegram_ids)
+
+    # Прерываем рассылку на середине и продолжаем её, как после перезапуска
+    bot = FakeBot()
+    bot.blocked = blocked
+    broadcaster = Broadcaster(progress_interval=2)
+    started = time.perf_counter()
+    broadcast_id = await broadcaster.start(bot, "Вариант", telegram_ids)
+    await asyncio.sleep(len(telegram_ids) / broadcaster.limiter.rate / 2)
+    await broadcaster.stop()
+    interrupted = await repo.get_broadcast_progress(broadcast_id)
+    await broadcaster.resume(bot)
+    await broadcaster.join()
+    failures += report("Broadcaster с перезапуском", bot, telegram_ids, time.perf_counter() - started)
+    failures += await check_progress(broadcast_id, bot, telegram_ids)
+    print(f"    на момент остановки: {interrupted}")
+    # Иначе продолжение после перезапуска ничего не проверило
+    if not interrupted['sent'] or not interrupted['pending']:
+        print("    рассылка не была прервана на середине")
+        failures += 1
+    await repo.stop()
+    return failures
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        init_pool(path)
+        database.create_tables()
+        telegram_ids = seed_database(path, students=STUDENTS)
+
+        print(f"Рассылка {STUDENTS} ученикам, лимит Bot API {GLOBAL_LIMIT} сообщений/с")
+        failures = asyncio.run(run(telegram_ids))
+        repo.close()
+        close_pool()
+    if failures:
+        print(f"Проверки не пройдены: {failures}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
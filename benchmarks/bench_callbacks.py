@@ -0,0 +1,190 @@
+"""
+Нажатия на inline-кнопки: цепочка CallbackQueryHandler с регулярными выражениями и данными
+вида «действие:арг» (как было в main.py до CallbackRouter) против CallbackRouter с компактной
+записью callback_data (callbacks.CallbackCodec).
+
+1. Для каждой кнопки из выборки маршрутизатор по упакованным данным выбирает тот же обработчик,
+   что и первая подошедшая регулярка старой цепочки по старым данным; замеряется время выбора.
+2. Размер callback_data в байтах по старой и новой записи.
+3. Данные, не поместившиеся в 64 байта, уходят в кэш и разбираются обратно; кнопки старого
+   формата, из кэша прошлого запуска и вытесненные из кэша отдаются обработчику устаревших кнопок.
+4. Повторная регистрация действия падает при запуске.
+
+Завершается с кодом 1, если какая-то проверка не прошла.
+
+Запуск: python -m benchmarks.bench_callbacks
+"""
+import sys
+import time
+import warnings
+
+from telegram import CallbackQuery, Update, User
+from telegram.ext import CallbackQueryHandler
+
+import main as bot
+from callbacks import INTEGER, MAX_LENGTH, CallbackCodec, CallbackRouteConflict, CallbackRouter, \
+    StaleCallbackData, pack
+from handlers.modify import handle_edit_field, handle_new_exam
+from handlers.student import handle_show_student_info
+
+ROUNDS = 20_000
+
+# Цепочка верхнего уровня в том порядке, в каком она была зарегистрирована в main.py
+OLD_CHAIN = [
+    (bot.handle_delete_callback, r"^delete_student:"),
+    (bot.handle_select_student, r"^select_student:"),
+    (bot.handle_assign_homework_callback, r"^assign_homework:"),
+    (bot.handle_students_page, r"^students_page:\w+:[np]\d+$"),
+    (bot.handle_bulk_exam, r"^bulk_exam:(ОГЭ|ЕГЭ)$"),
+    (bot.handle_bulk_toggle, r"^(bulk_toggle:\d+|bulk_all)$"),
+    (bot.handle_bulk_done, r"^bulk_done$"),
+    (bot.handle_bulk_assign_callback, r"^bulk_assign:\d+$"),
+    (bot.handle_delete_callback, "^return_to_menu$"),
+    (bot.handle_edit_student, r"^edit_student:\d+$"),
+    (handle_edit_field, r"^edit_field:.*"),
+    (handle_new_exam, r"^new_exam:.*"),
+    (handle_show_student_info, r"^show_info:\d+$"),
+    (bot.handle_select_task_to_delete_callback, r"^delete_exam:(ОГЭ|ЕГЭ)$"),
+    (bot.handle_task_deletion_callback, r"^delete_task:\d+$"),
+    (bot.handle_select_note_to_delete_callback, r"^delete_note_exam:(ОГЭ|ЕГЭ)$"),
+    (bot.handle_note_deletion_callback, r"^delete_note:\d+$"),
+    (bot.choose_note_exam, r"^note_exam:"),
+    (bot.choose_note, r"^note:"),
+    (bot.choose_note_field, r"^note_field:"),
+    (bot.return_to_student_menu_callback, "^return_to_student_menu$"),
+]
+
+# Раньше эти нажатия уходили в общий обработчик, который разбирал их ветвлением внутри;
+# теперь у каждого свой маршрут
+RENAMED = {
+    "return_to_menu": bot.handle_menu_callback,
+    "bulk_all": bot.handle_bulk_all,
+}
+
+# Кнопки: действие и аргументы
+SAMPLES = [
+    ("select_student", 42), ("students_page", "select_student", "n120"), ("students_page", "delete_student", "p15"),
+    ("bulk_toggle", 17), ("bulk_all",), ("bulk_exam", "ЕГЭ"), ("bulk_assign", 8), ("bulk_done",),
+    ("delete_student", 7), ("edit_student", 3), ("edit_field", "class_link"), ("new_exam", "Школьная программа"),
+    ("show_info", 12), ("delete_exam", "ОГЭ"), ("delete_task", 31), ("delete_note_exam", "ЕГЭ"),
+    ("delete_note", 4), ("note_exam", "ЕГЭ"), ("note", 55), ("note_field", "link"), ("return_to_menu",),
+    ("return_to_student_menu",), ("assign_homework", 1234567),
+]
+
+
+def old_data(action, *args):
+    return ":".join(map(str, (action, *args)))
+
+
+def make_update(data):
+    user = User(id=1, first_name="User", is_bot=False)
+    return Update(1, callback_query=CallbackQuery("1", user, "chat", data=data))
+
+
+def old_dispatch(handlers, update):
+    for handler in handlers:
+        if handler.check_update(update):
+            return handler.callback
+    return None
+
+
+def router_dispatch(handler, update):
+    check_result = handler.check_update(update)
+    return check_result[0].callback if check_result else None
+
+
+def time_per_call(dispatch, handlers, updates):
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        for update in updates:
+            dispatch(handlers, update)
+    return (time.perf_counter() - started) / (ROUNDS * len(updates)) * 1e6
+
+
+def make_codec():
+    codec = CallbackCodec(cache_size=2)
+    codec.action('many', *[INTEGER] * 20)
+    return codec
+
+
+def is_stale(codec, data):
+    try:
+        codec.unpack(data)
+    except StaleCallbackData:
+        return True
+    return False
+
+
+def check_cache():
+    """Возвращает число непройденных проверок кэша."""
+    ids = tuple(range(10 ** 9, 10 ** 9 + 20))
+    codec = make_codec()
+    data = codec.pack('many', *ids)
+    restored = codec.unpack(data) == ('many', ids)
+    print(f"20 id по 10 цифр: {len(data)} байт {data!r}, разбирается обратно: {restored}")
+    failures = (not restored) + (len(data) > MAX_LENGTH)
+
+    # Новый запуск бота: кэш пуст, у кодека другая эпоха
+    restarted = is_stale(make_codec(), data)
+    # Две новые записи вытесняют первую из кэша на две записи
+    for shift in (1, 2):
+        codec.pack('many', *(i + shift for i in ids))
+    evicted = is_stale(codec, data)
+    print(f"Кнопка из кэша после перезапуска устарела: {restarted}; после вытеснения: {evicted}; "
+          f"{codec.stats()}")
+    return failures + (not restarted) + (not evicted)
+
+
+def main():
+    warnings.filterwarnings('ignore', message=".*per_message.*")
+    application = bot.build_application()
+    # Общий обработчик нажатий — единственный обработчик CallbackRouter среди обработчиков верхнего уровня
+    router_handler = next(handler for handler in application.handlers[0] if hasattr(handler, 'route_callback'))
+    old_handlers = [CallbackQueryHandler(callback, pattern=pattern) for callback, pattern in OLD_CHAIN]
+    old_updates = [make_update(old_data(*sample)) for sample in SAMPLES]
+    new_updates = [make_update(pack(*sample)) for sample in SAMPLES]
+
+    failures = 0
+    for sample, old_update, new_update in zip(SAMPLES, old_updates, new_updates):
+        expected = RENAMED.get(sample[0]) or old_dispatch(old_handlers, old_update)
+        actual = router_dispatch(router_handler, new_update)
+        if actual is not expected:
+            failures += 1
+            print(f"  {sample}: ожидался {getattr(expected, '__name__', None)}, "
+                  f"выбран {getattr(actual, '__name__', None)}")
+    print(f"Выбор обработчика совпадает для {len(SAMPLES) - failures}/{len(SAMPLES)} кнопок")
+
+    old_sizes = [len(old_data(*sample).encode()) for sample in SAMPLES]
+    new_sizes = [len(pack(*sample).encode()) for sample in SAMPLES]
+    print(f"Размер callback_data, байт: было в среднем {sum(old_sizes) / len(SAMPLES):.1f}, "
+          f"максимум {max(old_sizes)}; стало {sum(new_sizes) / len(SAMPLES):.1f}, максимум {max(new_sizes)}")
+
+    old_time = time_per_call(old_dispatch, old_handlers, old_updates)
+    router_time = time_per_call(router_dispatch, router_handler, new_updates)
+    print(f"Время выбора обработчика, {len(OLD_CHAIN)} маршрутов, среднее по выборке:")
+    print(f"  цепочка регулярных выражений {old_time:6.2f} мкс")
+    print(f"  CallbackRouter               {router_time:6.2f} мкс")
+
+    for label, data in (("старого формата", "delete_student:7"), ("другой версии", "9" + pack('bulk_all')[1:]),
+                        ("диалога заданий вне диалога", pack('task', 5))):
+        callback = router_dispatch(router_handler, make_update(data))
+        print(f"Кнопка {label} ({data!r}): {getattr(callback, '__name__', None)}")
+        failures += callback is not bot.handle_stale_callback
+    failures += check_cache()
+
+    router = CallbackRouter()
+    router.add('note', bot.choose_note)
+    try:
+        router.add('note', bot.choose_note_field)
+    except CallbackRouteConflict as e:
+        print(f"Повторная регистрация: {e}")
+    else:
+        print("Повторная регистрация действия не обнаружена")
+        failures += 1
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
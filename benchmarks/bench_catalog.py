@@ -0,0 +1,55 @@
+"""
+Каталог заданий: выборка с сортировкой natsort в Python против ORDER BY sort_key по индексу.
+
+Запуск: python -m benchmarks.bench_catalog
+"""
+import os
+import tempfile
+import time
+
+import database
+from benchmarks.seed import seed_database
+from connection import init_pool, close_pool, get_connection
+
+TASKS_PER_EXAM = 5_000
+CALLS = 200
+
+try:
+    from natsort import natsorted
+except ImportError:  # natsort больше не зависимость бота, нужен только для сравнения
+    natsorted = None
+
+
+def get_tasks_by_exam_natsort(exam_type):
+    # Поведение до колонки sort_key: выборка без порядка и сортировка на каждый вызов
+    with get_connection() as conn:
+        tasks = conn.execute('SELECT id, title, link FROM tasks WHERE exam_type = ?', (exam_type,)).fetchall()
+    return natsorted(tasks, key=lambda x: x[1])
+
+
+def measure(func):
+    started = time.perf_counter()
+    for _ in range(CALLS):
+        result = func('ОГЭ')
+    return (time.perf_counter() - started) / CALLS * 1000, result
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        init_pool(path)
+        database.create_tables()
+        seed_database(path, students=0, tasks_per_exam=TASKS_PER_EXAM)
+
+        print(f"get_tasks_by_exam, {TASKS_PER_EXAM} заданий на экзамен, {CALLS} вызовов")
+        after, ordered = measure(database.get_tasks_by_exam)
+        if natsorted is not None:
+            before, expected = measure(get_tasks_by_exam_natsort)
+            print(f"  natsort в Python      {before:7.2f} мс/вызов")
+            assert [row[1] for row in ordered] == [row[1] for row in expected]
+        print(f"  ORDER BY sort_key     {after:7.2f} мс/вызов")
+        close_pool()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Сравнение задержки одного запроса: новое соединение на каждый вызов против пула.
+
+Запуск: python -m benchmarks.bench_connection
+"""
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import database
+from benchmarks.seed import seed_database
+from connection import init_pool, close_pool
+
+CALLS = 5_000
+
+
+def get_user_by_telegram_id_per_call(path, telegram_id):
+    # Поведение до введения пула: соединение открывается на каждый запрос
+    with sqlite3.connect(path) as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, name, exam FROM users WHERE telegram_id = ?', (telegram_id,))
+        return cursor.fetchone()
+
+
+def measure(func, telegram_ids):
+    timings = []
+    for telegram_id in telegram_ids:
+        started = time.perf_counter()
+        func(telegram_id)
+        timings.append((time.perf_counter() - started) * 1_000_000)
+    timings.sort()
+    return {
+        "mean_us": statistics.fmean(timings),
+        "p50_us": timings[len(timings) // 2],
+        "p99_us": timings[int(len(timings) * 0.99)],
+    }
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        init_pool(path)
+        database.create_tables()
+        telegram_ids = seed_database(path, students=10_000)
+        sample = random.Random(1).choices(telegram_ids, k=CALLS)
+
+        before = measure(lambda tg: get_user_by_telegram_id_per_call(path, tg), sample)
+        after = measure(database.get_user_by_telegram_id, sample)
+        close_pool()
+
+    print(f"get_user_by_telegram_id, 10k учеников, {CALLS} вызовов")
+    for label, result in (("connect на вызов", before), ("пул соединений", after)):
+        print(f"  {label:<18} mean={result['mean_us']:8.1f} мкс  "
+              f"p50={result['p50_us']:8.1f} мкс  p99={result['p99_us']:8.1f} мкс")
+
+
+if __name__ == '__main__':
+    main()
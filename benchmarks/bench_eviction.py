@@ -0,0 +1,168 @@
+"""
+Память при долгой работе бота: тайм-ауты диалогов и очистка user_data (eviction.py).
+
+Настоящее приложение (main.build_application) с FakeBotApi работает DAYS «дней»; каждый день боту
+пишут STUDENTS_PER_DAY учеников (/start и «Домашнее задание»): в основном новые, часть — вернувшиеся.
+Время ускорено: день длится DAY секунд, и тайм-ауты диалогов (CONVERSATION_TIMEOUTS), и часы
+IdleEvictor пересчитаны в том же масштабе; проверка evictor.sweep вызывается раз в день.
+
+Сравниваются запуск без тайм-аутов и очистки (как до eviction.py) и с ними, каждый в отдельном
+процессе, чтобы RSS одного не включал память другого: каждые 10 дней выводятся число записей
+user_data, диалогов main в памяти и выгруженных из неё, размер кэша учеников и RSS процесса.
+
+Завершается с кодом 1, если с очисткой user_data, диалоги main в памяти или RSS не вышли на плато:
+в среднем за последние 10 дней срока больше, чем за первые 10 дней его последней трети, сверх допуска
+GROWTH_TOLERANCE. Допуск по RSS покрывает файл базы, отображённый в память (mmap_size
+в connection.PRAGMAS): он растёт вместе с базой, но ограничен её размером.
+
+Кэш учеников ограничен, но за DAYS дней боту пишет меньше учеников, чем STUDENT_CACHE_SIZE из
+core/config.py, и кэш рос бы весь срок в обоих запусках. Поэтому его предел уменьшен так же,
+как сжато время: кэш заполняется в первой трети срока.
+
+Из-за сжатия времени сообщение ученика иногда приходит ровно в момент срабатывания тайм-аута;
+python-telegram-bot тогда не может отменить уже сработавшее задание тайм-аута (JobLookupError)
+и не обрабатывает сообщение. Такие ошибки считаются и выводятся отдельно.
+
+Запуск: python -m benchmarks.bench_eviction
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+import warnings
+
+from telegram.ext import Application
+
+import database
+from benchmarks.fake_telegram import BOT_TOKEN, FakeBotApi, make_update
+from benchmarks.seed import clear_persistence, seed_database
+from connection import init_pool, close_pool
+from core.config import CONVERSATION_TIMEOUTS, USER_DATA_TTL
+from eviction import evictor
+from main import build_application
+from persistence import SQLitePersistence
+from repository import repo
+
+DAYS = 90
+DAY = 0.25  # Секунд реального времени на один день
+STUDENTS_PER_DAY = 100
+RETURNING = 0.3  # Доля учеников дня, которые уже писали боту раньше
+SCRIPT = ["/start", "Домашнее задание"]
+STUDENT_CACHE_SIZE = 2000  # Заполняется за первые 30 дней
+# Допустимый рост за последнюю треть срока: записей — в пределах разброса по дням, RSS — в мегабайтах
+GROWTH_TOLERANCE = {'user_data': STUDENTS_PER_DAY / 2, 'main': STUDENTS_PER_DAY / 2, 'rss_mb': 1.5}
+SCALE = DAY / (24 * 3600)  # Реальных секунд в секунде «работы бота»
+
+
+async def run(path, telegram_ids, evict):
+    timeouts = dict(CONVERSATION_TIMEOUTS)
+    for name, timeout in timeouts.items():
+        CONVERSATION_TIMEOUTS[name] = timeout * SCALE if evict and timeout else None
+    evictor.clock = lambda: time.monotonic() / SCALE
+    evictor.evicted = {'user': 0, 'chat': 0, 'conversation': 0}
+    repo.student_cache.maxsize = STUDENT_CACHE_SIZE
+
+    api = FakeBotApi()
+    builder = Application.builder().token(BOT_TOKEN).request(api).get_updates_request(api)
+    application = build_application(builder, persistence=SQLitePersistence(update_interval=DAY))
+    CONVERSATION_TIMEOUTS.update(timeouts)
+    errors = []
+
+    async def count_error(update, context):
+        errors.append(type(context.error).__name__)
+
+    application.add_error_handler(count_error)
+    await application.initialize()
+    await application.post_init(application)
+    await application.updater.start_polling(timeout=10)
+    await application.start()
+
+    rnd = random.Random(1)
+    seen = []
+    update_id = 1
+    history = []
+    for day in range(1, DAYS + 1):
+        started = time.perf_counter()
+        returning = rnd.sample(seen, min(len(seen), int(STUDENTS_PER_DAY * RETURNING)))
+        new = telegram_ids[len(seen):len(seen) + STUDENTS_PER_DAY - len(returning)]
+        seen.extend(new)
+        # Ответы прошлых дней не храним: иначе растёт память самого FakeBotApi, а не бота
+        api.sent.clear()
+        expected = (len(new) + len(returning)) * len(SCRIPT)
+        for telegram_id in new + returning:
+            for text in SCRIPT:
+                api.push(make_update(update_id, telegram_id, text))
+                update_id += 1
+        while len(api.sent) < expected and time.perf_counter() - started < 30:
+            await asyncio.sleep(0.005)
+        if evict:
+            # В работе бота persistence сохраняет изменения раз в PERSISTENCE_INTERVAL, много чаще, чем
+            # диалог становится неактивным; в сжатом времени сохраняем их перед проверкой сами
+            await application.update_persistence()
+            evictor.sweep(application)
+        await asyncio.sleep(max(0.0, DAY - (time.perf_counter() - started)))
+        report = evictor.report(application)
+        main_in_memory = report['conversations_in_memory']['main']
+        history.append({'user_data': report['user_data'], 'main': main_in_memory, 'rss_mb': report['rss_mb']})
+        if day % 10 == 0:
+            print(f"    день {day:3}: user_data {report['user_data']:5}, диалогов main в памяти {main_in_memory:5} "
+                  f"(выгружено {report['conversations_unloaded']['main']:5}), "
+                  f"кэш учеников {repo.student_cache.stats()['size']:5}, RSS {report['rss_mb']:6.1f} МБ, "
+                  f"удалено {report['evicted']['user']}")
+
+    await application.updater.stop()
+    await application.stop()
+    await application.post_stop(application)
+    await application.shutdown()
+    await application.post_shutdown(application)
+    if errors:
+        print(f"    ошибок обработки: {len(errors)} ({', '.join(sorted(set(errors)))})")
+    return history
+
+
+def run_process(path, telegram_ids, evict):
+    warnings.filterwarnings('ignore', message=".*per_message.*")
+    logging.disable(logging.ERROR)  # Ошибки считает обработчик ошибок в run
+    init_pool(path)
+    clear_persistence(path)
+    history = asyncio.run(run(path, telegram_ids, evict))
+    repo.close()
+    close_pool()
+    return history
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        init_pool(path)
+        database.create_tables()
+        telegram_ids = seed_database(path, students=DAYS * STUDENTS_PER_DAY)
+        close_pool()
+
+        print(f"{DAYS} дней по {STUDENTS_PER_DAY} учеников (из них {RETURNING:.0%} вернувшихся), "
+              f"user_data хранится {USER_DATA_TTL // 86400} дней")
+        with multiprocessing.get_context("spawn").Pool(1, maxtasksperchild=1) as pool:
+            print("  без тайм-аутов и очистки:")
+            pool.apply(run_process, (path, telegram_ids, False))
+            print("  с тайм-аутами и IdleEvictor:")
+            history = pool.apply(run_process, (path, telegram_ids, True))
+
+    # Плато: в конце срока в среднем не больше, чем в начале его последней трети (с допуском на разброс дней)
+    tail = history[len(history) * 2 // 3:]
+    failed = False
+    for key, tolerance in GROWTH_TOLERANCE.items():
+        start = sum(day[key] for day in tail[:10]) / 10
+        end = sum(day[key] for day in tail[-10:]) / 10
+        if end > start + tolerance:
+            print(f"С очисткой {key} продолжает расти: {start:.1f} -> {end:.1f} за последнюю треть срока")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Inline-поиск по названиям заданий и конспектов: триграммный индекс в памяти
+против LIKE '%...%' по таблице на каждый запрос.
+
+Запуск: python -m benchmarks.bench_inline
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import database
+from benchmarks.seed import seed_database
+from connection import init_pool, close_pool, get_connection
+from repository import repo
+from search import catalog_search
+
+ITEMS_PER_EXAM = 5_000
+QUERIES = 500
+LIMIT = 50
+
+
+def search_like(exam, text):
+    with get_connection() as conn:
+        return conn.execute(
+            'SELECT id, title, link FROM tasks WHERE exam_type = ? AND title LIKE ? ORDER BY sort_key, title LIMIT ?',
+            (exam, f'%{text}%', LIMIT)
+        ).fetchall()
+
+
+def percentiles(timings):
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.99)]
+
+
+async def run(queries):
+    started = time.perf_counter()
+    # Запрос, которому ничего не соответствует, обходит оба каталога и строит оба индекса
+    await catalog_search.search(("ОГЭ",), "ъъъ", LIMIT)
+    print(f"  построение индексов: {(time.perf_counter() - started) * 1000:.1f} мс")
+
+    index_timings = []
+    for text in queries:
+        started = time.perf_counter()
+        await catalog_search.search(("ОГЭ",), text, LIMIT)
+        index_timings.append((time.perf_counter() - started) * 1000)
+    await repo.stop()
+    return index_timings
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        init_pool(path)
+        database.create_tables()
+        seed_database(path, students=100, tasks_per_exam=ITEMS_PER_EXAM, notes_per_exam=ITEMS_PER_EXAM)
+
+        rnd = random.Random(5)
+        titles = [row[0] for row in database.db_execute('SELECT title FROM tasks', fetchall=True)]
+        queries = []
+        for _ in range(QUERIES):
+            title = rnd.choice(titles)
+            start = rnd.randrange(len(title) - 3)
+            queries.append(title[start:start + rnd.randint(1, 6)])
+
+        index_timings = asyncio.run(run(queries))
+
+        like_timings = []
+        for text in queries:
+            started = time.perf_counter()
+            search_like("ОГЭ", text)
+            like_timings.append((time.perf_counter() - started) * 1000)
+
+        repo.close()
+        close_pool()
+
+    print(f"{QUERIES} запросов по каталогу из {ITEMS_PER_EXAM} заданий и {ITEMS_PER_EXAM} конспектов")
+    for label, timings in (("триграммный индекс", index_timings), ("LIKE по таблице", like_timings)):
+        p50, p99 = percentiles(timings)
+        print(f"  {label:<20} p50={p50:6.2f} мс  p99={p99:6.2f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+Сохранение состояний диалогов и user_data между перезапусками (SQLitePersistence).
+
+1. Перезапуск: ученики открывают меню (/start), бот останавливается и запускается заново,
+   затем ученики нажимают «Домашнее задание». Без сохранения состояния диалог после
+   перезапуска потерян и бот отвечает «Напишите /start»; с SQLitePersistence — присылает задание.
+   Отдельно проверяется, что user_data с множеством (bulk_selected) переживает перезапуск.
+2. Накладные расходы: те же 100 учеников × 4 сообщения, что в bench_updates, при записи раз
+   в PERSISTENCE_INTERVAL секунд и при записи почти после каждого обновления (интервал 10 мс).
+3. Стоимость запуска: загрузка 10 000 сохранённых user_data и состояний диалогов.
+
+Завершается с кодом 1, если какая-то проверка не прошла.
+
+Запуск: python -m benchmarks.bench_persistence
+"""
+import asyncio
+import os
+import pickle
+import sqlite3
+import sys
+import tempfile
+import time
+import warnings
+
+from telegram.ext import Application
+
+import database
+from benchmarks.fake_telegram import BOT_TOKEN, FakeBotApi, make_update
+from benchmarks.seed import clear_persistence, seed_database
+from connection import init_pool, close_pool
+from core.config import PERSISTENCE_INTERVAL
+from main import build_application
+from persistence import SQLitePersistence
+from repository import repo
+
+STUDENTS = 100
+RTT = 0.02
+SCRIPT = ["/start", "Домашнее задание", "Конспекты", "Подключиться к занятию"]
+STORED_USERS = 10_000
+
+
+class MemoryPersistence(SQLitePersistence):
+    """Ничего не сохраняет между запусками: поведение бота до SQLitePersistence."""
+
+    async def _load(self, kind):
+        return {}
+
+    async def get_conversations(self, name):
+        return {}
+
+    async def _write(self):
+        self._data.clear()
+        self._conversations.clear()
+
+
+class CountingPersistence(SQLitePersistence):
+    """SQLitePersistence, которая считает транзакции записи."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.transactions = 0
+
+    async def _write(self):
+        if self._data or self._conversations:
+            self.transactions += 1
+        await super()._write()
+
+
+async def start(api, persistence):
+    builder = Application.builder().token(BOT_TOKEN).request(api).get_updates_request(api)
+    application = build_application(builder, persistence=persistence)
+    await application.initialize()
+    await application.post_init(application)
+    await application.updater.start_polling(timeout=10)
+    await application.start()
+    return application
+
+
+async def stop(application):
+    await application.updater.stop()
+    await application.stop()
+    await application.post_stop(application)
+    await application.shutdown()
+    await application.post_shutdown(application)
+
+
+async def send(api, messages):
+    """Отправляет сообщения и дожидается ответов на все."""
+    before = len(api.sent)
+    for update_id, (telegram_id, text) in enumerate(messages, start=api.calls['getUpdates'] * 1000 + 1):
+        api.push(make_update(update_id, telegram_id, text))
+    started = time.perf_counter()
+    while (api.updates or len({chat_id for chat_id, _, _ in api.sent[before:]}) <
+           len({telegram_id for telegram_id, _ in messages})) and time.perf_counter() - started < 60:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(RTT * 10)
+    return api.sent[before:]
+
+
+async def restart(telegram_ids, make_persistence):
+    """Возвращает, сколько учеников после перезапуска получили задание, а не просьбу написать /start."""
+    api = FakeBotApi(rtt=RTT)
+    application = await start(api, make_persistence())
+    await send(api, [(telegram_id, "/start") for telegram_id in telegram_ids])
+    await stop(application)
+
+    api = FakeBotApi(rtt=RTT)
+    application = await start(api, make_persistence())
+    replies = await send(api, [(telegram_id, "Домашнее задание") for telegram_id in telegram_ids])
+    await stop(application)
+    return sum(1 for _, text, _ in replies if "домашнее задание" in text)
+
+
+async def user_data_round_trip():
+    persistence = SQLitePersistence()
+    await persistence.update_user_data(1, {'bulk_selected': {1, 2, 3}, 'bulk_page': "n0"})
+    await persistence.flush()
+    loaded = (await SQLitePersistence().get_user_data()).get(1)
+    await repo.stop()
+    return loaded == {'bulk_selected': {1, 2, 3}, 'bulk_page': "n0"}
+
+
+async def load(telegram_ids, persistence):
+    api = FakeBotApi(rtt=RTT)
+    application = await start(api, persistence)
+    started = time.perf_counter()
+    update_id = 1
+    for telegram_id in telegram_ids:
+        for text in SCRIPT:
+            api.push(make_update(update_id, telegram_id, text))
+            update_id += 1
+    while api.updates or application.update_queue.qsize() or \
+            application.update_processor.current_concurrent_updates or len(api.sent) < len(telegram_ids) * 4:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    await stop(application)
+    return elapsed
+
+
+def store_many(path, count):
+    user_data = pickle.dumps({'selected_student_id': 1, 'homework_link': "https://example.com/hw",
+                              'bulk_selected': set(range(20))})
+    state = pickle.dumps(1)
+    with sqlite3.connect(path) as conn:
+        conn.executemany('INSERT OR REPLACE INTO persistence (kind, key, data) VALUES (?, ?, ?)',
+                         (('user', i, user_data) for i in range(count)))
+        conn.executemany('INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)',
+                         (('main', f"[{i}, {i}]", state) for i in range(count)))
+
+
+async def startup_cost():
+    persistence = SQLitePersistence()
+    started = time.perf_counter()
+    user_data = await persistence.get_user_data()
+    conversations = await persistence.get_conversations("main")
+    return time.perf_counter() - started, len(user_data), len(conversations)
+
+
+def main():
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        init_pool(path)
+        database.create_tables()
+        telegram_ids = seed_database(path, students=STUDENTS, tasks_per_exam=20, notes_per_exam=20)
+        warnings.filterwarnings('ignore', message=".*per_message.*")
+
+        print(f"Перезапуск посреди диалога, {STUDENTS} учеников:")
+        for label, make_persistence in (("без сохранения", MemoryPersistence), ("SQLitePersistence", SQLitePersistence)):
+            clear_persistence(path)
+            continued = asyncio.run(restart(telegram_ids, make_persistence))
+            print(f"  {label:<20} диалог продолжился у {continued}/{STUDENTS}")
+            if make_persistence is SQLitePersistence and continued != STUDENTS:
+                failures += 1
+        clear_persistence(path)
+        round_trip = asyncio.run(user_data_round_trip())
+        print(f"  user_data с множеством после перезапуска: {'совпадает' if round_trip else 'НЕ совпадает'}")
+        failures += not round_trip
+
+        print(f"Обработка {STUDENTS} учеников × {len(SCRIPT)} сообщения:")
+        for label, make_persistence in (
+                ("без сохранения", MemoryPersistence),
+                (f"запись раз в {PERSISTENCE_INTERVAL} с", lambda: CountingPersistence()),
+                ("запись каждые 10 мс", lambda: CountingPersistence(update_interval=0.01)),
+        ):
+            clear_persistence(path)
+            persistence = make_persistence()
+            elapsed = asyncio.run(load(telegram_ids, persistence))
+            transactions = getattr(persistence, 'transactions', 0)
+            print(f"  {label:<20} {elapsed:6.2f} с  транзакций записи: {transactions}")
+
+        clear_persistence(path)
+        store_many(path, STORED_USERS)
+        elapsed, users, conversations = asyncio.run(startup_cost())
+        print(f"Загрузка при запуске: {users} user_data и {conversations} диалогов за {elapsed * 1000:.0f} мс")
+
+        repo.close()
+        close_pool()
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
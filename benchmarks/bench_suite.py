@@ -0,0 +1,340 @@
+"""
+Набор микробенчмарков для отслеживания регрессий между релизами.
+
+Для каждого размера базы (по умолчанию 1 000, 10 000 и 100 000 учеников, по TASKS_PER_EXAM заданий
+и конспектов на экзамен) в отдельном процессе создаётся синтетическая база (benchmarks.seed) и замеряются:
+  - функции database.py — чтения, изменения учеников и каталогов; функции рассылок, outbox и persistence
+    замеряют свои бенчмарки (bench_broadcast, bench_persistence);
+  - обработчики start, handle_student_menu (каждый пункт меню ученика) и handle_variant_link: они
+    вызываются напрямую с Update из фейкового Bot API (benchmarks.fake_telegram) и CallbackContext
+    настоящего приложения, поэтому в замер входят репозиторий, кэши и сборка ответа, но не сеть.
+
+Каждый случай вызывается, пока не наберётся MIN_TIME секунд (не меньше MIN_CALLS и не больше MAX_CALLS
+вызовов), аргументы перебираются по выборке учеников, заданий и конспектов. Результаты — среднее,
+медиана, p95 и минимум в миллисекундах — записываются в JSON вместе с версиями Python, SQLite
+и коммитом. С --baseline результаты сравниваются с прошлым файлом: завершается с кодом 1, если медиана
+какого-то случая выросла больше чем в --tolerance раз.
+
+Запуск: python -m benchmarks.bench_suite [--sizes 1000 10000] [--output bench_suite.json]
+                                         [--baseline прошлый.json] [--tolerance 1.5]
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+from telegram import Update
+from telegram.ext import Application, CallbackContext
+
+import database
+from benchmarks.fake_telegram import BOT_TOKEN, FakeBotApi, make_update
+from benchmarks.seed import seed_database
+from broadcast import broadcaster
+from connection import init_pool, close_pool
+from core.config import ADMIN_IDS
+from handlers.student import handle_student_menu
+from main import build_application, handle_variant_link, start
+from repository import repo
+
+SIZES = (1_000, 10_000, 100_000)
+TASKS_PER_EXAM = 2_000
+SAMPLE = 1_000  # Сколько учеников, заданий и конспектов перебирают аргументы
+MIN_TIME = 0.3
+MIN_CALLS = 5
+MAX_CALLS = 2_000
+ADMIN_ID = 1  # Администратор для handle_variant_link; в синтетической базе такого Telegram ID нет
+STUDENT_MENU = ["Домашнее задание", "Конспекты", "Актуальный вариант", "Подключиться к занятию"]
+FORMAT = 1  # Версия формата JSON
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        'calls': len(timings),
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 4),
+        'p50_ms': round(timings[len(timings) // 2] * 1000, 4),
+        'p95_ms': round(timings[int(len(timings) * 0.95)] * 1000, 4),
+        'min_ms': round(timings[0] * 1000, 4),
+    }
+
+
+def measure(call, max_calls=MAX_CALLS):
+    """
+    Вызывает call(i) для i = 0, 1, ..., пока не наберётся MIN_TIME секунд и MIN_CALLS вызовов.
+
+    :return: Сводка времени вызова (см. summarize).
+    """
+    timings = []
+    deadline = time.perf_counter() + MIN_TIME
+    for i in range(max_calls):
+        started = time.perf_counter()
+        call(i)
+        timings.append(time.perf_counter() - started)
+        if i + 1 >= MIN_CALLS and started >= deadline:
+            break
+    return summarize(timings)
+
+
+async def measure_async(call, max_calls=MAX_CALLS):
+    """То же, что measure, для корутин: await call(i)."""
+    timings = []
+    deadline = time.perf_counter() + MIN_TIME
+    for i in range(max_calls):
+        started = time.perf_counter()
+        await call(i)
+        timings.append(time.perf_counter() - started)
+        if i + 1 >= MIN_CALLS and started >= deadline:
+            break
+    return summarize(timings)
+
+
+def load_samples(path):
+    """Выборки существующих записей, по которым перебираются аргументы."""
+    rnd = random.Random(7)
+    with sqlite3.connect(path) as conn:
+        def sample(query):
+            rows = conn.execute(query).fetchall()
+            return rnd.sample(rows, min(SAMPLE, len(rows)))
+
+        students = sample('SELECT id, telegram_id, password, exam FROM users')
+        tasks = sample('SELECT id, title, exam_type FROM tasks')
+        notes = sample('SELECT id, title, exam_type FROM notes')
+    return students, tasks, notes
+
+
+def database_cases(students, tasks, notes):
+    """
+    Случаи для функций database.py: (название, call(i)).
+
+    Изменения повторяют значения, которые уже есть в базе, либо добавляют записи и удаляют их же,
+    чтобы база не менялась от случая к случаю.
+    """
+    def student(i):
+        return students[i % len(students)]
+
+    def task(i):
+        return tasks[i % len(tasks)]
+
+    def note(i):
+        return notes[i % len(notes)]
+
+    added_tasks, added_notes = [], []
+
+    def add_task(i):
+        database.add_task(f"Замер {i}", f"https://example.com/bench/{i}", 'ОГЭ')
+        added_tasks.append(f"Замер {i}")
+
+    def add_note(i):
+        database.add_note(f"Замер {i}", f"https://example.com/bench/{i}", 'ЕГЭ')
+        added_notes.append(f"Замер {i}")
+
+    def added_ids(table):
+        return [row[0] for row in database.db_execute(f"SELECT id FROM {table} WHERE title LIKE 'Замер %'",
+                                                      fetchall=True)]
+
+    cases = [
+        ('get_user_by_telegram_id', lambda i: database.get_user_by_telegram_id(student(i)[1])),
+        ('get_student_by_telegram_id', lambda i: database.get_student_by_telegram_id(student(i)[1])),
+        ('get_user_by_password', lambda i: database.get_user_by_password(student(i)[2])),
+        ('get_all_users', lambda i: database.get_all_users()),
+        ('get_students_page', lambda i: database.get_students_page(student(i)[0])),
+        ('get_students_page_exam', lambda i: database.get_students_page(student(i)[0], exam=student(i)[3])),
+        ('search_students', lambda i: database.search_students(f"Учен {student(i)[0]}")),
+        ('get_student_info', lambda i: database.get_student_info(student(i)[0])),
+        ('get_user_exam', lambda i: database.get_user_exam(student(i)[0])),
+        ('get_exam_telegram_ids', lambda i: database.get_exam_telegram_ids(student(i)[3])),
+        ('get_exam_students', lambda i: database.get_exam_students(student(i)[3])),
+        ('get_variant_link', lambda i: database.get_variant_link(student(i)[3])),
+        ('get_tasks_by_exam', lambda i: database.get_tasks_by_exam(task(i)[2])),
+        ('get_task_titles', lambda i: database.get_task_titles(task(i)[2])),
+        ('get_notes_by_exam', lambda i: database.get_notes_by_exam(note(i)[2])),
+        ('get_note_titles', lambda i: database.get_note_titles(note(i)[2])),
+        ('get_task_by_id', lambda i: database.get_task_by_id(task(i)[0])),
+        ('is_task_title_unique', lambda i: database.is_task_title_unique(task(i)[1], task(i)[2])),
+        ('is_note_title_unique', lambda i: database.is_note_title_unique(note(i)[1], note(i)[2])),
+        ('update_user_telegram_id', lambda i: database.update_user_telegram_id(student(i)[0], student(i)[1])),
+        ('update_student_field', lambda i: database.update_student_field(student(i)[0], 'class_date', "01.09.2024")),
+        ('assign_homework', lambda i: database.assign_homework(student(i)[0], f"https://example.com/hw/{i}")),
+        ('assign_homework_bulk', lambda i: database.assign_homework_bulk(
+            [row[0] for row in students[:20]], f"https://example.com/hw/{i}")),
+        ('set_variant_link', lambda i: database.set_variant_link(student(i)[3], "https://example.com/variant")),
+        ('update_task_field', lambda i: database.update_task_field(task(i)[0], 'link', f"https://example.com/t/{i}")),
+        ('update_note_field', lambda i: database.update_note_field(note(i)[0], 'link', f"https://example.com/n/{i}")),
+        ('add_task', add_task),
+        ('add_note', add_note),
+    ]
+
+    # Удаляются ровно те записи, что добавили add_task и add_note
+    def delete_case(name, delete, table, titles):
+        ids = []
+
+        def call(i):
+            if i == 0:
+                ids[:] = added_ids(table)
+            delete(ids[i])
+        return name, call, lambda: len(titles)
+
+    return cases, [
+        delete_case('delete_task', database.delete_task, 'tasks', added_tasks),
+        delete_case('delete_note', database.delete_note, 'notes', added_notes),
+    ]
+
+
+async def handler_cases(application, students):
+    """Замеры обработчиков: {название: сводка}."""
+    bot = application.bot
+    update_id = 0
+
+    def update(telegram_id, text):
+        nonlocal update_id
+        update_id += 1
+        return Update.de_json(make_update(update_id, telegram_id, text), bot)
+
+    async def call(handler, telegram_id, text, user_data=None):
+        incoming = update(telegram_id, text)
+        context = CallbackContext.from_update(incoming, application)
+        if user_data:
+            context.user_data.update(user_data)
+        await handler(incoming, context)
+
+    def student(i):
+        return students[i % len(students)]
+
+    results = {
+        'start': await measure_async(lambda i: call(start, student(i)[1], "/start")),
+        'start_unknown_user': await measure_async(lambda i: call(start, 10 ** 12 + i, "/start")),
+    }
+    for choice in STUDENT_MENU:
+        results[f"handle_student_menu:{choice}"] = await measure_async(
+            lambda i, choice=choice: call(handle_student_menu, student(i)[1], choice))
+
+    async def variant_link(i):
+        exam = ('ОГЭ', 'ЕГЭ')[i % 2]
+        await call(handle_variant_link, ADMIN_ID, f"https://example.com/variant/{i}", {'variant_exam': exam})
+        # Рассылка ученикам идёт в фоне и в замер не входит
+        await broadcaster.stop()
+
+    results['handle_variant_link'] = await measure_async(variant_link)
+    return results
+
+
+async def run_handlers(students):
+    api = FakeBotApi()
+    application = build_application(Application.builder().token(BOT_TOKEN).request(api).get_updates_request(api))
+    await application.initialize()
+    await repo.start()
+    try:
+        return await handler_cases(application, students)
+    finally:
+        await repo.stop()
+        await application.shutdown()
+
+
+def run_size(size):
+    """Замеры на базе из size учеников: список записей результата."""
+    warnings.filterwarnings('ignore', message=".*per_message.*")
+    ADMIN_IDS.append(ADMIN_ID)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        init_pool(path)
+        database.create_tables()
+        started = time.perf_counter()
+        seed_database(path, students=size, tasks_per_exam=TASKS_PER_EXAM, notes_per_exam=TASKS_PER_EXAM)
+        for exam in ('ОГЭ', 'ЕГЭ'):
+            database.set_variant_link(exam, "https://example.com/variant")
+        print(f"{size} учеников: база заполнена за {time.perf_counter() - started:.1f} с", flush=True)
+
+        students, tasks, notes = load_samples(path)
+        results = []
+        cases, delete_cases = database_cases(students, tasks, notes)
+        for name, call in cases:
+            results.append({'size': size, 'kind': 'database', 'name': name, **measure(call)})
+        for name, call, count in delete_cases:
+            results.append({'size': size, 'kind': 'database', 'name': name, **measure(call, max_calls=count())})
+
+        handlers = asyncio.run(run_handlers(students))
+        results += [{'size': size, 'kind': 'handler', 'name': name, **summary} for name, summary in handlers.items()]
+        repo.close()
+        close_pool()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """
+    Сравнивает медианы с прошлым запуском (записи без размера базы, как у benchmarks.replay, — по названию).
+
+    :return: Список строк с описанием регрессий.
+    """
+    previous = {(row.get('size'), row['kind'], row['name']): row for row in baseline['results']}
+    regressions = []
+    for row in results:
+        old = previous.get((row.get('size'), row['kind'], row['name']))
+        # Разница меньше 10 мкс — шум таймера, а не регрессия
+        if old and row['p50_ms'] > old['p50_ms'] * tolerance and row['p50_ms'] - old['p50_ms'] > 0.01:
+            regressions.append(f"{row.get('size') or '':>7} {row['kind']:<8} {row['name']:<44} "
+                               f"{old['p50_ms']:9.3f} -> {row['p50_ms']:9.3f} мс")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки database.py и обработчиков")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help="Количество учеников в базе")
+    parser.add_argument('--output', default="bench_suite.json", help="Файл для результатов в JSON")
+    parser.add_argument('--baseline', help="Результаты прошлого запуска для сравнения")
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help="Во сколько раз может вырасти медиана без сообщения о регрессии")
+    args = parser.parse_args()
+
+    results = []
+    # Каждый размер — в своём процессе: кэши репозитория и клавиатур не переходят между базами
+    with multiprocessing.get_context("spawn").Pool(1, maxtasksperchild=1) as pool:
+        for size in args.sizes:
+            rows = pool.apply(run_size, (size,))
+            for row in rows:
+                print(f"  {row['kind']:<8} {row['name']:<44} p50 {row['p50_ms']:9.3f} мс  "
+                      f"p95 {row['p95_ms']:9.3f} мс  ({row['calls']} вызовов)")
+            results += rows
+
+    report = {
+        'format': FORMAT,
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'config': {'tasks_per_exam': TASKS_PER_EXAM, 'sample': SAMPLE, 'min_time': MIN_TIME},
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f"Результаты записаны в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for line in regressions:
+            print(f"Регрессия: {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Параллельная обработка обновлений с сохранением порядка внутри чата.
+
+Настоящее приложение (main.build_application) получает обновления через long polling от локального
+FakeBotApi, каждый вызов Bot API занимает RTT. Каждый ученик быстро отправляет подряд несколько
+сообщений: /start, затем пункты меню. Ответ на каждое следующее сообщение зависит от состояния
+диалога, выставленного предыдущим, поэтому обработка не по порядку видна по ответам.
+
+Сравниваются:
+  - по одному обновлению (поведение до PerChatUpdateProcessor) — эталон ответов;
+  - обычный concurrent_updates без порядка внутри чата;
+  - PerChatUpdateProcessor.
+Для каждого режима — время, число чатов, ответы в которых отличаются от эталона,
+и метрики очереди PerChatUpdateProcessor. Завершается с кодом 1, если PerChatUpdateProcessor
+дал ответы, отличные от эталона.
+
+Запуск: python -m benchmarks.bench_updates
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+from telegram.ext import Application, SimpleUpdateProcessor
+
+import database
+from benchmarks.fake_telegram import BOT_TOKEN, FakeBotApi, make_update
+from benchmarks.seed import clear_persistence, seed_database
+from concurrency import PerChatUpdateProcessor
+from connection import init_pool, close_pool
+from main import build_application
+from repository import repo
+
+STUDENTS = 100
+RTT = 0.02
+CONCURRENCY = 16
+SCRIPT = ["/start", "Домашнее задание", "Конспекты", "Подключиться к занятию"]
+
+
+async def run(path, telegram_ids, update_processor):
+    clear_persistence(path)
+    api = FakeBotApi(rtt=RTT)
+    builder = Application.builder().token(BOT_TOKEN).request(api).get_updates_request(api)
+    application = build_application(builder, update_processor)
+
+    await application.initialize()
+    await application.post_init(application)
+    await application.updater.start_polling(timeout=10)
+    await application.start()
+
+    # Все сообщения приходят почти одновременно: ученики нажимают кнопки, не дожидаясь ответа
+    started = time.perf_counter()
+    update_id = 1
+    for telegram_id in telegram_ids:
+        for text in SCRIPT:
+            api.push(make_update(update_id, telegram_id, text))
+            update_id += 1
+    expected = len(telegram_ids) * len(SCRIPT)
+    while application.update_queue.qsize() or api.updates or \
+            update_processor.current_concurrent_updates or len(api.sent) < expected:
+        await asyncio.sleep(0.01)
+        if time.perf_counter() - started > 120:
+            break
+    # Даём доделать ответы, начатые последними обновлениями
+    await asyncio.sleep(RTT * 4)
+    elapsed = time.perf_counter() - started
+
+    await application.updater.stop()
+    await application.stop()
+    await application.post_stop(application)
+    await application.shutdown()
+    await application.post_shutdown(application)
+
+    replies = {}
+    for chat_id, text, _ in api.sent:
+        replies.setdefault(chat_id, []).append(text)
+    return elapsed, replies
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        init_pool(path)
+        database.create_tables()
+        telegram_ids = seed_database(path, students=STUDENTS, tasks_per_exam=20, notes_per_exam=20)
+        warnings.filterwarnings('ignore', message=".*per_message.*")
+
+        print(f"{STUDENTS} учеников по {len(SCRIPT)} сообщения подряд, RTT Bot API {RTT * 1000:.0f} мс")
+        elapsed, reference = asyncio.run(run(path, telegram_ids, SimpleUpdateProcessor(1)))
+        print(f"  {'по одному':<32} {elapsed:6.2f} с")
+
+        failures = 0
+        for label, processor in (
+                (f"concurrent_updates={CONCURRENCY}", SimpleUpdateProcessor(CONCURRENCY)),
+                (f"PerChatUpdateProcessor({CONCURRENCY})", PerChatUpdateProcessor(CONCURRENCY)),
+        ):
+            elapsed, replies = asyncio.run(run(path, telegram_ids, processor))
+            mismatched = sum(1 for telegram_id in telegram_ids if replies.get(telegram_id) != reference.get(telegram_id))
+            print(f"  {label:<32} {elapsed:6.2f} с  чатов с ответами не по порядку: {mismatched}/{STUDENTS}")
+            if isinstance(processor, PerChatUpdateProcessor):
+                print(f"    очередь: {processor.stats()}")
+                failures += mismatched
+        repo.close()
+        close_pool()
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
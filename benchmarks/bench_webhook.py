@@ -0,0 +1,206 @@
+"""
+Приём обновлений через вебхук и через long polling на настоящем приложении бота (main.build_application).
+
+Bot API подменён локальным FakeBotApi: каждый вызов занимает RTT. В режиме вебхука «Telegram»
+присылает записанные обновления POST-запросами на встроенный HTTP-сервер python-telegram-bot
+(не больше MAX_CONNECTIONS одновременно), в режиме polling те же обновления забираются getUpdates.
+Обновления — /start от зарегистрированных учеников; бот отвечает на каждое двумя сообщениями
+(приветствие и меню), обработанным считается обновление, на которое пришёл второй ответ.
+
+Сначала проверяется секретный токен вебхука: запрос без заголовка или с неверным токеном
+отклоняется с кодом 403, а обновление не обрабатывается. Затем сравниваются пропускная
+способность и задержка от отправки обновления до первого ответа бота при умеренной нагрузке
+и при всплеске.
+Завершается с кодом 1, если какая-то проверка не прошла: запрос с неверным токеном принят,
+обновление осталось без ответа или ответы в чате пришли не по порядку (меню раньше приветствия).
+
+Запуск: python -m benchmarks.bench_webhook
+"""
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+import httpx
+from telegram.ext import Application
+
+import database
+from benchmarks.fake_telegram import BOT_TOKEN, FakeBotApi, make_update
+from benchmarks.seed import clear_persistence, seed_database
+from connection import init_pool, close_pool
+from main import build_application
+from repository import repo
+
+STUDENTS = 150
+RTT = 0.02  # Время ответа Bot API и доставки обновления, секунды
+ARRIVAL_RATES = (15, 200)  # Обновлений в секунду от пользователей
+MAX_CONNECTIONS = 40
+SECRET_TOKEN = "bench-secret"
+REPLIES_PER_UPDATE = 2
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def make_application(api):
+    builder = Application.builder().token(BOT_TOKEN).request(api).get_updates_request(api)
+    return build_application(builder)
+
+
+async def wait_replies(api, expected, timeout=60):
+    deadline = time.perf_counter() + timeout
+    while len(api.sent) < expected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+
+
+def summarize(label, api, sent_at, started):
+    """Печатает итоги и возвращает количество необработанных обновлений и чатов с ответами не по порядку."""
+    first_reply = {}
+    first_text = {}
+    replies = {}
+    for chat_id, text, at in api.sent:
+        first_reply.setdefault(chat_id, at)
+        first_text.setdefault(chat_id, text)
+        replies[chat_id] = replies.get(chat_id, 0) + 1
+    handled = [chat_id for chat_id in sent_at if replies.get(chat_id) == REPLIES_PER_UPDATE]
+    # Первым в чат должно уйти приветствие, меню — вторым
+    unordered = sum(1 for chat_id in handled if not first_text[chat_id].startswith("Добро пожаловать"))
+    latencies = sorted((first_reply[chat_id] - sent_at[chat_id]) * 1000 for chat_id in handled)
+    finished = max(api.sent[-1][2], max(sent_at.values())) if api.sent else time.perf_counter()
+    elapsed = finished - started
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else float('nan')
+    print(f"  {label:<10} обработано {len(handled)}/{len(sent_at)}  {len(handled) / elapsed:6.1f} обновл./с  "
+          f"задержка p50 {statistics.median(latencies) if latencies else float('nan'):6.1f} мс  p99 {p99:6.1f} мс  "
+          f"вызовов getUpdates {api.calls['getUpdates']}")
+    if unordered:
+        print(f"  ответы не по порядку в {unordered} чатах")
+    return len(sent_at) - len(handled) + unordered
+
+
+async def check_secret(client, url, api):
+    """Запросы без секретного токена или с чужим токеном должны отклоняться."""
+    failures = 0
+    update = make_update(1, 1, "/start")
+    for label, headers in (("без токена", {}), ("с неверным токеном", {'X-Telegram-Bot-Api-Secret-Token': "wrong"})):
+        response = await client.post(url, json=update, headers=headers)
+        ok = response.status_code == 403
+        failures += not ok
+        print(f"  запрос {label}: HTTP {response.status_code} {'(отклонён)' if ok else '— ожидался 403'}")
+    response = await client.post(url, json=update, headers={'X-Telegram-Bot-Api-Secret-Token': SECRET_TOKEN})
+    ok = response.status_code == 200
+    failures += not ok
+    print(f"  запрос с верным токеном: HTTP {response.status_code}")
+    await wait_replies(api, REPLIES_PER_UPDATE, timeout=5)
+    # Незарегистрированному пользователю бот отвечает одним сообщением с просьбой ввести пароль
+    if [chat_id for chat_id, _, _ in api.sent] != [1]:
+        print(f"  ожидался один ответ пользователю 1, отправлено: {api.sent}")
+        failures += 1
+    api.sent.clear()
+    return failures
+
+
+async def run_webhook(path, telegram_ids, rate, check=False):
+    clear_persistence(path)
+    api = FakeBotApi(rtt=RTT)
+    application = make_application(api)
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/telegram"
+
+    await application.initialize()
+    await application.post_init(application)
+    await application.updater.start_webhook(
+        listen='127.0.0.1', port=port, url_path='telegram', webhook_url=url,
+        secret_token=SECRET_TOKEN, max_connections=MAX_CONNECTIONS,
+    )
+    await application.start()
+
+    limits = httpx.Limits(max_connections=MAX_CONNECTIONS)
+    async with httpx.AsyncClient(limits=limits) as client:
+        failures = await check_secret(client, url, api) if check else 0
+        headers = {'X-Telegram-Bot-Api-Secret-Token': SECRET_TOKEN}
+        connections = asyncio.Semaphore(MAX_CONNECTIONS)
+        sent_at = {}
+
+        async def deliver(update):
+            async with connections:
+                await asyncio.sleep(RTT / 2)  # Путь от Telegram до бота
+                response = await client.post(url, json=update, headers=headers)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        deliveries = []
+        for number, telegram_id in enumerate(telegram_ids, start=10):
+            await asyncio.sleep(max(0.0, started + (number - 10) / rate - time.perf_counter()))
+            sent_at[telegram_id] = time.perf_counter()
+            deliveries.append(asyncio.create_task(deliver(make_update(number, telegram_id, "/start"))))
+        await asyncio.gather(*deliveries)
+        await wait_replies(api, REPLIES_PER_UPDATE * len(telegram_ids))
+        failures += summarize("webhook", api, sent_at, started)
+
+    await application.updater.stop()
+    await application.stop()
+    await application.post_stop(application)
+    await application.shutdown()
+    await application.post_shutdown(application)
+    return failures
+
+
+async def run_polling(path, telegram_ids, rate):
+    clear_persistence(path)
+    api = FakeBotApi(rtt=RTT)
+    application = make_application(api)
+
+    await application.initialize()
+    await application.post_init(application)
+    await application.updater.start_polling(timeout=10)
+    await application.start()
+
+    sent_at = {}
+    started = time.perf_counter()
+    for number, telegram_id in enumerate(telegram_ids, start=10):
+        await asyncio.sleep(max(0.0, started + (number - 10) / rate - time.perf_counter()))
+        sent_at[telegram_id] = time.perf_counter()
+        api.push(make_update(number, telegram_id, "/start"))
+    await wait_replies(api, REPLIES_PER_UPDATE * len(telegram_ids))
+    failures = summarize("polling", api, sent_at, started)
+
+    await application.updater.stop()
+    await application.stop()
+    await application.post_stop(application)
+    await application.shutdown()
+    await application.post_shutdown(application)
+    return failures
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        init_pool(path)
+        database.create_tables()
+        telegram_ids = seed_database(path, students=STUDENTS)
+
+        # Предупреждения ConversationHandler о per_message к замеру не относятся
+        warnings.filterwarnings('ignore', message=".*per_message.*")
+
+        failures = 0
+        for rate in ARRIVAL_RATES:
+            print(f"{STUDENTS} обновлений по {rate}/с, RTT Bot API {RTT * 1000:.0f} мс, "
+                  f"вебхук: до {MAX_CONNECTIONS} соединений")
+            failures += asyncio.run(run_webhook(path, telegram_ids, rate, check=rate == ARRIVAL_RATES[0]))
+            failures += asyncio.run(run_polling(path, telegram_ids, rate))
+        repo.close()
+        close_pool()
+    if failures:
+        print(f"Проверки не пройдены: {failures}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
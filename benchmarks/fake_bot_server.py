@@ -0,0 +1,228 @@
+"""
+Локальный HTTP-сервер, который выдаёт себя за Bot API, для нагрузочного теста (benchmarks.load_test).
+
+В отличие от FakeBotApi (fake_telegram.py), который подменяет HTTP-клиент внутри процесса бота, сюда бот
+ходит по настоящему HTTP: ApplicationBuilder().base_url(server.base_url). Поддерживаются getMe,
+getUpdates (long polling), setWebhook / deleteWebhook (обновления доставляются POST-запросами на адрес
+вебхука с секретным токеном и не больше max_connections одновременно), sendMessage, editMessageText,
+answerCallbackQuery; остальные методы отвечают True.
+
+Каждый вызов метода занимает latency секунд (половина — запрос, половина — ответ), доставка обновления
+боту — latency / 2. Доля flood_share вызовов, отправляющих сообщения, получает ответ 429 с retry_after,
+как при превышении лимитов Telegram.
+
+Сервер отмечает время первого ответа бота в каждом чате: expect(chat_id) возвращает future, которая
+получит время ответа на следующее обновление этого чата.
+"""
+import asyncio
+import collections
+import json
+import random
+import time
+
+import httpx
+import tornado.httpserver
+import tornado.netutil
+import tornado.web
+
+from benchmarks.fake_telegram import BOT_ID, BOT_TOKEN
+
+# Методы, которые отвечают пользователю: на них срабатывает expect и внедряется 429
+REPLY_METHODS = frozenset({'sendMessage', 'editMessageText', 'answerCallbackQuery'})
+
+
+class _ApiHandler(tornado.web.RequestHandler):
+    def initialize(self, server):
+        self.server = server
+
+    async def post(self, token, method):
+        if token != BOT_TOKEN:
+            self.set_status(401)
+            self.finish({'ok': False, 'error_code': 401, 'description': "Unauthorized"})
+            return
+        params = {name: values[0].decode() for name, values in self.request.body_arguments.items()}
+        params.update({name: values[0].decode() for name, values in self.request.query_arguments.items()})
+        status, result = await self.server.call(method, params)
+        self.set_status(status)
+        self.set_header('Content-Type', 'application/json')
+        self.finish(json.dumps(result))
+
+    get = post
+
+
+class FakeBotServer:
+    """
+    Bot API по HTTP на 127.0.0.1.
+
+    :param latency: Время выполнения вызова Bot API (туда и обратно), секунды.
+    :param flood_share: Доля вызовов sendMessage / editMessageText / answerCallbackQuery, получающих 429.
+    :param retry_after: Значение retry_after в ответах 429, секунды.
+    :param seed: Зерно генератора, выбирающего вызовы для 429.
+    """
+
+    def __init__(self, latency=0.0, flood_share=0.0, retry_after=1, seed=1):
+        self.latency = latency
+        self.flood_share = flood_share
+        self.retry_after = retry_after
+        self.calls = collections.Counter()
+        self.flooded = 0
+        self.webhook_errors = 0
+        self.replies = 0
+        self.webhook = None  # (url, secret_token) после setWebhook
+        self.ready = asyncio.Event()  # Бот начал получать обновления: первый getUpdates или setWebhook
+        self._rnd = random.Random(seed)
+        self._updates = collections.deque()
+        self._new_updates = asyncio.Event()
+        self._waiters = {}  # chat_id -> future времени первого ответа
+        self._callback_chats = {}  # id callback query -> chat_id
+        self._message_id = 0
+        self._server = None
+        self._client = None
+        self._connections = None
+        self._deliveries = set()
+        self.port = None
+
+    @property
+    def base_url(self):
+        """Значение для ApplicationBuilder.base_url."""
+        return f"http://127.0.0.1:{self.port}/bot"
+
+    async def start(self):
+        # Журнал запросов tornado не ведём: при внедрении 429 он печатал бы каждый ответ
+        app = tornado.web.Application([(r"/bot([^/]+)/(\w+)", _ApiHandler, {'server': self})],
+                                      log_function=lambda handler: None)
+        sockets = tornado.netutil.bind_sockets(0, '127.0.0.1')
+        self.port = sockets[0].getsockname()[1]
+        self._server = tornado.httpserver.HTTPServer(app)
+        self._server.add_sockets(sockets)
+
+    async def stop(self):
+        # Отпускаем незавершённые long polling запросы, чтобы их обработчики успели ответить
+        self._new_updates.set()
+        await asyncio.sleep(self.latency + 0.05)
+        for delivery in list(self._deliveries):
+            delivery.cancel()
+        await asyncio.gather(*self._deliveries, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+        self._server.stop()
+        await self._server.close_all_connections()
+
+    def push(self, update):
+        """Новое обновление от пользователя: в очередь getUpdates или сразу на вебхук."""
+        query = update.get('callback_query')
+        if query:
+            self._callback_chats[query['id']] = query['from']['id']
+        if self.webhook:
+            delivery = asyncio.get_running_loop().create_task(self._deliver(update))
+            self._deliveries.add(delivery)
+            delivery.add_done_callback(self._deliveries.discard)
+        else:
+            self._updates.append(update)
+            self._new_updates.set()
+
+    def expect(self, chat_id):
+        """Future, которая получит время (time.perf_counter) первого ответа бота в чате chat_id."""
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[chat_id] = waiter
+        return waiter
+
+    def message(self, chat_id, text):
+        """Сообщение бота в формате Bot API (например, для callback query)."""
+        self._message_id += 1
+        return {'message_id': self._message_id, 'date': int(time.time()), 'text': text,
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': {'id': BOT_ID, 'is_bot': True, 'first_name': "Bot"}}
+
+    async def call(self, method, params):
+        """Выполняет вызов Bot API: (HTTP-статус, тело ответа)."""
+        self.calls[method] += 1
+        await asyncio.sleep(self.latency / 2)
+        if method in REPLY_METHODS and self.flood_share and self._rnd.random() < self.flood_share:
+            self.flooded += 1
+            status, result = 429, {'ok': False, 'error_code': 429,
+                                   'description': f"Too Many Requests: retry after {self.retry_after}",
+                                   'parameters': {'retry_after': self.retry_after}}
+        else:
+            handler = getattr(self, f"_api_{method}", None)
+            status, result = await handler(params) if handler else (200, True)
+            if status == 200:
+                result = {'ok': True, 'result': result}
+        await asyncio.sleep(self.latency / 2)
+        return status, result
+
+    def _replied(self, chat_id):
+        self.replies += 1
+        waiter = self._waiters.pop(chat_id, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(time.perf_counter())
+
+    async def _deliver(self, update):
+        url, secret_token = self.webhook
+        async with self._connections:
+            await asyncio.sleep(self.latency / 2)
+            try:
+                response = await self._client.post(url, json=update,
+                                                   headers={'X-Telegram-Bot-Api-Secret-Token': secret_token})
+                if response.status_code != 200:
+                    self.webhook_errors += 1
+            except httpx.HTTPError:
+                self.webhook_errors += 1
+
+    async def _api_getMe(self, params):
+        return 200, {'id': BOT_ID, 'is_bot': True, 'first_name': "Bot", 'username': "test_bot",
+                     'can_join_groups': True, 'can_read_all_group_messages': False, 'supports_inline_queries': True}
+
+    async def _api_getUpdates(self, params):
+        if self.webhook:
+            return 409, {'ok': False, 'error_code': 409,
+                         'description': "Conflict: can't use getUpdates method while webhook is active"}
+        self.ready.set()
+        # Подтверждённые обновления (update_id < offset) Telegram больше не присылает
+        offset = int(params.get('offset') or 0)
+        while self._updates and self._updates[0]['update_id'] < offset:
+            self._updates.popleft()
+        timeout = float(params.get('timeout') or 0)
+        if not self._updates and timeout:
+            # Long polling: ждём первого обновления, но не дольше timeout
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        limit = int(params.get('limit') or 100)
+        return 200, [update for _, update in zip(range(limit), self._updates)]
+
+    async def _api_setWebhook(self, params):
+        max_connections = int(params.get('max_connections') or 40)
+        self.webhook = (params['url'], params.get('secret_token', ''))
+        self._connections = asyncio.Semaphore(max_connections)
+        if self._client is None:
+            self._client = httpx.AsyncClient(limits=httpx.Limits(max_connections=max_connections))
+        # Накопленные до установки вебхука обновления уходят на него
+        while self._updates:
+            self.push(self._updates.popleft())
+        self.ready.set()
+        return 200, True
+
+    async def _api_deleteWebhook(self, params):
+        self.webhook = None
+        return 200, True
+
+    async def _api_sendMessage(self, params):
+        chat_id = int(params['chat_id'])
+        self._replied(chat_id)
+        return 200, self.message(chat_id, params['text'])
+
+    async def _api_editMessageText(self, params):
+        chat_id = int(params['chat_id'])
+        self._replied(chat_id)
+        message = self.message(chat_id, params['text'])
+        message['message_id'] = int(params['message_id'])
+        return 200, message
+
+    async def _api_answerCallbackQuery(self, params):
+        chat_id = self._callback_chats.pop(params['callback_query_id'], None)
+        if chat_id is not None:
+            self._replied(chat_id)
+        return 200, True
@@ -0,0 +1,127 @@
+"""
+Локальный фейковый Bot API для бенчмарков, которые запускают настоящее приложение python-telegram-bot.
+
+FakeBotApi подключается к ApplicationBuilder вместо HTTP-клиента (request / get_updates_request)
+и отвечает на вызовы Bot API сам, без сети: запрос идёт до «Telegram» rtt / 2 секунд и столько же
+возвращается ответ (в том числе ответ long polling после появления обновления).
+Обновления для getUpdates кладутся в очередь методом push; отправленные ботом сообщения
+записываются в sent вместе со временем отправки.
+"""
+import asyncio
+import collections
+import json
+import time
+
+from telegram.request import BaseRequest
+
+BOT_ID = 123
+BOT_TOKEN = f"{BOT_ID}:TEST"
+
+
+def make_update(update_id, user_id, text, date=0):
+    """
+    Собирает JSON обновления с текстовым сообщением от пользователя в личном чате.
+
+    :param update_id: Номер обновления.
+    :param user_id: Telegram ID отправителя (он же ID чата).
+    :param text: Текст сообщения; если начинается с «/», размечается как команда.
+    :return: Словарь в формате Bot API.
+    """
+    message = {
+        'message_id': update_id,
+        'date': date,
+        'chat': {'id': user_id, 'type': 'private', 'first_name': f"User {user_id}"},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}"},
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+
+def make_callback_update(update_id, user_id, data, message):
+    """
+    Собирает JSON обновления с нажатием на inline-кнопку под сообщением бота.
+
+    :param update_id: Номер обновления (он же ID callback query).
+    :param user_id: Telegram ID нажавшего (он же ID чата).
+    :param data: callback_data кнопки.
+    :param message: Сообщение бота с кнопкой в формате Bot API.
+    :return: Словарь в формате Bot API.
+    """
+    return {'update_id': update_id, 'callback_query': {
+        'id': str(update_id),
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}"},
+        'chat_instance': str(user_id),
+        'message': message,
+        'data': data,
+    }}
+
+
+class FakeBotApi(BaseRequest):
+    """
+    Bot API в памяти процесса.
+
+    :param rtt: Время прохождения запроса туда и обратно, секунды.
+    """
+
+    def __init__(self, rtt=0.0):
+        self.rtt = rtt
+        self.updates = collections.deque()
+        self.sent = []  # (chat_id, text, время отправки по time.perf_counter())
+        self.calls = collections.Counter()
+        self._new_updates = None
+        self._message_id = 0
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        if self._new_updates is None:
+            self._new_updates = asyncio.Event()
+
+    async def shutdown(self):
+        pass
+
+    def push(self, update):
+        """Кладёт обновление в очередь getUpdates, как будто пользователь только что написал боту."""
+        self.updates.append(update)
+        if self._new_updates is not None:
+            self._new_updates.set()
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        name = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.calls[name] += 1
+        await asyncio.sleep(self.rtt / 2)
+        handler = getattr(self, f"_api_{name}", None)
+        result = await handler(params) if handler else True
+        await asyncio.sleep(self.rtt / 2)
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+    async def _api_getMe(self, params):
+        return {'id': BOT_ID, 'is_bot': True, 'first_name': "Bot", 'username': "test_bot",
+                'can_join_groups': True, 'can_read_all_group_messages': False, 'supports_inline_queries': True}
+
+    async def _api_getUpdates(self, params):
+        # Подтверждённые обновления (update_id < offset) Telegram больше не присылает
+        offset = params.get('offset') or 0
+        while self.updates and self.updates[0]['update_id'] < offset:
+            self.updates.popleft()
+        if not self.updates and params.get('timeout'):
+            # Long polling: ждём первого обновления, но не дольше timeout
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), params['timeout'])
+            except asyncio.TimeoutError:
+                pass
+        limit = params.get('limit') or 100
+        return [update for _, update in zip(range(limit), self.updates)]
+
+    async def _api_sendMessage(self, params):
+        self._message_id += 1
+        self.sent.append((params['chat_id'], params['text'], time.perf_counter()))
+        return {'message_id': self._message_id, 'date': int(time.time()), 'text': params['text'],
+                'chat': {'id': params['chat_id'], 'type': 'private'}}
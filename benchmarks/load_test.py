@@ -0,0 +1,222 @@
+"""
+Нагрузочный тест: сколько учеников выдерживает один процесс бота.
+
+Бот (main.build_application) запускается в отдельном процессе, как в бою — run_polling или run_webhook, —
+и ходит по HTTP к локальному серверу Bot API (benchmarks.fake_bot_server) через
+ApplicationBuilder().base_url(...). Сервер вносит задержку каждого вызова (--latency) и с долей --flood
+отвечает 429 на отправку сообщений.
+
+В том же процессе, что и сервер, работают виртуальные пользователи: ученики и --admins администраторов.
+Каждый начинает с /start, затем выбирает действия с весами STUDENT_MIX / ADMIN_MIX, ждёт первого ответа
+бота (не дольше REPLY_TIMEOUT) и делает паузу со средним --think секунд, как живой человек.
+Для каждого числа учеников из --students и каждого режима (--mode) выводятся:
+  - обработано обновлений в секунду за время замера (после --warmup секунд разогрева);
+  - задержка от отправки обновления до первого ответа бота: p50, p90, p99 и максимум;
+  - доля обновлений без ответа, число ответов 429, ошибок в обработчиках бота и отказов вебхука;
+  - доля процессора, которую заняли сервер и пользователи: если она близка к 100%, упёрлись в нагрузчик.
+Когда бот перестаёт успевать, число обработанных обновлений в секунду перестаёт расти вместе с
+предложенной нагрузкой (ученики / think), а задержка растёт.
+
+Запуск: python -m benchmarks.load_test [--mode polling webhook] [--students 50 200 800] [--admins 2]
+                                       [--duration 15] [--warmup 5] [--think 2] [--latency 0.02] [--flood 0]
+"""
+import argparse
+import asyncio
+import itertools
+import multiprocessing
+import os
+import random
+import socket
+import tempfile
+import time
+import warnings
+
+from telegram.error import RetryAfter
+from telegram.ext import Application
+
+import database
+from benchmarks.fake_bot_server import FakeBotServer
+from benchmarks.fake_telegram import BOT_TOKEN, make_callback_update, make_update
+from benchmarks.seed import clear_persistence, seed_database
+from callbacks import pack
+from connection import init_pool, close_pool
+from core.config import ADMIN_IDS, WEBHOOK_MAX_CONNECTIONS
+from main import build_application
+from repository import repo
+
+REPLY_TIMEOUT = 10
+SECRET_TOKEN = "load-test-secret"
+STUDENT = "{student}"  # Подставляется ID случайного ученика
+
+# Действия пользователей: (вес, текст сообщения или кортеж действия inline-кнопки с аргументами)
+STUDENT_MIX = [
+    (1, "/start"),
+    (4, "Домашнее задание"),
+    (2, "Конспекты"),
+    (2, "Актуальный вариант"),
+    (2, "Подключиться к занятию"),
+    (1, ('return_to_menu',)),
+]
+ADMIN_MIX = [
+    (1, "/start"),
+    (2, "Информация об ученике"),
+    (2, "/find Ученик " + STUDENT),
+    (3, ('show_info', STUDENT)),
+]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def run_bot(path, base_url, mode, admins, errors, flood_errors):
+    """Процесс бота: то же, что main.main, но с Bot API по адресу base_url."""
+    warnings.filterwarnings('ignore', message=".*per_message.*")
+    ADMIN_IDS.extend(range(1, admins + 1))
+    init_pool(path)
+    application = build_application(Application.builder().token(BOT_TOKEN).base_url(base_url))
+
+    async def count_error(update, context):
+        counter = flood_errors if isinstance(context.error, RetryAfter) else errors
+        with counter.get_lock():
+            counter.value += 1
+
+    application.add_error_handler(count_error)
+    if mode == "webhook":
+        port = free_port()
+        application.run_webhook(
+            listen='127.0.0.1', port=port, url_path='telegram', webhook_url=f"http://127.0.0.1:{port}/telegram",
+            secret_token=SECRET_TOKEN, max_connections=WEBHOOK_MAX_CONNECTIONS,
+        )
+    else:
+        application.run_polling()
+    repo.close()
+    close_pool()
+
+
+class Driver:
+    """
+    Виртуальные пользователи: отправляют обновления на сервер и записывают задержку ответов.
+
+    :param server: FakeBotServer.
+    :param students: Telegram ID учеников.
+    :param admins: Telegram ID администраторов.
+    :param think: Средняя пауза пользователя между действиями, секунды.
+    """
+
+    def __init__(self, server, students, admins, think, seed=1):
+        self.server = server
+        self.students = students
+        self.admins = admins
+        self.think = think
+        self.rnd = random.Random(seed)
+        self.update_ids = itertools.count(1)
+        self.results = []  # (время отправки, задержка в секундах или None, если ответа не было)
+
+    def render(self, action):
+        student_id = self.rnd.randint(1, len(self.students))
+        if isinstance(action, str):
+            return action.replace(STUDENT, str(student_id))
+        return tuple(student_id if arg == STUDENT else arg for arg in action)
+
+    def make(self, user_id, action):
+        update_id = next(self.update_ids)
+        if isinstance(action, str):
+            return make_update(update_id, user_id, action)
+        return make_callback_update(update_id, user_id, pack(*action), self.server.message(user_id, "Меню"))
+
+    async def user(self, user_id, mix, deadline):
+        weights = [weight for weight, _ in mix]
+        actions = [action for _, action in mix]
+        await asyncio.sleep(self.rnd.uniform(0, self.think))  # Пользователи приходят не одновременно
+        action = "/start"
+        while time.perf_counter() < deadline:
+            update = self.make(user_id, self.render(action))
+            waiter = self.server.expect(user_id)
+            sent = time.perf_counter()
+            self.server.push(update)
+            try:
+                replied = await asyncio.wait_for(waiter, REPLY_TIMEOUT)
+                self.results.append((sent, replied - sent))
+            except asyncio.TimeoutError:
+                self.results.append((sent, None))
+            await asyncio.sleep(self.rnd.expovariate(1 / self.think))
+            action = self.rnd.choices(actions, weights)[0]
+
+    async def run(self, duration):
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(
+            *(self.user(user_id, STUDENT_MIX, deadline) for user_id in self.students),
+            *(self.user(user_id, ADMIN_MIX, deadline) for user_id in self.admins),
+        )
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))] * 1000 if values else float('nan')
+
+
+async def run_step(path, mode, telegram_ids, args):
+    clear_persistence(path)
+    server = FakeBotServer(latency=args.latency, flood_share=args.flood)
+    await server.start()
+    context = multiprocessing.get_context("spawn")
+    errors, flood_errors = context.Value('i', 0), context.Value('i', 0)
+    bot = context.Process(target=run_bot, args=(path, server.base_url, mode, args.admins, errors, flood_errors))
+    bot.start()
+    loop = asyncio.get_running_loop()
+    try:
+        await asyncio.wait_for(server.ready.wait(), 60)
+        driver = Driver(server, telegram_ids, list(range(1, args.admins + 1)), args.think)
+        started, cpu = time.perf_counter(), time.process_time()
+        await driver.run(args.duration + args.warmup)
+        # Если сервер и пользователи сами занимают процессор, предел покажет нагрузчик, а не бот
+        cpu_share = (time.process_time() - cpu) / (time.perf_counter() - started)
+    finally:
+        # Остановка по SIGTERM, как у работающего бота; сервер должен отвечать, пока бот завершается
+        bot.terminate()
+        await loop.run_in_executor(None, bot.join)
+        await server.stop()
+
+    window = [latency for sent, latency in driver.results if sent >= started + args.warmup]
+    latencies = sorted(latency for latency in window if latency is not None)
+    lost = len(window) - len(latencies)
+    print(f"  {mode:<8} {len(telegram_ids):5} учеников: {len(latencies) / args.duration:7.1f} обновл./с "
+          f"(предложено ~{(len(telegram_ids) + args.admins) / args.think:6.1f}), задержка "
+          f"p50 {percentile(latencies, 0.5):6.1f} p90 {percentile(latencies, 0.9):6.1f} "
+          f"p99 {percentile(latencies, 0.99):7.1f} max {percentile(latencies, 1):7.1f} мс, "
+          f"без ответа {lost / max(len(window), 1):.1%}, 429: {server.flooded}, "
+          f"ошибок бота {errors.value + flood_errors.value} (из них RetryAfter {flood_errors.value}), "
+          f"отказов вебхука {server.webhook_errors}; CPU нагрузчика {cpu_share:.0%}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота с локальным Bot API")
+    parser.add_argument('--mode', nargs='+', choices=("polling", "webhook"), default=("polling", "webhook"))
+    parser.add_argument('--students', type=int, nargs='+', default=(50, 200, 800),
+                        help="Число одновременно работающих учеников (по шагу на значение)")
+    parser.add_argument('--admins', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=15, help="Длительность замера, секунды")
+    parser.add_argument('--warmup', type=float, default=5, help="Разогрев перед замером, секунды")
+    parser.add_argument('--think', type=float, default=2, help="Средняя пауза пользователя, секунды")
+    parser.add_argument('--latency', type=float, default=0.02, help="Время вызова Bot API, секунды")
+    parser.add_argument('--flood', type=float, default=0, help="Доля отправок сообщений с ответом 429")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "load.db")
+        init_pool(path)
+        database.create_tables()
+        telegram_ids = seed_database(path, students=max(args.students), tasks_per_exam=30, notes_per_exam=30)
+        close_pool()
+
+        print(f"Bot API {args.latency * 1000:.0f} мс на вызов, 429 на {args.flood:.0%} отправок, "
+              f"пауза пользователя ~{args.think} с, администраторов {args.admins}")
+        for mode in args.mode:
+            for students in args.students:
+                asyncio.run(run_step(path, mode, telegram_ids[:students], args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+"""
+Проверка планов горячих запросов: ни один не должен выполнять SCAN по таблице.
+
+Запуск: python -m benchmarks.query_plans [путь к базе]
+Код возврата 1, если найден полный просмотр таблицы.
+"""
+import os
+import sys
+import tempfile
+
+import database
+from connection import init_pool, close_pool
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(tmp, "plans.db")
+        init_pool(path)
+        database.create_tables()
+        offenders = database.find_full_scans()
+        close_pool()
+
+    for query, detail in offenders:
+        print(f"{detail}\n    {query}")
+    if offenders:
+        sys.exit(1)
+    print(f"Все {len(database.HOT_QUERIES)} горячих запросов используют индексы.")
+
+
+if __name__ == '__main__':
+    main()
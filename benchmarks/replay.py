@@ -0,0 +1,189 @@
+"""
+Воспроизведение записанных обновлений (recorder.UpdateRecorder) для профилирования реального трафика.
+
+Настоящее приложение (main.build_application) запускается на копии снимка базы, сделанного при начале
+записи, с фейковым Bot API (benchmarks.fake_telegram, каждый вызов занимает --rtt секунд), и получает
+обновления из записи через ту же очередь, что и при polling. С --speed 1 обновления приходят с исходными
+паузами, с --speed N — в N раз быстрее, с --speed 0 — все сразу, насколько успевает бот.
+
+Для каждого обновления замеряется время обработки (без ожидания очереди своего чата); обновления
+группируются по виду: команда, кнопка меню (текст, который отправляли несколько пользователей — так
+в сводку не попадают пароли и имена), действие inline-кнопки, прочие сообщения. Результаты записываются
+в JSON в формате benchmarks.bench_suite; с --baseline медианы сравниваются с прошлым воспроизведением
+той же записи (например, на предыдущей версии бота), код возврата 1 при регрессии.
+
+Сравнивать имеет смысл воспроизведения с одинаковыми --speed и --rtt: обновления разных чатов
+обрабатываются одновременно, и без пауз время каждого включает работу остальных.
+Время в боте при ускоренном воспроизведении идёт быстрее записи: тайм-ауты диалогов и задания job queue
+срабатывают иначе, чем в исходной работе.
+
+Запуск: python -m benchmarks.replay updates-<время>.jsonl [--snapshot updates-<время>.db] [--speed 1]
+                                    [--rtt 0.02] [--output replay.json] [--baseline прошлый.json]
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import warnings
+
+from telegram import Update
+from telegram.ext import Application
+
+import database
+from benchmarks.bench_suite import compare, git_commit, summarize
+from benchmarks.fake_telegram import BOT_TOKEN, FakeBotApi
+from callbacks import StaleCallbackData, codec
+from concurrency import PerChatUpdateProcessor
+from connection import init_pool, close_pool
+from main import build_application
+from recorder import read_recording
+from repository import repo
+
+FORMAT = 1  # Версия формата JSON (та же, что у bench_suite)
+
+
+def button_texts(records):
+    """Тексты сообщений, которые отправляли несколько пользователей: кнопки меню, а не личные данные."""
+    senders = collections.defaultdict(set)
+    for _, update in records:
+        message = update.get('message')
+        if message and message.get('text') and 'from' in message:
+            senders[message['text']].add(message['from']['id'])
+    return {text for text, users in senders.items() if len(users) > 1}
+
+
+def update_kind(update, buttons):
+    """Вид обновления для сводки."""
+    if update.message and update.message.text:
+        text = update.message.text
+        if text.startswith('/'):
+            return text.split()[0].split('@')[0]
+        return text if text in buttons else "сообщение"
+    if update.message:
+        return "сообщение без текста"
+    if update.callback_query:
+        try:
+            action, _ = codec.unpack(update.callback_query.data or "")
+        except StaleCallbackData:
+            return "кнопка: устаревшая"
+        return f"кнопка: {action}"
+    if update.inline_query:
+        return "inline-запрос"
+    return "другое"
+
+
+class TimingUpdateProcessor(PerChatUpdateProcessor):
+    """PerChatUpdateProcessor, который замеряет время обработки каждого обновления по видам."""
+
+    def __init__(self, buttons, **kwargs):
+        super().__init__(**kwargs)
+        self.buttons = buttons
+        self.timings = collections.defaultdict(list)
+
+    async def do_process_update(self, update, coroutine):
+        async def timed():
+            # Выполняется после получения блокировки чата: ожидание очереди в замер не входит
+            started = time.perf_counter()
+            try:
+                await coroutine
+            finally:
+                self.timings[update_kind(update, self.buttons)].append(time.perf_counter() - started)
+
+        await super().do_process_update(update, timed())
+
+
+async def replay(records, speed, rtt):
+    api = FakeBotApi(rtt=rtt)
+    processor = TimingUpdateProcessor(button_texts(records))
+    builder = Application.builder().token(BOT_TOKEN).request(api).get_updates_request(api)
+    application = build_application(builder, processor)
+
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+
+    started = time.perf_counter()
+    first = records[0][0] if records else 0
+    for received, data in records:
+        if speed:
+            await asyncio.sleep(max(0.0, started + (received - first) / speed - time.perf_counter()))
+        await application.update_queue.put(Update.de_json(data, application.bot))
+    while processor.processed < len(records):
+        await asyncio.sleep(0.005)
+    elapsed = time.perf_counter() - started
+
+    await application.stop()
+    await application.post_stop(application)
+    await application.shutdown()
+    await application.post_shutdown(application)
+    return processor.timings, elapsed, api
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных обновлений")
+    parser.add_argument('recording', help="Файл записи обновлений (.jsonl)")
+    parser.add_argument('--snapshot', help="Снимок базы; по умолчанию — файл записи с расширением .db")
+    parser.add_argument('--speed', type=float, default=1, help="Ускорение относительно записи; 0 — без пауз")
+    parser.add_argument('--rtt', type=float, default=0.0, help="Время вызова Bot API, секунды")
+    parser.add_argument('--output', default="replay.json", help="Файл для результатов в JSON")
+    parser.add_argument('--baseline', help="Результаты прошлого воспроизведения для сравнения")
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help="Во сколько раз может вырасти медиана без сообщения о регрессии")
+    args = parser.parse_args()
+    snapshot = args.snapshot or os.path.splitext(args.recording)[0] + ".db"
+    records = read_recording(args.recording)
+
+    warnings.filterwarnings('ignore', message=".*per_message.*")
+    with tempfile.TemporaryDirectory() as tmp:
+        # Снимок не меняется: воспроизведение можно повторять с того же состояния
+        path = os.path.join(tmp, "replay.db")
+        shutil.copyfile(snapshot, path)
+        init_pool(path)
+        database.create_tables()  # Снимок прошлой версии приводится к текущей схеме
+        timings, elapsed, api = asyncio.run(replay(records, args.speed, args.rtt))
+        repo.close()
+        close_pool()
+
+    results = [{'kind': 'replay', 'name': name, **summarize(values),
+                'total_ms': round(sum(values) * 1000, 3)} for name, values in timings.items()]
+    results.sort(key=lambda row: row['total_ms'], reverse=True)
+    print(f"{len(records)} обновлений за {elapsed:.2f} с ({len(records) / elapsed:.1f} обновл./с), "
+          f"ускорение {args.speed or 'без пауз'}, вызовов Bot API {sum(api.calls.values())}")
+    for row in results:
+        print(f"  {row['name']:<40} {row['calls']:6}  всего {row['total_ms']:9.1f} мс  "
+              f"p50 {row['p50_ms']:8.3f}  p95 {row['p95_ms']:8.3f} мс")
+
+    report = {
+        'format': FORMAT,
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'config': {'recording': os.path.basename(args.recording), 'updates': len(records), 'speed': args.speed,
+                   'rtt': args.rtt, 'elapsed_s': round(elapsed, 3)},
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f"Результаты записаны в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for line in regressions:
+            print(f"Регрессия: {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+import random
+import sqlite3
+
+from utils import generate_password, natural_sort_key
+
+EXAMS = ['ОГЭ', 'ЕГЭ', 'Школьная программа']
+
+
+def seed_database(path, students=10_000, tasks_per_exam=0, notes_per_exam=0):
+    """
+    Заполняет базу синтетическими данными для бенчмарков.
+
+    :param path: Путь к файлу базы данных (таблицы должны быть уже созданы).
+    :param students: Количество учеников.
+    :param tasks_per_exam: Количество заданий на каждый экзамен ОГЭ/ЕГЭ.
+    :param notes_per_exam: Количество конспектов на каждый экзамен ОГЭ/ЕГЭ.
+    :return: Список telegram_id созданных учеников.
+    """
+    rnd = random.Random(42)
+    telegram_ids = [100_000 + i for i in range(students)]
+    with sqlite3.connect(path) as conn:
+        conn.executemany(
+            'INSERT INTO users (name, exam, password, telegram_id, homework, class_link, class_date, description) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                (f"Ученик {i}", rnd.choice(EXAMS), generate_password(), telegram_id,
+                 f"https://example.com/hw/{i}", f"https://example.com/class/{i}", "01.09.2024", None)
+                for i, telegram_id in enumerate(telegram_ids)
+            )
+        )
+        for exam in ('ОГЭ', 'ЕГЭ'):
+            for table, prefix, count in (('tasks', 'Задание', tasks_per_exam), ('notes', 'Конспект', notes_per_exam)):
+                numbers = list(range(count))
+                rnd.shuffle(numbers)  # Вставляем в случайном порядке, как при ручном наполнении
+                conn.executemany(
+                    f'INSERT INTO {table} (title, link, exam_type, sort_key) VALUES (?, ?, ?, ?)',
+                    ((f"{prefix} {i}", f"https://example.com/{table}/{i}", exam, natural_sort_key(f"{prefix} {i}"))
+                     for i in numbers)
+                )
+    return telegram_ids
+
+
+def clear_persistence(path):
+    """Удаляет сохранённые состояния диалогов и user_data, как перед первым запуском бота."""
+    with sqlite3.connect(path) as conn:
+        conn.execute('DELETE FROM persistence')
+        conn.execute('DELETE FROM conversations')
@@ -0,0 +1,214 @@
+import asyncio
+import datetime
+import json
+import time
+
+from telegram import InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+from core.config import BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_MAX_RETRIES, BROADCAST_PROGRESS_INTERVAL
+from repository import repo
+
+
+def retry_after_seconds(retry_after):
+    # В python-telegram-bot 22 retry_after может быть как числом, так и timedelta
+    if isinstance(retry_after, datetime.timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class TokenBucket:
+    """
+    Ограничитель скорости «ведро токенов».
+
+    Токены пополняются со скоростью rate в секунду, но не больше capacity; каждая отправка
+    забирает один токен. Так средняя скорость не превышает rate, а короткий всплеск — capacity.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        """Обнуляет ведро и не выдаёт токены ближайшие seconds секунд (например, после RetryAfter)."""
+        self._tokens = 0
+        self._updated = max(self._updated, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now >= self._updated:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    await asyncio.sleep((1 - self._tokens) / self.rate)
+                else:
+                    await asyncio.sleep(self._updated - now)
+
+
+class Broadcaster:
+    """
+    Рассылка одного сообщения множеству учеников.
+
+    Отправки идут параллельно (не больше concurrency одновременно) через общий TokenBucket,
+    чтобы держаться ниже глобального лимита Telegram. На RetryAfter приостанавливается
+    вся рассылка, на TimedOut/NetworkError сообщение повторяется с экспоненциальной паузой
+    не меньше секунды (так же соблюдается лимит 1 сообщение в секунду на чат).
+    Forbidden и BadRequest (бот заблокирован, чат не найден) не повторяются.
+
+    Рассылка и её получатели хранятся в базе, статус каждого получателя фиксируется после
+    отправки, поэтому прерванная рассылка продолжается с неотправленных (см. resume).
+    Доставка «хотя бы один раз»: сообщение, отправленное прямо перед остановкой бота,
+    может прийти повторно.
+    """
+
+    def __init__(self, rate=BROADCAST_RATE, concurrency=BROADCAST_CONCURRENCY, max_retries=BROADCAST_MAX_RETRIES,
+                 progress_interval=BROADCAST_PROGRESS_INTERVAL):
+        # Маленькое ведро: полное ведро на rate токенов дало бы в первую секунду до 2 * rate сообщений
+        self.limiter = TokenBucket(rate, capacity=1)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.progress_interval = progress_interval
+        self.retries = 0
+        self._tasks = set()
+
+    async def start(self, bot, text, telegram_ids, reply_markup=None, admin_chat_id=None):
+        """
+        Сохраняет рассылку и запускает её в фоне.
+
+        :param bot: Объект Bot.
+        :param text: Текст сообщения.
+        :param telegram_ids: Telegram ID получателей.
+        :param reply_markup: InlineKeyboardMarkup или None.
+        :param admin_chat_id: Чат, в котором показывается ход рассылки.
+        :return: ID рассылки.
+        """
+        markup = reply_markup.to_json() if reply_markup else None
+        broadcast_id = await repo.create_broadcast(text, markup, telegram_ids, admin_chat_id)
+        self._spawn(bot, broadcast_id)
+        return broadcast_id
+
+    async def resume(self, bot):
+        """Продолжает рассылки, прерванные остановкой бота. Вызывается при старте."""
+        for broadcast_id in await repo.get_unfinished_broadcasts():
+            self._spawn(bot, broadcast_id)
+
+    async def stop(self):
+        """Прерывает текущие рассылки; неотправленные получатели остаются в базе для resume."""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def join(self):
+        """Дожидается завершения всех запущенных рассылок."""
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _spawn(self, bot, broadcast_id):
+        task = asyncio.get_running_loop().create_task(self.run(bot, broadcast_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def run(self, bot, broadcast_id):
+        """
+        Отправляет сообщение всем ещё не обработанным получателям рассылки.
+
+        :return: Итог {'pending': ..., 'sent': ..., 'failed': ...}.
+        """
+        text, markup, admin_chat_id, _ = await repo.get_broadcast(broadcast_id)
+        reply_markup = InlineKeyboardMarkup.de_json(json.loads(markup), bot) if markup else None
+        progress = await repo.get_broadcast_progress(broadcast_id)
+
+        recipients = asyncio.Queue()
+        for telegram_id in await repo.get_pending_broadcast_recipients(broadcast_id):
+            recipients.put_nowait(telegram_id)
+
+        async def worker():
+            while not recipients.empty():
+                telegram_id = recipients.get_nowait()
+                status, error = await self._deliver(bot, telegram_id, text, reply_markup)
+                await repo.mark_broadcast_recipient(broadcast_id, telegram_id, status, error)
+                progress['pending'] -= 1
+                progress[status] += 1
+
+        reporter = _ProgressReporter(bot, admin_chat_id, self.limiter)
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency, recipients.qsize()))]
+        try:
+            while workers:
+                done, _ = await asyncio.wait(workers, timeout=self.progress_interval)
+                for task in done:
+                    task.result()
+                workers = [task for task in workers if not task.done()]
+                await reporter.report(progress, finished=not workers)
+        finally:
+            for task in workers:
+                task.cancel()
+
+        await repo.finish_broadcast(broadcast_id)
+        return progress
+
+    async def _deliver(self, bot, chat_id, text, reply_markup):
+        error = None
+        attempt = 0
+        while attempt <= self.max_retries:
+            await self.limiter.acquire()
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
+                return 'sent', None
+            except RetryAfter as retry:
+                # Telegram просит подождать: притормаживаем всю рассылку, попытку не засчитываем
+                self.retries += 1
+                self.limiter.pause(retry_after_seconds(retry.retry_after))
+                continue
+            except (Forbidden, BadRequest) as rejected:
+                return 'failed', str(rejected)
+            except NetworkError as failure:  # В том числе TimedOut
+                error = failure
+            except TelegramError as failure:
+                return 'failed', str(failure)
+            self.retries += 1
+            await asyncio.sleep(2 ** attempt)
+            attempt += 1
+        return 'failed', str(error)
+
+
+class _ProgressReporter:
+    """Сообщение администратору с ходом рассылки, которое обновляется по мере отправки."""
+
+    def __init__(self, bot, chat_id, limiter):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.limiter = limiter
+        self.message_id = None
+        self.last_text = None
+
+    async def report(self, progress, finished=False):
+        if self.chat_id is None:
+            return
+        total = sum(progress.values())
+        done = progress['sent'] + progress['failed']
+        title = "Рассылка завершена" if finished else "Идёт рассылка"
+        text = f"{title}: отправлено {progress['sent']} из {total}, ошибок {progress['failed']}."
+        if (not finished and done == 0) or text == self.last_text:
+            return
+
+        # Отчёт тоже расходует лимит сообщений бота
+        await self.limiter.acquire()
+        try:
+            if self.message_id is None:
+                message = await self.bot.send_message(chat_id=self.chat_id, text=text)
+                self.message_id = message.message_id
+            else:
+                await self.bot.edit_message_text(text, chat_id=self.chat_id, message_id=self.message_id)
+            self.last_text = text
+        except TelegramError as e:
+            print(f"Не удалось обновить отчёт о рассылке: {e}")
+
+
+# Общий экземпляр для всех обработчиков
+broadcaster = Broadcaster()
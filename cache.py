@@ -0,0 +1,73 @@
+from collections import OrderedDict
+
+from core.config import STUDENT_CACHE_SIZE
+
+
+class StudentCache:
+    """
+    LRU-кэш записей учеников (database.Student) по Telegram ID.
+
+    Используется только из цикла событий, поэтому обходится без блокировок.
+    Каждая инвалидация увеличивает version: запись, прочитанная из базы до инвалидации,
+    не попадёт в кэш (см. put), так что кэш не вернёт данные, перезаписанные во время чтения.
+    """
+
+    def __init__(self, maxsize=STUDENT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._records = OrderedDict()  # telegram_id -> Student
+        self._telegram_ids = {}  # student_id -> telegram_id
+
+    def get(self, telegram_id):
+        student = self._records.get(telegram_id)
+        if student is None:
+            self.misses += 1
+            return None
+        self._records.move_to_end(telegram_id)
+        self.hits += 1
+        return student
+
+    def put(self, telegram_id, student, version):
+        """
+        Сохраняет запись, если с момента чтения из базы не было инвалидаций.
+
+        :param telegram_id: Telegram ID ученика.
+        :param student: Запись Student.
+        :param version: Значение self.version, взятое до запроса к базе.
+        """
+        if version != self.version:
+            return
+        self._records[telegram_id] = student
+        self._records.move_to_end(telegram_id)
+        self._telegram_ids[student.id] = telegram_id
+        while len(self._records) > self.maxsize:
+            _, evicted = self._records.popitem(last=False)
+            self._telegram_ids.pop(evicted.id, None)
+
+    def invalidate(self, telegram_id):
+        self.version += 1
+        student = self._records.pop(telegram_id, None)
+        if student is not None:
+            self._telegram_ids.pop(student.id, None)
+
+    def invalidate_student(self, student_id):
+        self.version += 1
+        telegram_id = self._telegram_ids.pop(student_id, None)
+        if telegram_id is not None:
+            self._records.pop(telegram_id, None)
+
+    def clear(self):
+        self.version += 1
+        self._records.clear()
+        self._telegram_ids.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._records),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,386 @@
+import secrets
+import string
+from collections import OrderedDict
+
+from telegram import Update
+from telegram.ext import BaseHandler
+
+from core.config import CATALOG_EXAMS, CALLBACK_CACHE_SIZE
+
+# Версия формата callback_data — первый символ данных кнопки. Увеличивается, когда меняются
+# аргументы уже существующих действий: кнопки старых сообщений тогда считаются устаревшими,
+# а не разбираются по новой схеме
+VERSION = "1"
+# Данные, не поместившиеся в лимит Telegram, хранятся в кэше, а кнопка ссылается на запись
+CACHED = "~"
+SEPARATOR = "."
+ALPHABET = string.digits + string.ascii_letters
+MAX_LENGTH = 64  # Лимит Telegram на callback_data, байт
+
+
+def encode_number(number):
+    """Неотрицательное целое в строку по основанию len(ALPHABET)."""
+    digits = []
+    while True:
+        number, digit = divmod(number, len(ALPHABET))
+        digits.append(ALPHABET[digit])
+        if not number:
+            return "".join(reversed(digits))
+
+
+def decode_number(text):
+    """Обратное к encode_number; ValueError, если строка пустая или с посторонними символами."""
+    if not text:
+        raise ValueError("пустое число")
+    number = 0
+    for char in text:
+        digit = ALPHABET.find(char)
+        if digit < 0:
+            raise ValueError(f"неверный символ {char!r}")
+        number = number * len(ALPHABET) + digit
+    return number
+
+
+class Integer:
+    """Тип аргумента: неотрицательное целое (id ученика, задания, конспекта)."""
+
+    def encode(self, value):
+        if not isinstance(value, int) or value < 0:
+            raise ValueError(f"ожидалось неотрицательное целое: {value!r}")
+        return value
+
+    def decode(self, number):
+        return number
+
+
+class Choice:
+    """Тип аргумента: значение из фиксированного списка, передаётся номером в нём. Список только дополняется."""
+
+    def __init__(self, *values):
+        self.values = values
+        self._numbers = {value: number for number, value in enumerate(values)}
+
+    def encode(self, value):
+        try:
+            return self._numbers[value]
+        except KeyError:
+            raise ValueError(f"неизвестное значение: {value!r}") from None
+
+    def decode(self, number):
+        if number >= len(self.values):
+            raise ValueError(f"неизвестный номер значения: {number}")
+        return self.values[number]
+
+
+class PageCursor:
+    """Тип аргумента: курсор страницы выбора ученика (n<id> — вперёд, p<id> — назад, см. keyboards.student_picker)."""
+
+    def encode(self, value):
+        if value[:1] not in ('n', 'p') or not value[1:].isdigit():
+            raise ValueError(f"неверный курсор страницы: {value!r}")
+        return int(value[1:]) * 2 + (value[0] == 'p')
+
+    def decode(self, number):
+        return f"{'np'[number % 2]}{number // 2}"
+
+
+INTEGER = Integer()
+CATALOG_EXAM = Choice(*CATALOG_EXAMS)
+EXAM = Choice(*CATALOG_EXAMS, "Школьная программа")
+PAGE_CURSOR = PageCursor()
+# Действия кнопок учеников в клавиатуре выбора (для листания страниц)
+PICKER_ACTION = Choice('delete_student', 'select_student', 'bulk_toggle', 'edit_student', 'show_info')
+STUDENT_FIELD = Choice('name', 'exam', 'class_date', 'class_link', 'description')
+CATALOG_FIELD = Choice('title', 'link')
+
+
+class CallbackRouteConflict(ValueError):
+    """Одно и то же действие callback_data зарегистрировано дважды."""
+
+
+class StaleCallbackData(ValueError):
+    """Данные кнопки не разбираются текущей схемой: другая версия, неизвестное действие или запись вытеснена из кэша."""
+
+
+class CallbackCodec:
+    """
+    Компактная запись callback_data: «версия, код действия, аргументы».
+
+    Код действия — номер в порядке регистрации (один символ), аргументы переводятся типами
+    в неотрицательные целые и записываются по основанию 62 через «.». Например,
+    assign_homework с id задания 1234 — «14jU» вместо «assign_homework:1234», а экзамен
+    передаётся номером, а не двумя байтами на каждую кириллическую букву.
+
+    Если данные всё же длиннее MAX_LENGTH байт, аргументы кладутся в ограниченный LRU-кэш
+    в памяти, а кнопка получает «версия~эпоха.ключ». Эпоха случайна для каждого запуска,
+    поэтому после перезапуска или вытеснения такая кнопка распознаётся как устаревшая,
+    а не указывает на чужую запись.
+
+    Новые действия добавляются только в конец (см. schema ниже); при изменении аргументов
+    существующих нужно увеличить VERSION.
+    """
+
+    def __init__(self, version=VERSION, cache_size=CALLBACK_CACHE_SIZE):
+        self.version = version
+        self.cache_size = cache_size
+        self.evictions = 0
+        self.stale = 0  # Нажатий, отправленных обработчику устаревших кнопок (см. CallbackRouter)
+        self._actions = []  # код -> (действие, типы)
+        self._codes = {}  # действие -> код
+        self._cache = OrderedDict()  # ключ -> (код, числа аргументов)
+        self._keys = {}  # (код, числа аргументов) -> ключ
+        self._next_key = 0
+        self._epoch = encode_number(secrets.randbelow(len(ALPHABET) ** 4))
+
+    def action(self, name, *types):
+        """
+        Регистрирует действие.
+
+        :param name: Имя действия, по нему кнопки собираются (pack) и обработчики регистрируются (CallbackRouter.add).
+        :param types: Типы аргументов (INTEGER, Choice, PAGE_CURSOR).
+        """
+        if name in self._codes:
+            raise CallbackRouteConflict(f"Действие '{name}' уже зарегистрировано")
+        if len(self._actions) == len(ALPHABET):
+            raise ValueError("Закончились коды действий: увеличьте VERSION и перейдите на двухсимвольные коды")
+        self._codes[name] = len(self._actions)
+        self._actions.append((name, types))
+
+    def __contains__(self, name):
+        return name in self._codes
+
+    def pack(self, action, *args):
+        """
+        Собирает callback_data кнопки.
+
+        :param action: Зарегистрированное действие.
+        :param args: Аргументы в порядке типов действия.
+        :return: Строка не длиннее MAX_LENGTH байт.
+        """
+        code = self._codes[action]
+        types = self._actions[code][1]
+        if len(args) != len(types):
+            raise ValueError(f"Действию '{action}' нужно аргументов: {len(types)}, передано: {len(args)}")
+        numbers = tuple(arg_type.encode(arg) for arg_type, arg in zip(types, args))
+        data = self.version + ALPHABET[code] + SEPARATOR.join(map(encode_number, numbers))
+        if len(data) <= MAX_LENGTH:  # Все символы формата однобайтовые
+            return data
+        return f"{self.version}{CACHED}{self._epoch}{SEPARATOR}{encode_number(self._store(code, numbers))}"
+
+    def unpack(self, data):
+        """
+        Разбирает callback_data.
+
+        :return: (действие, кортеж аргументов).
+        :raises StaleCallbackData: Кнопка собрана не текущей схемой или её запись уже не в кэше.
+        """
+        try:
+            if data[:1] != self.version:
+                raise ValueError("другая версия")
+            if data[1:2] == CACHED:
+                epoch, _, key = data[2:].partition(SEPARATOR)
+                entry = self._cache.get(decode_number(key)) if epoch == self._epoch else None
+                if entry is None:
+                    raise ValueError("записи нет в кэше")
+                self._cache.move_to_end(decode_number(key))
+                code, numbers = entry
+            else:
+                code = ALPHABET.find(data[1:2])
+                numbers = tuple(map(decode_number, data[2:].split(SEPARATOR))) if data[2:] else ()
+            if not 0 <= code < len(self._actions):
+                raise ValueError("неизвестное действие")
+            name, types = self._actions[code]
+            if len(numbers) != len(types):
+                raise ValueError("неверное число аргументов")
+            return name, tuple(arg_type.decode(number) for arg_type, number in zip(types, numbers))
+        except ValueError as e:
+            raise StaleCallbackData(f"{data!r}: {e}") from None
+
+    def stats(self):
+        return {'cached': len(self._cache), 'evictions': self.evictions, 'stale': self.stale}
+
+    def _store(self, code, numbers):
+        key = self._keys.get((code, numbers))
+        if key is not None:
+            self._cache.move_to_end(key)
+            return key
+        key = self._next_key
+        self._next_key += 1
+        self._cache[key] = (code, numbers)
+        self._keys[(code, numbers)] = key
+        while len(self._cache) > self.cache_size:
+            _, evicted = self._cache.popitem(last=False)
+            del self._keys[evicted]
+            self.evictions += 1
+        return key
+
+
+# Схема callback_data бота. Порядок задаёт коды действий: новые действия — только в конец
+codec = CallbackCodec()
+codec.action('return_to_menu')
+codec.action('return_to_student_menu')
+codec.action('delete_student', INTEGER)
+codec.action('select_student', INTEGER)
+codec.action('assign_homework', INTEGER)
+codec.action('students_page', PICKER_ACTION, PAGE_CURSOR)
+codec.action('bulk_exam', CATALOG_EXAM)
+codec.action('bulk_toggle', INTEGER)
+codec.action('bulk_all')
+codec.action('bulk_done')
+codec.action('bulk_assign', INTEGER)
+codec.action('edit_student', INTEGER)
+codec.action('edit_field', STUDENT_FIELD)
+codec.action('new_exam', EXAM)
+codec.action('show_info', INTEGER)
+codec.action('delete_exam', CATALOG_EXAM)
+codec.action('delete_task', INTEGER)
+codec.action('delete_note_exam', CATALOG_EXAM)
+codec.action('delete_note', INTEGER)
+codec.action('note_exam', CATALOG_EXAM)
+codec.action('note', INTEGER)
+codec.action('note_field', CATALOG_FIELD)
+codec.action('exam', CATALOG_EXAM)
+codec.action('task', INTEGER)
+codec.action('field', CATALOG_FIELD)
+
+pack = codec.pack
+
+
+class CallbackRoute:
+    __slots__ = ('action', 'callback', 'top_level')
+
+    def __init__(self, action, callback, top_level):
+        self.action = action
+        self.callback = callback
+        self.top_level = top_level
+
+
+class CallbackRouter:
+    """
+    Маршрутизация нажатий на inline-кнопки по действию из callback_data.
+
+    Вместо цепочки CallbackQueryHandler с регулярными выражениями, которые проверяются по очереди,
+    callback_data разбирается кодеком (см. CallbackCodec), действие ищется в словаре, а аргументы
+    уже нужных типов передаются обработчику: callback(update, context, *args).
+
+    Маршрут регистрируется один раз; повторная регистрация действия — ошибка при запуске
+    (CallbackRouteConflict), а не молча недостижимый второй обработчик.
+
+    Нажатие, которое общий обработчик (handler() без аргументов) не может направить — кнопка
+    старой версии, вытесненная из кэша или оставшаяся от завершённого диалога, — передаётся
+    обработчику устаревших кнопок (on_stale), чтобы пользователь получил ответ, а не вечную загрузку.
+    """
+
+    def __init__(self, codec=codec):
+        self.codec = codec
+        self._routes = {}  # действие -> CallbackRoute
+        self._stale = None
+        self._decoded = (None, None)  # (CallbackQuery, результат разбора) последнего нажатия
+
+    def add(self, action, callback, top_level=True):
+        """
+        Регистрирует маршрут.
+
+        :param action: Действие, объявленное в кодеке.
+        :param callback: Обработчик callback(update, context, *args).
+        :param top_level: False — маршрут работает только внутри состояний ConversationHandler
+                          (см. handler), а не в общем обработчике нажатий.
+        """
+        if action not in self.codec:
+            raise KeyError(f"Действие '{action}' не объявлено в схеме callback_data")
+        existing = self._routes.get(action)
+        if existing is not None:
+            raise CallbackRouteConflict(
+                f"Действие '{action}' уже обрабатывает {existing.callback.__qualname__}, "
+                f"повторно: {callback.__qualname__}"
+            )
+        self._routes[action] = CallbackRoute(action, callback, top_level)
+
+    def on_stale(self, callback):
+        """Обработчик callback(update, context) нажатий, которые нельзя направить по маршруту."""
+        self._stale = CallbackRoute(None, callback, True)
+
+    def decode(self, query):
+        """
+        Разбирает callback_data нажатия.
+
+        Application проверяет нажатие каждым обработчиком роутера по очереди (в том числе внутри
+        диалогов), поэтому результат последнего нажатия запоминается: данные разбираются один раз.
+
+        :return: (действие, аргументы) или None, если данных нет или кнопка устарела.
+        """
+        last_query, decoded = self._decoded
+        if query is not last_query:
+            try:
+                decoded = self.codec.unpack(query.data) if isinstance(query.data, str) else None
+            except StaleCallbackData:
+                decoded = None
+            self._decoded = (query, decoded)
+        return decoded
+
+    def match(self, query, actions=None):
+        """
+        Находит маршрут для нажатия.
+
+        :param query: CallbackQuery.
+        :param actions: Множество действий, среди которых искать (None — все маршруты верхнего уровня).
+        :return: (CallbackRoute, аргументы) или None.
+        """
+        if not isinstance(query.data, str):
+            return None
+        decoded = self.decode(query)
+        action, args = decoded if decoded is not None else (None, ())
+        route = self._routes.get(action)
+        if actions is not None:
+            return (route, args) if route is not None and action in actions else None
+        if route is not None and route.top_level:
+            return route, args
+        return (self._stale, ()) if self._stale is not None else None
+
+    def is_stale(self, route):
+        return route is self._stale
+
+    def handler(self, *actions, callback=None):
+        """
+        Обработчик нажатий для Application или состояния ConversationHandler.
+
+        :param actions: Действия, которые он обрабатывает; без аргументов — все маршруты верхнего уровня.
+        :param callback: Обработчик вместо зарегистрированного для маршрута (например, свой возврат
+                         в меню внутри диалога).
+        """
+        for action in actions:
+            if action not in self._routes:
+                raise KeyError(f"Маршрут '{action}' не зарегистрирован")
+        return _RouteHandler(self, frozenset(actions) if actions else None, callback)
+
+
+class _RouteHandler(BaseHandler):
+    """
+    Обработчик нажатий CallbackRouter: check_update находит маршрут, а callback (dispatch)
+    получает его вместе с аргументами из результата проверки.
+    """
+
+    def __init__(self, router, actions, callback):
+        super().__init__(self.dispatch)
+        self.router = router
+        self.actions = actions
+        self._override = callback
+
+    def check_update(self, update):
+        if isinstance(update, Update) and update.callback_query is not None:
+            return self.router.match(update.callback_query, self.actions)
+        return None
+
+    def route_callback(self, check_result):
+        """Обработчик, которому уйдёт нажатие с результатом проверки check_result."""
+        return self._override or check_result[0].callback
+
+    async def dispatch(self, update, context, route, args):
+        """Передаёт нажатие обработчику маршрута (или обработчику, заданному вместо него)."""
+        if self.router.is_stale(route):
+            self.router.codec.stale += 1
+        return await self.route_callback((route, args))(update, context, *args)
+
+    async def handle_update(self, update, application, check_result, context):
+        route, args = check_result
+        return await self.callback(update, context, route, args)
@@ -0,0 +1,124 @@
+import asyncio
+import sys
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from core.config import UPDATE_CONCURRENCY
+
+
+def update_chat_key(update):
+    """
+    Ключ, в пределах которого обновления обрабатываются строго по порядку: ID чата, а для обновлений
+    без чата (inline-запросы) — ID пользователя. None — обновление можно обрабатывать в любом порядке.
+    """
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return None
+
+
+class _ChatQueue:
+    __slots__ = ('lock', 'depth')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.depth = 0  # Обновления чата, которые обрабатываются или ждут очереди
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Параллельная обработка обновлений разных чатов со строгим порядком внутри чата.
+
+    Без concurrent_updates приложение обрабатывает обновления по одному, и медленный обработчик
+    одного пользователя задерживает всех. Обычный concurrent_updates снимает это ограничение,
+    но тогда два сообщения одного пользователя могут обрабатываться одновременно и гоняться
+    за состояние ConversationHandler и context.user_data.
+
+    Здесь у каждого чата своя asyncio.Lock: очередное обновление чата ждёт, пока обработаются
+    предыдущие (ожидающие получают блокировку в порядке прихода), а обновления разных чатов
+    идут параллельно, но не больше limit одновременно. Место из limit занимается только после
+    получения блокировки чата, поэтому поток сообщений от одного пользователя не занимает
+    все места и не задерживает остальных. Блокировка чата удаляется, когда его очередь пуста.
+    """
+
+    def __init__(self, limit=UPDATE_CONCURRENCY):
+        if limit < 1:
+            raise ValueError("limit должен быть положительным")
+        # Семафор базового класса берётся до блокировки чата (process_update помечен final),
+        # поэтому он не ограничивает, а limit соблюдается собственным семафором уже после блокировки
+        super().__init__(sys.maxsize)
+        self.limit = limit
+        self._slots = asyncio.Semaphore(limit)
+        self._chats = {}  # ключ чата -> _ChatQueue
+        self.active = 0
+        self.pending = 0
+        self.max_pending = 0
+        self.processed = 0
+
+    @property
+    def current_concurrent_updates(self):
+        return self.active
+
+    async def do_process_update(self, update, coroutine):
+        self.pending += 1
+        self.max_pending = max(self.max_pending, self.pending)
+        key = update_chat_key(update)
+        chat = None
+        if key is not None:
+            chat = self._chats.get(key)
+            if chat is None:
+                chat = self._chats[key] = _ChatQueue()
+            chat.depth += 1
+        started = False
+        try:
+            if chat is not None:
+                await chat.lock.acquire()
+            try:
+                async with self._slots:
+                    self.pending -= 1
+                    started = True
+                    self.active += 1
+                    try:
+                        await coroutine
+                    finally:
+                        self.active -= 1
+                        self.processed += 1
+            finally:
+                if chat is not None:
+                    chat.lock.release()
+        finally:
+            if not started:
+                # Отменено во время ожидания (остановка приложения): обработчик так и не запускался
+                self.pending -= 1
+                if asyncio.iscoroutine(coroutine):
+                    coroutine.close()
+            if chat is not None:
+                chat.depth -= 1
+                if chat.depth == 0:
+                    del self._chats[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def stats(self):
+        """
+        Текущая загрузка очереди. Читается и с потока сервера метрик (см. metrics.py):
+        список очередей копируется целиком, а не перебирается, пока цикл событий его меняет.
+        """
+        chats = list(self._chats.values())
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "processed": self.processed,
+            "chats": len(chats),
+            "max_chat_depth": max((chat.depth for chat in chats), default=0),
+        }
@@ -0,0 +1,146 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager, nullcontext
+
+from core.config import DB_PATH, DB_POOL_SIZE
+from querylog import TracedConnection, tracer
+
+# Профиль PRAGMA, который применяется к каждому соединению пула
+PRAGMAS = {
+    "journal_mode": "WAL",  # Читатели не блокируют писателя и наоборот
+    "synchronous": "NORMAL",  # В режиме WAL fsync выполняется только при checkpoint
+    "cache_size": -16000,  # ~16 МБ страничного кэша на соединение
+    "mmap_size": 64 * 1024 * 1024,  # Чтение страниц через отображение файла в память
+    "busy_timeout": 5000,  # Ждём блокировку до 5 секунд вместо "database is locked"
+    "temp_store": "MEMORY",
+}
+
+
+# Соединение, которое уже используется текущим потоком (см. ConnectionPool.connection)
+_local = threading.local()
+
+
+def open_connection(path=DB_PATH, **overrides):
+    """
+    Открывает соединение с профилем PRAGMAS.
+
+    :param path: Путь к файлу базы данных.
+    :param overrides: PRAGMA, значения которых отличаются от профиля по умолчанию.
+    :return: Объект sqlite3.Connection (TracedConnection, если включён журнал медленных запросов).
+    """
+    factory = TracedConnection if tracer.enabled else sqlite3.Connection
+    conn = sqlite3.connect(path, check_same_thread=False, factory=factory)
+    for name, value in {**PRAGMAS, **overrides}.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+def _statements(conn):
+    """Замер запросов блока завершается, пока соединение у этого потока (см. querylog.TracedConnection)."""
+    return conn.statements() if isinstance(conn, TracedConnection) else nullcontext()
+
+
+@contextmanager
+def use_connection(conn):
+    """
+    Делает conn текущим соединением потока на время блока with.
+
+    Все вызовы get_connection() внутри блока получают conn и не фиксируют транзакцию сами:
+    управление транзакцией остаётся за вызывающим кодом (см. writer.WriteQueue).
+    """
+    previous = getattr(_local, "conn", None)
+    _local.conn = conn
+    try:
+        yield conn
+    finally:
+        _local.conn = previous
+
+
+class ConnectionPool:
+    """
+    Пул долгоживущих соединений SQLite.
+
+    Соединения открываются один раз при старте и переиспользуются между запросами,
+    поэтому отдельный запрос не платит за открытие файла, разбор схемы и настройку PRAGMA.
+    """
+
+    def __init__(self, path=DB_PATH, size=DB_POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(open_connection(path))
+
+    @contextmanager
+    def connection(self):
+        """
+        Выдаёт соединение из пула на время блока with.
+
+        При выходе из блока изменения фиксируются (или откатываются при исключении),
+        а соединение возвращается в пул. Вложенный вызов в том же потоке получает
+        то же самое соединение, поэтому функции database.py можно вызывать друг из друга.
+        """
+        current = getattr(_local, "conn", None)
+        if current is not None:
+            with _statements(current):
+                yield current
+            return
+
+        conn = self._idle.get()
+        try:
+            with use_connection(conn), conn, _statements(conn):
+                yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def init_pool(path=DB_PATH, size=DB_POOL_SIZE):
+    """
+    Открывает пул соединений. Вызывается один раз при старте бота.
+
+    :param path: Путь к файлу базы данных.
+    :param size: Количество соединений в пуле.
+    :return: Объект ConnectionPool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(path, size)
+        return _pool
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+@contextmanager
+def get_connection():
+    """Соединение из общего пула (см. ConnectionPool.connection)."""
+    with get_pool().connection() as conn:
+        yield conn
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
@@ -5,6 +5,112 @@ BOT_TOKEN = "..."
 # IDs администраторов
 ADMIN_IDS = [...]
 
+# Путь к файлу базы данных SQLite
+DB_PATH = "your_database.db"
+
+# Экзамены, у которых есть каталоги заданий и конспектов
+CATALOG_EXAMS = ("ОГЭ", "ЕГЭ")
+
+# Количество постоянных соединений в пуле
+DB_POOL_SIZE = 4
+
+# Сколько секунд писатель собирает изменения в одну транзакцию и максимальный размер пачки
+WRITER_FLUSH_INTERVAL = 0.005
+WRITER_MAX_BATCH = 100
+
+# Сколько записей учеников держать в кэше сессий
+STUDENT_CACHE_SIZE = 10_000
+
+# Сколько учеников показывать на одной странице клавиатуры выбора
+STUDENT_PAGE_SIZE = 20
+
+# Inline-поиск по заданиям и конспектам: максимум результатов (Telegram допускает до 50)
+# и сколько секунд Telegram может кэшировать ответ на одинаковый запрос
+INLINE_RESULTS_LIMIT = 50
+INLINE_CACHE_TIME = 30
+
+# Рассылки: сообщений в секунду (Telegram допускает ~30), одновременных отправок,
+# повторов при сетевых ошибках и период обновления отчёта администратору (секунды)
+BROADCAST_RATE = 25
+BROADCAST_CONCURRENCY = 10
+BROADCAST_MAX_RETRIES = 3
+BROADCAST_PROGRESS_INTERVAL = 3
+
+# Outbox уведомлений: период опроса и размер пачки, число попыток, базовая и максимальная пауза
+# между попытками (удваивается с каждой попыткой) и сколько секунд дожидаться отправки при остановке
+OUTBOX_INTERVAL = 1
+OUTBOX_BATCH = 50
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_BACKOFF = 2
+OUTBOX_MAX_BACKOFF = 600
+OUTBOX_FLUSH_TIMEOUT = 10
+
+# Сколько обновлений обрабатывать одновременно. Обновления одного чата всё равно обрабатываются
+# строго по порядку (см. concurrency.PerChatUpdateProcessor); 1 — все обновления по одному
+UPDATE_CONCURRENCY = 16
+
+# Раз в сколько секунд сохранять в базу состояния диалогов и context.user_data (см. persistence.py).
+# При штатной остановке сохраняется всё; при аварийной теряются изменения не больше чем за этот период
+PERSISTENCE_INTERVAL = 10
+
+# Через сколько секунд бездействия завершать диалоги (ConversationHandler.conversation_timeout) по имени;
+# None — без тайм-аута. Ученик остаётся в диалоге "main" всё время, пока пользуется меню, а задание
+# тайм-аута держит в памяти последнее обновление диалога — несколько КБ против сотни байт состояния,
+# поэтому для "main" тайм-аут выключен (после него ученику пришлось бы снова писать /start). Вместо этого
+# неактивные диалоги "main" выгружает из памяти IdleEvictor, состояние остаётся в persistence
+CONVERSATION_TIMEOUTS = {"main": None, "modify_student": 3600, "homework_link": 3600}
+
+# Очистка context.user_data / chat_data (см. eviction.py): раз в EVICTION_INTERVAL секунд удаляются данные
+# неактивных дольше USER_DATA_TTL секунд и пустые; если записей больше USER_DATA_MAX_ENTRIES — самые давние.
+# Записи активных последние USER_DATA_MIN_IDLE секунд не удаляются: пользователь может быть посреди диалога
+EVICTION_INTERVAL = 600
+USER_DATA_TTL = 30 * 24 * 3600
+USER_DATA_MAX_ENTRIES = 5000
+USER_DATA_MIN_IDLE = 3600
+
+# Сколько данных inline-кнопок, не поместившихся в лимит Telegram (64 байта), хранить в памяти
+# (см. callbacks.CallbackCodec). Кнопки вытесненных записей отвечают, что устарели
+CALLBACK_CACHE_SIZE = 10_000
+
+# Запись входящих обновлений для воспроизведения (см. recorder.py и benchmarks/replay.py): каталог, куда при
+# каждом запуске кладутся снимок базы и запись обновлений, или None, чтобы не записывать. Запись содержит пароли
+# и данные учеников. RECORD_FLUSH_INTERVAL — как часто (секунды) дописанное сбрасывается на диск
+RECORD_UPDATES_DIR = None
+RECORD_FLUSH_INTERVAL = 1.0
+
+# Метрики обработчиков и запросов к базе в формате Prometheus (см. metrics.py): порт, на котором
+# METRICS_LISTEN отдаёт http://METRICS_LISTEN:METRICS_PORT/metrics, или None, чтобы не собирать.
+# METRICS_BUCKETS — верхние границы корзин гистограмм длительности, секунды
+METRICS_PORT = None
+METRICS_LISTEN = "127.0.0.1"
+METRICS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Журнал медленных запросов (см. querylog.py): запросы дольше SLOW_QUERY_THRESHOLD секунд записываются с планом
+# (EXPLAIN QUERY PLAN) и местом вызова в SLOW_QUERY_LOG; файл ротируется по достижении SLOW_QUERY_LOG_MAX_BYTES,
+# старых файлов хранится SLOW_QUERY_LOG_BACKUPS. None — запросы не замеряются. Команда /slow показывает
+# администратору SLOW_QUERY_TOP запросов с наибольшим суммарным временем
+SLOW_QUERY_THRESHOLD = None
+SLOW_QUERY_LOG = "slow_queries.log"
+SLOW_QUERY_LOG_MAX_BYTES = 5 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUPS = 3
+SLOW_QUERY_TOP = 10
+
+# Режим получения обновлений: "polling" (getUpdates) или "webhook" (Telegram сам присылает обновления
+# на WEBHOOK_URL, бот слушает WEBHOOK_LISTEN:WEBHOOK_PORT/WEBHOOK_PATH).
+# WEBHOOK_SECRET_TOKEN проверяется в каждом запросе (заголовок X-Telegram-Bot-Api-Secret-Token);
+# если не задан, при каждом запуске генерируется случайный. WEBHOOK_MAX_CONNECTIONS — сколько
+# одновременных соединений Telegram открывает к боту (1–100). WEBHOOK_CERT и WEBHOOK_KEY нужны,
+# только если TLS завершается в самом боте, а не на обратном прокси.
+RUN_MODE = "polling"
+WEBHOOK_URL = None  # Например, "https://bot.example.com/telegram"
+WEBHOOK_LISTEN = "0.0.0.0"
+WEBHOOK_PORT = 8443
+WEBHOOK_PATH = "telegram"
+WEBHOOK_SECRET_TOKEN = None
+WEBHOOK_MAX_CONNECTIONS = 40
+WEBHOOK_CERT = None
+WEBHOOK_KEY = None
+
 (CHOOSING, TYPING_NAME, TYPING_EXAM, DELETING, STUDENT_LOGIN, STUDENT_MENU, ADD_VARIANT, ADD_VARIANT_LINK,
  TYPING_CLASS_LINK, TYPING_CLASS_DATE, CHOOSING_FIELD, UPDATING_FIELD, CONFIRMATION, ADD_TASK, ADD_TASK_TITLE,
  ADD_TASK_LINK, DELETE_TASK, SELECT_TASK_TO_DELETE, UPDATING_TASK_FIELD,
@@ -17,6 +123,18 @@ ADMIN_IDS = [...]
 __all__ = [
     "BOT_TOKEN",
     "ADMIN_IDS",
+    "CATALOG_EXAMS",
+    "DB_PATH", "DB_POOL_SIZE", "WRITER_FLUSH_INTERVAL", "WRITER_MAX_BATCH",
+    "STUDENT_CACHE_SIZE", "STUDENT_PAGE_SIZE", "INLINE_RESULTS_LIMIT", "INLINE_CACHE_TIME",
+    "BROADCAST_RATE", "BROADCAST_CONCURRENCY", "BROADCAST_MAX_RETRIES", "BROADCAST_PROGRESS_INTERVAL",
+    "OUTBOX_INTERVAL", "OUTBOX_BATCH", "OUTBOX_MAX_ATTEMPTS", "OUTBOX_BACKOFF", "OUTBOX_MAX_BACKOFF",
+    "OUTBOX_FLUSH_TIMEOUT",
+    "UPDATE_CONCURRENCY", "PERSISTENCE_INTERVAL", "CALLBACK_CACHE_SIZE",
+    "CONVERSATION_TIMEOUTS", "EVICTION_INTERVAL", "USER_DATA_TTL", "USER_DATA_MAX_ENTRIES", "USER_DATA_MIN_IDLE",
+    "RECORD_UPDATES_DIR", "RECORD_FLUSH_INTERVAL", "METRICS_PORT", "METRICS_LISTEN", "METRICS_BUCKETS",
+    "SLOW_QUERY_THRESHOLD", "SLOW_QUERY_LOG", "SLOW_QUERY_LOG_MAX_BYTES", "SLOW_QUERY_LOG_BACKUPS", "SLOW_QUERY_TOP",
+    "RUN_MODE", "WEBHOOK_URL", "WEBHOOK_LISTEN", "WEBHOOK_PORT", "WEBHOOK_PATH", "WEBHOOK_SECRET_TOKEN",
+    "WEBHOOK_MAX_CONNECTIONS", "WEBHOOK_CERT", "WEBHOOK_KEY",
     "CHOOSING", "TYPING_NAME", "TYPING_EXAM", "DELETING", "STUDENT_LOGIN", "STUDENT_MENU",
     "ADD_VARIANT", "ADD_VARIANT_LINK", "TYPING_CLASS_LINK", "TYPING_CLASS_DATE",
     "CHOOSING_FIELD", "UPDATING_FIELD", "CONFIRMATION",
@@ -1,9 +1,10 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton, Message
 from telegram.ext import CallbackContext, CommandHandler, MessageHandler, CallbackQueryHandler, filters, Application, \
-    ConversationHandler
+    ConversationHandler, InlineQueryHandler
 
 __all__ = [
     "Update", "CallbackContext", "InlineKeyboardButton", "InlineKeyboardMarkup",
     "ReplyKeyboardMarkup", "KeyboardButton", "CommandHandler", "MessageHandler",
-    "CallbackQueryHandler", "filters", "Application", "ConversationHandler", "Message"
+    "CallbackQueryHandler", "filters", "Application", "ConversationHandler", "Message",
+    "InlineQueryHandler"
 ]
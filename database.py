@@ -1,76 +1,122 @@
-import sqlite3
-from natsort import natsorted
-from utils import generate_password
+import re
+from collections import namedtuple
+from connection import get_connection
+from migrations import migrate
+from utils import generate_password, natural_sort_key
 
 
 def db_execute(query, params=(), fetchone=False, fetchall=False):
-    with sqlite3.connect('your_database.db') as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(query, params)
         if fetchone:
             return cursor.fetchone()
         if fetchall:
             return cursor.fetchall()
-        conn.commit()
 
 
 def create_tables():
-    db_execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            exam TEXT,
-            password TEXT,
-            telegram_id INTEGER,
-            homework TEXT,
-            class_link TEXT
-        )
-    ''')
+    """Создаёт или обновляет схему базы (см. migrations.migrate)."""
+    return migrate()
+
+
+# Горячие запросы. Функции ниже выполняют именно эти строки, а HOT_QUERIES проверяет их планы,
+# поэтому проверка не расходится с кодом
+USER_BY_PASSWORD_QUERY = 'SELECT id, name, exam FROM users WHERE password = ?'
+USER_BY_TELEGRAM_ID_QUERY = 'SELECT id, name, exam FROM users WHERE telegram_id = ?'
+STUDENT_BY_TELEGRAM_ID_QUERY = \
+    'SELECT id, name, exam, homework, class_date, class_link FROM users WHERE telegram_id = ?'
+EXAM_TELEGRAM_IDS_QUERY = 'SELECT telegram_id FROM users WHERE exam = ? AND telegram_id IS NOT NULL'
+EXAM_STUDENTS_QUERY = 'SELECT id, name FROM users WHERE exam = ? ORDER BY id'
+SEARCH_STUDENTS_QUERY = ('SELECT users.id, users.name, users.exam, users.description FROM users_fts '
+                         'JOIN users ON users.id = users_fts.rowid WHERE users_fts MATCH ? ORDER BY rank LIMIT ?')
+VARIANT_LINK_QUERY = 'SELECT link FROM variants WHERE exam = ?'
+TASKS_BY_EXAM_QUERY = 'SELECT id, title, link FROM tasks WHERE exam_type = ? ORDER BY sort_key, title'
+TASK_TITLES_QUERY = 'SELECT id, title FROM tasks WHERE exam_type = ? ORDER BY sort_key, title'
+TASK_BY_TITLE_QUERY = 'SELECT id FROM tasks WHERE title = ? AND exam_type = ?'
+NOTES_BY_EXAM_QUERY = 'SELECT id, title, link FROM notes WHERE exam_type = ? ORDER BY sort_key, title'
+NOTE_TITLES_QUERY = 'SELECT id, title FROM notes WHERE exam_type = ? ORDER BY sort_key, title'
+NOTE_BY_TITLE_QUERY = 'SELECT id FROM notes WHERE title = ? AND exam_type = ?'
+PENDING_RECIPIENTS_QUERY = \
+    "SELECT telegram_id FROM broadcast_recipients WHERE broadcast_id = ? AND status = 'pending'"
+UNFINISHED_BROADCASTS_QUERY = "SELECT id FROM broadcasts WHERE status = 'running' ORDER BY id"
+DUE_OUTBOX_QUERY = ("SELECT id, chat_id, text, reply_markup, attempts FROM outbox "
+                    "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?")
+CONVERSATION_QUERY = 'SELECT state FROM conversations WHERE name = ? AND key = ?'
+
+
+def students_page_query(backward=False, exam=False):
+    """Запрос страницы учеников для get_students_page: параметры (exam, если задан), cursor_id, limit."""
+    conditions = ['exam = ?'] if exam else []
+    conditions.append('id < ?' if backward else 'id > ?')
+    return (f'SELECT id, name, exam, description FROM users WHERE {" AND ".join(conditions)} '
+            f'ORDER BY {"id DESC" if backward else "id"} LIMIT ?')
+
+
+# Горячие запросы с параметрами для EXPLAIN: план не должен содержать полного просмотра таблицы
+HOT_QUERIES = [
+    (USER_BY_PASSWORD_QUERY, ('',)),
+    (USER_BY_TELEGRAM_ID_QUERY, (0,)),
+    (STUDENT_BY_TELEGRAM_ID_QUERY, (0,)),
+    (EXAM_TELEGRAM_IDS_QUERY, ('',)),
+    (EXAM_STUDENTS_QUERY, ('',)),
+    (SEARCH_STUDENTS_QUERY, ('"а"*', 1)),
+    (VARIANT_LINK_QUERY, ('',)),
+    (TASKS_BY_EXAM_QUERY, ('',)),
+    (TASK_TITLES_QUERY, ('',)),
+    (TASK_BY_TITLE_QUERY, ('', '')),
+    (NOTES_BY_EXAM_QUERY, ('',)),
+    (NOTE_TITLES_QUERY, ('',)),
+    (NOTE_BY_TITLE_QUERY, ('', '')),
+    (PENDING_RECIPIENTS_QUERY, (0,)),
+    (UNFINISHED_BROADCASTS_QUERY, ()),
+    (DUE_OUTBOX_QUERY, (0, 1)),
+    (CONVERSATION_QUERY, ('', '')),
+    (students_page_query(), (0, 1)),
+    (students_page_query(backward=True), (0, 1)),
+    (students_page_query(exam=True), ('', 0, 1)),
+    (students_page_query(backward=True, exam=True), ('', 0, 1)),
+]
+
+
+def find_full_scans():
+    """
+    Прогоняет EXPLAIN QUERY PLAN для горячих запросов.
 
-    db_execute('''
-        CREATE TABLE IF NOT EXISTS variants (
-            exam TEXT UNIQUE,
-            link TEXT,
-            class_date TEXT
-        )
-    ''')
+    :return: Список пар (запрос, строка плана) для запросов, которые просматривают таблицу целиком
+             или сортируют результат во временном B-дереве вместо индекса.
+    """
+    offenders = []
+    with get_connection() as conn:
+        for query, params in HOT_QUERIES:
+            for row in conn.execute(f'EXPLAIN QUERY PLAN {query}', params):
+                detail = row[-1]
+                # SCAN виртуальной таблицы FTS5 — поиск по её собственному индексу, а не просмотр строк
+                full_scan = detail.startswith('SCAN') and 'VIRTUAL TABLE' not in detail
+                if full_scan or detail.startswith('USE TEMP B-TREE'):
+                    offenders.append((query, detail))
+    return offenders
 
-    # Создаём таблицу для домашних заданий
-    db_execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                link TEXT NOT NULL,
-                exam_type TEXT NOT NULL
-            )
-        ''')
 
-    db_execute('''
-            CREATE TABLE IF NOT EXISTS notes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                link TEXT NOT NULL,
-                exam_type TEXT NOT NULL
-            )
-        ''')
+# Компактная запись ученика для меню: всё, что нужно экранам ученика, за один запрос
+Student = namedtuple('Student', ['id', 'name', 'exam', 'homework', 'class_date', 'class_link'])
 
 
 def get_user_by_password(password):
-    with sqlite3.connect('your_database.db') as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute('SELECT id, name, exam FROM users WHERE password = ?', (password,))
+        cursor.execute(USER_BY_PASSWORD_QUERY, (password,))
         return cursor.fetchone()
 
 
 def update_user_telegram_id(user_id, telegram_id):
-    with sqlite3.connect('your_database.db') as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('UPDATE users SET telegram_id = ? WHERE id = ?', (telegram_id, user_id))
-        conn.commit()
 
 
 def get_all_users():
-    with sqlite3.connect('your_database.db') as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT id, name, exam, description FROM users')  # Извлекаем все записи
         students = cursor.fetchall()
@@ -78,8 +124,48 @@ def get_all_users():
                 for student in students]
 
 
+def get_students_page(cursor_id=0, backward=False, limit=20, exam=None):
+    """
+    Страница учеников, упорядоченных по id (keyset-пагинация).
+
+    Вместо OFFSET страница начинается с id соседней страницы, поэтому запрос читает
+    из индекса только limit + 1 строк, на какой бы странице ни находился администратор.
+
+    :param cursor_id: id, после которого (или перед которым, если backward) начинается страница.
+    :param backward: Листать назад: страница заканчивается перед cursor_id.
+    :param limit: Размер страницы.
+    :param exam: Показывать только учеников этого экзамена.
+    :return: Кортеж (rows, has_prev, has_next); rows — список (id, name, exam, description) по возрастанию id.
+    """
+    params = ([exam] if exam is not None else []) + [cursor_id, limit + 1]
+    rows = db_execute(students_page_query(backward, exam is not None), params, fetchall=True)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backward:
+        return rows[::-1], has_more, True
+    return rows, cursor_id > 0, has_more
+
+
+def search_students(text, limit=20):
+    """
+    Поиск учеников по фрагментам имени или описания (полнотекстовый индекс users_fts).
+
+    Каждое слово запроса ищется как начало слова в имени или описании, все слова должны совпасть:
+    "ив пет" найдёт "Иванов Пётр". Регистр и диакритика (ё/е) не учитываются.
+
+    :param text: Строка поиска.
+    :param limit: Максимальное количество результатов.
+    :return: Список (id, name, exam, description), самые релевантные первыми.
+    """
+    words = re.findall(r'\w+', text.replace('ё', 'е').replace('Ё', 'Е'))
+    if not words:
+        return []
+    match = ' '.join(f'"{word}"*' for word in words)
+    return db_execute(SEARCH_STUDENTS_QUERY, (match, limit), fetchall=True)
+
+
 def get_student_info(student_id):
-    with sqlite3.connect('your_database.db') as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT name, exam, class_date, class_link, description, homework, telegram_id, password 
@@ -103,15 +189,45 @@ def get_student_info(student_id):
 
 # Функция для получения пользователя по Telegram ID
 def get_user_by_telegram_id(telegram_id):
-    with sqlite3.connect('your_database.db') as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute('SELECT id, name, exam FROM users WHERE telegram_id = ?', (telegram_id,))
+        cursor.execute(USER_BY_TELEGRAM_ID_QUERY, (telegram_id,))
         return cursor.fetchone()
 
 
+def get_student_by_telegram_id(telegram_id):
+    """
+    Получает запись ученика по Telegram ID.
+
+    :param telegram_id: Telegram ID ученика.
+    :return: Объект Student или None, если ученик не найден.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(STUDENT_BY_TELEGRAM_ID_QUERY, (telegram_id,))
+        row = cursor.fetchone()
+    return Student(*row) if row else None
+
+
+def get_user_exam(student_id):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT exam FROM users WHERE id = ?', (student_id,))
+        result = cursor.fetchone()
+    return result[0] if result else None
+
+
+def get_exam_telegram_ids(exam):
+    """Telegram ID всех учеников экзамена, которые уже вошли в бота."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(EXAM_TELEGRAM_IDS_QUERY, (exam,))
+        return [row[0] for row in cursor.fetchall()]
+
+
 # Функция для удаления пользователя
 def delete_user(name):
-    with sqlite3.connect('your_database.db') as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT exam FROM users WHERE name = ?', (name,))
         result = cursor.fetchone()
@@ -121,22 +237,36 @@ def delete_user(name):
 
         exam = result[0]  # Извлекаем экзамен
         cursor.execute('DELETE FROM users WHERE name = ?', (name,))
-        conn.commit()
         return exam
 
 
+def delete_user_by_id(student_id):
+    """
+    Удаляет ученика по ID.
+
+    :return: Кортеж (name, exam, description) удалённого ученика или None, если ученик не найден.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT name, exam, description FROM users WHERE id = ?', (student_id,))
+        student = cursor.fetchone()
+        if student:
+            cursor.execute('DELETE FROM users WHERE id = ?', (student_id,))
+        return student
+
+
 # Функция для добавления ученика
-def add_user(name, exam):
+def add_user(name, exam, class_date=None, class_link=None):
     password = generate_password()  # Генерация случайного пароля
-    with sqlite3.connect('your_database.db') as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute('INSERT INTO users (name, exam, password) VALUES (?, ?, ?)', (name, exam, password))
-        conn.commit()
+        cursor.execute('INSERT INTO users (name, exam, password, class_date, class_link) VALUES (?, ?, ?, ?, ?)',
+                       (name, exam, password, class_date, class_link))
     return password  # Возвращаем пароль
 
 
 def update_student_field(student_id, field, value):
-    with sqlite3.connect('your_database.db') as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         if value is None:
             # Устанавливаем поле как NULL
@@ -144,23 +274,92 @@ def update_student_field(student_id, field, value):
         else:
             # Обновляем поле с новым значением
             cursor.execute(f'UPDATE users SET {field} = ? WHERE id = ?', (value, student_id))
-        conn.commit()
+
+
+def get_exam_students(exam):
+    """Список (id, name) учеников экзамена."""
+    return db_execute(EXAM_STUDENTS_QUERY, (exam,), fetchall=True)
+
+
+def assign_homework(student_id, homework, notification=None, reply_markup=None):
+    """
+    Записывает домашнее задание ученику.
+
+    :param notification: Текст уведомления ученику. Уведомление ставится в outbox в той же транзакции,
+                         что и задание (только если ученик уже входил в бота).
+    :param reply_markup: Клавиатура уведомления в виде JSON или None.
+    :return: Telegram ID ученика для уведомления или None, если ученик ещё не входил в бота.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('UPDATE users SET homework = ? WHERE id = ?', (homework, student_id))
+        cursor.execute('SELECT telegram_id FROM users WHERE id = ?', (student_id,))
+        result = cursor.fetchone()
+        telegram_id = result[0] if result else None
+        if notification and telegram_id:
+            add_outbox_message(telegram_id, notification, reply_markup)
+    return telegram_id
+
+
+def assign_homework_bulk(student_ids, homework, notification=None, reply_markup=None):
+    """
+    Записывает одно домашнее задание сразу нескольким ученикам одной транзакцией.
+
+    :param student_ids: ID учеников.
+    :param notification: Текст уведомления; ставится в outbox каждому ученику, который уже входил в бота.
+    :param reply_markup: Клавиатура уведомления в виде JSON или None.
+    :return: Кортеж (сколько учеников получили задание, сколько уведомлений поставлено в outbox).
+    """
+    with get_connection() as conn:
+        assigned = conn.executemany('UPDATE users SET homework = ? WHERE id = ?',
+                                    [(homework, student_id) for student_id in student_ids]).rowcount
+        notified = 0
+        if notification:
+            notified = conn.executemany(
+                'INSERT INTO outbox (chat_id, text, reply_markup) '
+                'SELECT telegram_id, ?, ? FROM users WHERE id = ? AND telegram_id IS NOT NULL',
+                [(notification, reply_markup, student_id) for student_id in student_ids]
+            ).rowcount
+    return assigned, notified
+
+
+def set_variant_link(exam, link):
+    db_execute('''
+        INSERT INTO variants (exam, link) 
+        VALUES (?, ?)
+        ON CONFLICT(exam) DO UPDATE SET link = excluded.link
+    ''', (exam, link))
+
+
+def get_variant_link(exam):
+    result = db_execute(VARIANT_LINK_QUERY, (exam,), fetchone=True)
+    return result[0] if result else None
 
 
 def update_password_to_id(user_id, telegram_id):
-    with sqlite3.connect('your_database.db') as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('UPDATE users SET password = ? WHERE id = ?', (str(telegram_id), user_id))
-        conn.commit()
 
 
 # Добавление нового задания в таблицу tasks.
 def add_task(title, link, exam_type):
-    with sqlite3.connect('your_database.db') as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute('INSERT INTO tasks (title, link, exam_type) VALUES (?, ?, ?)',
-                       (title, link, exam_type))
-        conn.commit()
+        cursor.execute('INSERT INTO tasks (title, link, exam_type, sort_key) VALUES (?, ?, ?, ?)',
+                       (title, link, exam_type, natural_sort_key(title)))
+
+
+# Изменение поля задания. Возвращает экзамен задания или None, если задание не найдено.
+def update_task_field(task_id, field, value):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"UPDATE tasks SET {field} = ? WHERE id = ?", (value, task_id))
+        if field == 'title':
+            cursor.execute('UPDATE tasks SET sort_key = ? WHERE id = ?', (natural_sort_key(value), task_id))
+        cursor.execute('SELECT exam_type FROM tasks WHERE id = ?', (task_id,))
+        result = cursor.fetchone()
+    return result[0] if result else None
 
 
 # Получение списка заданий для указанного типа экзамена.
@@ -168,43 +367,79 @@ def get_tasks_by_exam(exam_type):
     """
     Получение списка заданий для указанного типа экзамена, отсортированного естественным образом по названию.
     """
-    with sqlite3.connect('your_database.db') as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute(
-            'SELECT id, title, link FROM tasks WHERE exam_type = ?', (exam_type,)
-        )
-        tasks = cursor.fetchall()  # [(id, title, link), ...]
+        # Естественный порядок задаёт колонка sort_key (см. utils.natural_sort_key) и индекс по ней
+        cursor.execute(TASKS_BY_EXAM_QUERY, (exam_type,))
+        return cursor.fetchall()  # [(id, title, link), ...]
+
 
-    # Естественная сортировка по названию
-    return natsorted(tasks, key=lambda x: x[1])  # Сортируем по второму элементу (title)
+def get_task_titles(exam_type):
+    """Список (id, title) заданий экзамена для выбора задания, в естественном порядке."""
+    return db_execute(TASK_TITLES_QUERY, (exam_type,), fetchall=True)
 
 
 def get_notes_by_exam(exam_type):
     """
     Получение списка конспектов для указанного типа экзамена, отсортированного естественным образом по названию.
     """
-    with sqlite3.connect('your_database.db') as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute(
-            'SELECT id, title, link FROM notes WHERE exam_type = ?', (exam_type,)
-        )
-        notes = cursor.fetchall()  # [(id, title, link), ...]
+        # Естественный порядок задаёт колонка sort_key (см. utils.natural_sort_key) и индекс по ней
+        cursor.execute(NOTES_BY_EXAM_QUERY, (exam_type,))
+        return cursor.fetchall()  # [(id, title, link), ...]
+
+
+def get_note_titles(exam_type):
+    """Список (id, title) конспектов экзамена для выбора конспекта, в естественном порядке."""
+    return db_execute(NOTE_TITLES_QUERY, (exam_type,), fetchall=True)
+
+
+# Добавление нового конспекта в таблицу notes.
+def add_note(title, link, exam_type):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('INSERT INTO notes (title, link, exam_type, sort_key) VALUES (?, ?, ?, ?)',
+                       (title, link, exam_type, natural_sort_key(title)))
 
-    # Естественная сортировка по названию
-    return natsorted(notes, key=lambda x: x[1])  # Сортируем по второму элементу (title)
+
+# Изменение поля конспекта. Возвращает экзамен конспекта или None, если конспект не найден.
+def update_note_field(note_id, field, value):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"UPDATE notes SET {field} = ? WHERE id = ?", (value, note_id))
+        if field == 'title':
+            cursor.execute('UPDATE notes SET sort_key = ? WHERE id = ?', (natural_sort_key(value), note_id))
+        cursor.execute('SELECT exam_type FROM notes WHERE id = ?', (note_id,))
+        result = cursor.fetchone()
+    return result[0] if result else None
+
+
+# Удаление конспекта по ID. Возвращает кортеж (title, exam_type) удалённого конспекта или None.
+def delete_note(note_id):
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT title, exam_type FROM notes WHERE id = ?', (note_id,))
+        note = cursor.fetchone()
+        if note:
+            cursor.execute('DELETE FROM notes WHERE id = ?', (note_id,))
+    return note
 
 
-# Удаление задания из базы данных по ID.
+# Удаление задания из базы данных по ID. Возвращает кортеж (title, exam_type) удалённого задания или None.
 def delete_task(task_id):
-    with sqlite3.connect('your_database.db') as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
-        conn.commit()
+        cursor.execute('SELECT title, exam_type FROM tasks WHERE id = ?', (task_id,))
+        task = cursor.fetchone()
+        if task:
+            cursor.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+    return task
 
 
 # Получение задания по ID.
 def get_task_by_id(task_id):
-    with sqlite3.connect('your_database.db') as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute('SELECT id, title, link FROM tasks WHERE id = ?', (task_id,))
         return cursor.fetchone()  # Кортеж: (id, title, link)
@@ -218,9 +453,9 @@ def is_task_title_unique(title, exam_type):
     :param exam_type: Тип экзамена (ОГЭ/ЕГЭ).
     :return: True, если название уникально, иначе False.
     """
-    with sqlite3.connect('your_database.db') as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT id FROM tasks WHERE title = ? AND exam_type = ?", (title, exam_type))
+        cursor.execute(TASK_BY_TITLE_QUERY, (title, exam_type))
         return cursor.fetchone() is None  # Если задание не найдено, возвращаем True
 
 
@@ -232,8 +467,141 @@ def is_note_title_unique(title: str, exam_type: str) -> bool:
     :param exam_type: Тип экзамена (ОГЭ или ЕГЭ).
     :return: True, если название уникально, иначе False.
     """
-    with sqlite3.connect('your_database.db') as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute('SELECT id FROM notes WHERE title = ? AND exam_type = ?', (title, exam_type))
+        cursor.execute(NOTE_BY_TITLE_QUERY, (title, exam_type))
         result = cursor.fetchone()
         return result is None  # Если результат пустой, название уникально
+
+
+# Рассылки
+
+def create_broadcast(text, reply_markup, telegram_ids, admin_chat_id=None):
+    """
+    Сохраняет рассылку и список её получателей.
+
+    :param text: Текст сообщения.
+    :param reply_markup: Клавиатура в виде JSON (InlineKeyboardMarkup.to_json()) или None.
+    :param telegram_ids: Telegram ID получателей.
+    :param admin_chat_id: Чат, в который отправляется отчёт о ходе рассылки.
+    :return: ID рассылки.
+    """
+    with get_connection() as conn:
+        cursor = conn.execute('INSERT INTO broadcasts (text, reply_markup, admin_chat_id) VALUES (?, ?, ?)',
+                              (text, reply_markup, admin_chat_id))
+        broadcast_id = cursor.lastrowid
+        conn.executemany('INSERT OR IGNORE INTO broadcast_recipients (broadcast_id, telegram_id) VALUES (?, ?)',
+                         [(broadcast_id, telegram_id) for telegram_id in telegram_ids])
+    return broadcast_id
+
+
+def get_broadcast(broadcast_id):
+    """Кортеж (text, reply_markup, admin_chat_id, status) или None."""
+    return db_execute('SELECT text, reply_markup, admin_chat_id, status FROM broadcasts WHERE id = ?',
+                      (broadcast_id,), fetchone=True)
+
+
+def get_unfinished_broadcasts():
+    """ID рассылок, которые не были завершены (например, бот перезапустили во время отправки)."""
+    rows = db_execute(UNFINISHED_BROADCASTS_QUERY, fetchall=True)
+    return [row[0] for row in rows]
+
+
+def get_pending_broadcast_recipients(broadcast_id):
+    rows = db_execute(PENDING_RECIPIENTS_QUERY, (broadcast_id,), fetchall=True)
+    return [row[0] for row in rows]
+
+
+def get_broadcast_progress(broadcast_id):
+    """Количество получателей по статусам: {'pending': ..., 'sent': ..., 'failed': ...}."""
+    progress = {'pending': 0, 'sent': 0, 'failed': 0}
+    rows = db_execute('SELECT status, COUNT(*) FROM broadcast_recipients WHERE broadcast_id = ? GROUP BY status',
+                      (broadcast_id,), fetchall=True)
+    progress.update(rows)
+    return progress
+
+
+def mark_broadcast_recipient(broadcast_id, telegram_id, status, error=None):
+    db_execute('UPDATE broadcast_recipients SET status = ?, error = ? WHERE broadcast_id = ? AND telegram_id = ?',
+               (status, error, broadcast_id, telegram_id))
+
+
+def finish_broadcast(broadcast_id):
+    db_execute("UPDATE broadcasts SET status = 'done' WHERE id = ?", (broadcast_id,))
+
+
+# Очередь уведомлений (outbox)
+
+def add_outbox_message(chat_id, text, reply_markup=None):
+    """
+    Ставит сообщение в outbox. Вызывается внутри транзакции изменения данных,
+    поэтому уведомление сохраняется тогда и только тогда, когда сохраняется само изменение.
+
+    :param reply_markup: Клавиатура в виде JSON (InlineKeyboardMarkup.to_json()) или None.
+    """
+    db_execute('INSERT INTO outbox (chat_id, text, reply_markup) VALUES (?, ?, ?)', (chat_id, text, reply_markup))
+
+
+def get_due_outbox_messages(now, limit):
+    """Сообщения, которые пора отправить: список (id, chat_id, text, reply_markup, attempts)."""
+    return db_execute(DUE_OUTBOX_QUERY, (now, limit), fetchall=True)
+
+
+def delete_outbox_message(message_id):
+    db_execute('DELETE FROM outbox WHERE id = ?', (message_id,))
+
+
+def reschedule_outbox_message(message_id, next_attempt_at, error, count_attempt=True):
+    db_execute('UPDATE outbox SET next_attempt_at = ?, last_error = ?, attempts = attempts + ? WHERE id = ?',
+               (next_attempt_at, error, int(count_attempt), message_id))
+
+
+def fail_outbox_message(message_id, error):
+    """Помечает сообщение как недоставляемое: оно остаётся в таблице для разбора, но больше не отправляется."""
+    db_execute("UPDATE outbox SET status = 'failed', last_error = ?, attempts = attempts + 1 WHERE id = ?",
+               (error, message_id))
+
+
+def load_persistent_data(kind):
+    """
+    Данные python-telegram-bot одного вида.
+
+    :param kind: 'user', 'chat', 'bot' или 'callback'.
+    :return: Список (key, data), data — pickle.
+    """
+    return db_execute('SELECT key, data FROM persistence WHERE kind = ?', (kind,), fetchall=True)
+
+
+def load_conversations(name):
+    """Состояния диалогов ConversationHandler: список (key, state), key — JSON, state — pickle."""
+    return db_execute('SELECT key, state FROM conversations WHERE name = ?', (name,), fetchall=True)
+
+
+def load_conversation(name, key):
+    """Состояние одного диалога (pickle) или None, если диалог не сохранён или завершён."""
+    row = db_execute(CONVERSATION_QUERY, (name, key), fetchone=True)
+    return row[0] if row else None
+
+
+def save_persistence(data, conversations):
+    """
+    Записывает накопленные изменения данных и состояний диалогов одной транзакцией.
+
+    :param data: Список (kind, key, data); data — pickle или None, если запись нужно удалить.
+    :param conversations: Список (name, key, state); state — pickle или None, если диалог завершён.
+    """
+    with get_connection() as conn:
+        conn.executemany(
+            'INSERT INTO persistence (kind, key, data) VALUES (?, ?, ?) '
+            'ON CONFLICT (kind, key) DO UPDATE SET data = excluded.data',
+            [row for row in data if row[2] is not None]
+        )
+        conn.executemany('DELETE FROM persistence WHERE kind = ? AND key = ?',
+                         [(kind, key) for kind, key, value in data if value is None])
+        conn.executemany(
+            'INSERT INTO conversations (name, key, state) VALUES (?, ?, ?) '
+            'ON CONFLICT (name, key) DO UPDATE SET state = excluded.state',
+            [row for row in conversations if row[2] is not None]
+        )
+        conn.executemany('DELETE FROM conversations WHERE name = ? AND key = ?',
+                         [(name, key) for name, key, state in conversations if state is None])
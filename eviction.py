@@ -0,0 +1,218 @@
+import resource
+import time
+from collections import OrderedDict
+
+from telegram import Update
+from telegram.ext import TypeHandler
+
+from core.config import EVICTION_INTERVAL, USER_DATA_TTL, USER_DATA_MAX_ENTRIES, USER_DATA_MIN_IDLE
+
+
+def timeout_handler(*keys):
+    """
+    Обработчик состояния ConversationHandler.TIMEOUT: убирает из context.user_data ключи диалога,
+    завершённого по тайм-ауту, чтобы брошенный на полпути диалог не оставлял их навсегда.
+
+    :param keys: Ключи, которые заполняет диалог; без аргументов — вся user_data очищается,
+                 как при возврате в меню.
+    """
+    async def callback(update, context):
+        # Не через context.user_data: он заново создал бы запись, уже удалённую IdleEvictor
+        user_data = context.application.user_data.get(update.effective_user.id) if update.effective_user else None
+        if not user_data:
+            return
+        if not keys:
+            user_data.clear()
+        for key in keys:
+            user_data.pop(key, None)
+
+    return TypeHandler(Update, callback)
+
+
+def rss_bytes():
+    """Текущий объём памяти процесса (RSS); где /proc недоступен — пиковый."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class IdleEvictor:
+    """
+    Удаление context.user_data и chat_data пользователей и чатов, давно не писавших боту.
+
+    python-telegram-bot создаёт запись user_data для каждого, кто хоть раз написал боту, и не удаляет
+    её никогда; в ней же остаются ключи брошенных диалогов. Обработчик из handler() в группе -1
+    отмечает время последнего обновления каждого пользователя и чата (в порядке LRU), а периодическая
+    проверка (schedule) удаляет через Application.drop_user_data / drop_chat_data — из памяти и из
+    persistence — записи:
+      - неактивные дольше ttl;
+      - пустые и неактивные дольше min_idle;
+      - самые давние сверх max_entries, если они неактивны дольше min_idle. Активных недавно
+        не трогаем: они могут быть посреди диалога, который хранит в user_data промежуточные данные.
+    Записи, загруженные из persistence при запуске, считаются активными с момента первой проверки.
+
+    Также выгружаются из памяти диалоги ConversationHandler, переданные в add_conversation: у диалога
+    без тайм-аута запись остаётся навсегда, по одной на каждого, кто в него входил. Диалог, неактивный
+    дольше min_idle, убирается только из памяти — состояние остаётся в persistence и возвращается
+    в память при следующем обновлении пользователя. Выгруженный диалог, к которому не вернулись
+    за ttl, завершается и в persistence, как удаляется user_data.
+    """
+
+    def __init__(self, ttl=USER_DATA_TTL, max_entries=USER_DATA_MAX_ENTRIES, min_idle=USER_DATA_MIN_IDLE,
+                 clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.min_idle = min_idle
+        self.clock = clock
+        self.evicted = {'user': 0, 'chat': 0, 'conversation': 0}
+        self.sweeps = 0
+        self._last_seen = {'user': OrderedDict(), 'chat': OrderedDict()}  # id -> время последнего обновления
+        self._conversations = {}  # имя диалога -> ConversationHandler, диалоги которого выгружаются
+        self._conversation_seen = {}  # имя диалога -> {ключ: время последнего обновления}
+        self._unloaded = {}  # имя диалога -> {ключ: время последнего обновления} для выгруженных из памяти
+
+    def handler(self):
+        """Обработчик для группы -1: отмечает активность до остальных обработчиков."""
+        return TypeHandler(Update, self._touch)
+
+    def add_conversation(self, handler):
+        """
+        Выгружать неактивные диалоги handler из памяти. Только для диалогов с persistent=True
+        и без conversation_timeout: задание тайм-аута держит ключ диалога и ждёт его в памяти.
+        """
+        self._conversations[handler.name] = handler
+        self._conversation_seen[handler.name] = OrderedDict()
+        self._unloaded[handler.name] = OrderedDict()
+
+    def schedule(self, job_queue):
+        """Запускает периодическую проверку в job queue приложения."""
+        job_queue.run_repeating(self._job, interval=EVICTION_INTERVAL, first=EVICTION_INTERVAL, name="eviction")
+
+    async def _touch(self, update, context):
+        now = self.clock()
+        for kind, entity in (('user', update.effective_user), ('chat', update.effective_chat)):
+            if entity is not None:
+                last_seen = self._last_seen[kind]
+                last_seen[entity.id] = now
+                last_seen.move_to_end(entity.id)
+        for handler in self._conversations.values():
+            try:
+                key = handler._get_key(update)
+            except RuntimeError:
+                continue  # Обновление без чата или пользователя в этот диалог не попадает
+            seen = self._conversation_seen[handler.name]
+            seen[key] = now
+            seen.move_to_end(key)
+            # Группа -1 обрабатывается раньше диалога: он увидит возвращённое состояние
+            if self._unloaded[handler.name].pop(key, None) is not None:
+                state = await context.application.persistence.get_conversation(handler.name, key)
+                if state is not None:
+                    handler._conversations.update_no_track({key: state})
+
+    async def _job(self, context):
+        evicted = self.sweep(context.application)
+        if any(evicted.values()):
+            print(f"Удалены данные неактивных пользователей: {evicted['user']}, чатов: {evicted['chat']}, "
+                  f"выгружено диалогов: {evicted['conversation']}")
+
+    def sweep(self, application):
+        """
+        Удаляет данные неактивных пользователей и чатов, выгружает из памяти неактивные диалоги.
+
+        :return: Сколько записей удалено и диалогов выгружено: {'user': ..., 'chat': ..., 'conversation': ...}.
+        """
+        self.sweeps += 1
+        evicted = {
+            'user': self._sweep('user', application.user_data, application.drop_user_data),
+            'chat': self._sweep('chat', application.chat_data, application.drop_chat_data),
+            'conversation': 0,
+        }
+        # Без persistence, умеющего вернуть один диалог, выгруженное состояние было бы потеряно
+        if hasattr(application.persistence, 'get_conversation'):
+            evicted['conversation'] = sum(map(self._sweep_conversations, self._conversations.values()))
+            self.evicted['conversation'] += evicted['conversation']
+        return evicted
+
+    def _sweep(self, kind, data, drop):
+        now = self.clock()
+        last_seen = self._last_seen[kind]
+        for key in data:
+            if key not in last_seen:
+                last_seen[key] = now
+        excess = len(data) - self.max_entries
+        evicted = 0
+        # От самых давних к недавним: дальше min_idle все записи активны, их не трогаем
+        for key, seen in list(last_seen.items()):
+            idle = now - seen
+            if idle < self.min_idle:
+                break
+            if key not in data:
+                # Данных нет (или их уже удалили): помнить время больше незачем
+                if idle >= self.ttl:
+                    del last_seen[key]
+                continue
+            if idle >= self.ttl or not data[key] or excess > 0:
+                drop(key)
+                del last_seen[key]
+                excess -= 1
+                evicted += 1
+        self.evicted[kind] += evicted
+        return evicted
+
+    def _sweep_conversations(self, handler):
+        now = self.clock()
+        conversations = handler._conversations
+        seen = self._conversation_seen[handler.name]
+        unloaded = self._unloaded[handler.name]
+        for key in conversations:
+            if key not in seen:
+                seen[key] = now
+        # Изменения, ещё не переданные в persistence (см. Application.update_persistence): такой диалог
+        # не выгружаем, иначе отсутствие ключа запишется в persistence как завершение диалога
+        unsaved = conversations.pop_accessed_keys()
+        for key in unsaved:
+            conversations.mark_as_accessed(key)
+
+        count = 0
+        for key, seen_at in list(seen.items()):
+            if now - seen_at < self.min_idle:
+                break
+            if key in unsaved:
+                continue
+            del seen[key]
+            if key in conversations:
+                # Мимо учёта изменений TrackingDict: в persistence состояние остаётся прежним
+                del conversations.data[key]
+                unloaded[key] = seen_at
+                count += 1
+
+        # Выгруженные раньше всех: давно не вернувшихся завершаем и в persistence
+        for key, seen_at in list(unloaded.items()):
+            if now - seen_at < self.ttl:
+                break
+            del unloaded[key]
+            conversations.mark_as_accessed(key)
+        return count
+
+    def report(self, application):
+        """Сводка по памяти: RSS процесса и размеры данных, которые растут с числом пользователей."""
+        user_data = application.user_data
+        persistence = application.persistence
+        return {
+            'rss_mb': round(rss_bytes() / 2 ** 20, 1),
+            'user_data': len(user_data),
+            'user_data_keys': sum(len(data) for data in user_data.values()),
+            'chat_data': len(application.chat_data),
+            'conversations': persistence.conversation_counts() if hasattr(persistence, 'conversation_counts') else None,
+            'conversations_in_memory': {name: len(handler._conversations)
+                                        for name, handler in self._conversations.items()},
+            'conversations_unloaded': {name: len(unloaded) for name, unloaded in self._unloaded.items()},
+            'tracked': {kind: len(last_seen) for kind, last_seen in self._last_seen.items()},
+            'evicted': dict(self.evicted),
+            'sweeps': self.sweeps,
+        }
+
+
+evictor = IdleEvictor()
@@ -0,0 +1,33 @@
+from telegram import InlineQueryResultArticle, InputTextMessageContent
+
+from core import *
+from repository import repo
+from search import catalog_search
+
+
+# Inline-режим: @бот <часть названия> ищет задания и конспекты экзамена пользователя
+async def handle_inline_query(update: Update, context: CallbackContext):
+    inline_query = update.inline_query
+    user_id = inline_query.from_user.id
+
+    # Администратор ищет по каталогам всех экзаменов, ученик — только по своему
+    if user_id in ADMIN_IDS:
+        exams = CATALOG_EXAMS
+    else:
+        student = await repo.get_student_by_tg(user_id)
+        exams = (student.exam,) if student and student.exam in CATALOG_EXAMS else ()
+
+    found = await catalog_search.search(exams, inline_query.query, INLINE_RESULTS_LIMIT)
+    results = [
+        InlineQueryResultArticle(
+            id=f"{table}:{item_id}",
+            title=title,
+            description="Домашнее задание" if table == 'tasks' else "Конспект",
+            input_message_content=InputTextMessageContent(f"{title}\n{link}"),
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Открыть", url=link)]])
+        )
+        for table, item_id, title, link in found
+    ]
+
+    # Результаты зависят от экзамена пользователя, поэтому кэш Telegram должен быть личным
+    await inline_query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=True)
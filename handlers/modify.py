@@ -1,12 +1,14 @@
 import re
+import sqlite3
 from core import *
-from main import handle_confirmation
+from repository import repo
+from keyboards import ADMIN_MENU
+from handlers.student import student_menu
 
 
 # Обработка выбора поля
-async def handle_edit_field(update: Update, context: CallbackContext):
+async def handle_edit_field(update: Update, context: CallbackContext, field):
     query = update.callback_query
-    field = query.data.split(":")[1]
     context.user_data['editing_field'] = field
     context.user_data['state'] = "UPDATING_FIELD"  # Устанавливаем состояние
 
@@ -31,9 +33,8 @@ async def handle_edit_field(update: Update, context: CallbackContext):
     await query.edit_message_text(f"Введите новое {field_name}:")
 
 
-async def handle_new_exam(update: Update, context: CallbackContext):
+async def handle_new_exam(update: Update, context: CallbackContext, new_exam):
     query = update.callback_query
-    new_exam = query.data.split(":")[1]  # Извлекаем выбранный экзамен
     context.user_data['new_value'] = new_exam
     context.user_data['editing_field'] = "exam"
     context.user_data['state'] = "CONFIRMATION"  # Устанавливаем состояние подтверждения
@@ -85,3 +86,58 @@ async def handle_new_value(update: Update, context: CallbackContext):
         f"Подтвердить изменения?",
         reply_markup=markup
     )
+
+
+async def return_to_menu(update: Update, context: CallbackContext):
+    user_id = update.callback_query.from_user.id if update.callback_query else update.message.from_user.id
+
+    if user_id in ADMIN_IDS:
+        # Меню администратора с реплай-кнопками
+        reply_markup = ADMIN_MENU
+        message = "Вы в меню администратора:"
+
+        # Если это callback_query (нажатие на инлайн-кнопку)
+        if update.callback_query:
+            # Проверяем, что сообщение доступно и является доступным типом
+            if update.callback_query.message and isinstance(update.callback_query.message, Message):
+                # Удаляем старое сообщение с инлайн-кнопками
+                await context.bot.delete_message(
+                    chat_id=update.callback_query.message.chat_id,
+                    message_id=update.callback_query.message.message_id
+                )
+
+            # Отправляем новое сообщение с реплай-кнопками
+            await context.bot.send_message(
+                chat_id=update.callback_query.from_user.id,
+                text=message,
+                reply_markup=reply_markup
+            )
+        else:
+            # Если это обычное сообщение
+            await update.message.reply_text(message, reply_markup=reply_markup)
+
+        return CHOOSING  # Возвращаем состояние CHOOSING
+    else:
+        # Меню ученика
+        return await student_menu(update, context)
+
+
+# Обработка подтверждения изменений
+async def handle_confirmation(update: Update, context: CallbackContext):
+    confirmation = update.message.text
+    student_id = context.user_data.get('editing_student_id')
+    field = context.user_data.get('editing_field')
+    new_value = context.user_data.get('new_value')
+
+    if confirmation == "Да":
+        try:
+            await repo.update_student_field(student_id, field, new_value)
+
+            await update.message.reply_text("Данные успешно обновлены!")
+        except sqlite3.Error as e:
+            await update.message.reply_text(f"Ошибка при обновлении базы данных: {e}")
+    else:
+        await update.message.reply_text("Изменение данных отменено.")
+
+    context.user_data.clear()  # Очищаем контекст
+    return await return_to_menu(update, context)
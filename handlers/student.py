@@ -1,5 +1,7 @@
 from core import *
-from database import *
+from repository import repo
+from callbacks import pack
+from keyboards import BACK_TO_MENU, EXAM_STUDENT_MENU, SCHOOL_STUDENT_MENU, notes_keyboard, variant_keyboard
 
 
 # Меню ученика
@@ -7,34 +9,19 @@ async def student_menu(update: Update, context: CallbackContext):
     telegram_id = update.message.from_user.id if update.message else update.callback_query.from_user.id
 
     # Получаем экзамен ученика
-    with sqlite3.connect('your_database.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT exam FROM users WHERE telegram_id = ?', (telegram_id,))
-        exam = cursor.fetchone()
+    student = await repo.get_student_by_tg(telegram_id)
 
-    if not exam:
+    if not student:
         await update.message.reply_text("Ошибка: экзамен не найден.")
         return STUDENT_MENU
 
-    exam = exam[0]  # Извлекаем название экзамена (ОГЭ, ЕГЭ или Школьная программа)
+    exam = student.exam  # Название экзамена (ОГЭ, ЕГЭ или Школьная программа)
 
     # Формируем меню в зависимости от экзамена
     if exam in ["ОГЭ", "ЕГЭ"]:
-        reply_markup = ReplyKeyboardMarkup(
-            [
-                ['Домашнее задание', 'Актуальный вариант'],  # Первая строка
-                ['Конспекты', 'Подключиться к занятию']  # Вторая строка
-            ],
-            resize_keyboard=True
-        )
+        reply_markup = EXAM_STUDENT_MENU
     else:  # Школьная программа
-        reply_markup = ReplyKeyboardMarkup(
-            [
-                ['Домашнее задание'],  # Первая строка
-                ['Подключиться к занятию']  # Вторая строка
-            ],
-            resize_keyboard=True
-        )
+        reply_markup = SCHOOL_STUDENT_MENU
 
     if update.message:
         await update.message.reply_text("Вы в меню ученика:", reply_markup=reply_markup)
@@ -49,18 +36,17 @@ async def student_login(update: Update, context: CallbackContext):
     password = update.message.text  # Получаем пароль
 
     # Проверяем, зарегистрирован ли ученик по Telegram ID
-    user = get_user_by_telegram_id(telegram_id)
-    if user:
-        user_id, name, exam = user
-        await update.message.reply_text(f"Добро пожаловать, {name}!")
+    student = await repo.get_student_by_tg(telegram_id)
+    if student:
+        await update.message.reply_text(f"Добро пожаловать, {student.name}!")
         return await student_menu(update, context)
 
     # Проверяем пароль
-    user = get_user_by_password(password)
+    user = await repo.get_user_by_password(password)
     if user:
         user_id, name, exam = user
         # Обновляем Telegram ID
-        update_user_telegram_id(user_id, telegram_id)
+        await repo.update_user_telegram_id(user_id, telegram_id)
         await update.message.reply_text(
             f"Добро пожаловать, {name}!\nВаш Telegram ID сохранен для автоматических входов."
         )
@@ -71,13 +57,6 @@ async def student_login(update: Update, context: CallbackContext):
     return STUDENT_LOGIN
 
 
-async def return_to_student_menu(update: Update, context: CallbackContext):
-    """Возврат в меню ученика."""
-    await update.callback_query.answer("Возврат в меню.")
-    await update.callback_query.edit_message_text("Вы вернулись в меню.")
-    return STUDENT_MENU
-
-
 # Обработка выбора в меню ученика
 async def handle_student_menu(update: Update, context: CallbackContext):
     choice = update.message.text
@@ -85,16 +64,13 @@ async def handle_student_menu(update: Update, context: CallbackContext):
 
     if choice == "Домашнее задание":
         # Получаем задание ученика
-        with sqlite3.connect('your_database.db') as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT homework, class_date FROM users WHERE telegram_id = ?', (telegram_id,))
-            homework_link = cursor.fetchone()
+        student = await repo.get_student_by_tg(telegram_id)
 
-        if homework_link and homework_link[0]:
-            link, class_date = homework_link
+        if student and student.homework:
+            class_date = student.class_date
             keyboard = [
-                [InlineKeyboardButton("Открыть домашнее задание", url=homework_link[0])],
-                [InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")]
+                [InlineKeyboardButton("Открыть домашнее задание", url=student.homework)],
+                [InlineKeyboardButton("Вернуться в меню", callback_data=pack('return_to_menu'))]
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await update.message.reply_text(
@@ -103,8 +79,7 @@ async def handle_student_menu(update: Update, context: CallbackContext):
                 reply_markup=reply_markup
             )
         else:
-            keyboard = [[InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = BACK_TO_MENU
             await update.message.reply_text("У вас пока нет заданий.", reply_markup=reply_markup)
         return STUDENT_MENU
 
@@ -114,59 +89,29 @@ async def handle_student_menu(update: Update, context: CallbackContext):
 
         # Получаем экзамен ученика
 
-        with sqlite3.connect('your_database.db') as conn:
+        student = await repo.get_student_by_tg(telegram_id)
 
-            cursor = conn.cursor()
-
-            cursor.execute('SELECT exam FROM users WHERE telegram_id = ?', (telegram_id,))
-
-            exam = cursor.fetchone()
-
-        if not exam:
-            keyboard = [[InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")]]
-
-            reply_markup = InlineKeyboardMarkup(keyboard)
+        if not student:
+            reply_markup = BACK_TO_MENU
 
             await update.message.reply_text("Ошибка: экзамен не найден.", reply_markup=reply_markup)
 
             return STUDENT_MENU
 
-        exam = exam[0]  # Извлекаем название экзамена (ОГЭ или ЕГЭ)
-
-        # Загружаем конспекты из базы данных
+        exam = student.exam  # Название экзамена (ОГЭ или ЕГЭ)
 
-        notes = get_notes_by_exam(exam)
+        # Клавиатура с конспектами экзамена (по 2 в ряду)
 
-        if not notes:
-            keyboard = [[InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")]]
+        reply_markup = await notes_keyboard(exam)
 
-            reply_markup = InlineKeyboardMarkup(keyboard)
+        if not reply_markup:
+            reply_markup = BACK_TO_MENU
 
             await update.message.reply_text("Конспекты для вашего экзамена пока отсутствуют.",
                                             reply_markup=reply_markup)
 
             return STUDENT_MENU
 
-        # Формируем кнопки для конспектов по экзамену (по 2 в ряду)
-
-        keyboard = []
-
-        row = []
-
-        for idx, (note_id, title, link) in enumerate(notes, start=1):
-
-            row.append(InlineKeyboardButton(title, url=link))
-
-            if len(row) == 2 or idx == len(notes):  # Завершаем строку после двух кнопок или в конце
-
-                keyboard.append(row)
-
-                row = []
-
-        keyboard.append([InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")])  # Кнопка возврата
-
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
         await update.message.reply_text("Выберите конспект:", reply_markup=reply_markup)
 
         return STUDENT_MENU
@@ -176,27 +121,22 @@ async def handle_student_menu(update: Update, context: CallbackContext):
 
     elif choice == "Подключиться к занятию":
         # Получаем ссылку на занятие ученика
-        with sqlite3.connect('your_database.db') as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT class_link FROM users WHERE telegram_id = ?', (telegram_id,))
-            class_link = cursor.fetchone()
+        student = await repo.get_student_by_tg(telegram_id)
 
-        if class_link and class_link[0]:
+        if student and student.class_link:
             keyboard = [
-                [InlineKeyboardButton("Подключиться", url=class_link[0])],
-                [InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")]
+                [InlineKeyboardButton("Подключиться", url=student.class_link)],
+                [InlineKeyboardButton("Вернуться в меню", callback_data=pack('return_to_menu'))]
             ]
             reply_markup = InlineKeyboardMarkup(keyboard)
             await update.message.reply_text("Вот ссылка для подключения к занятию:", reply_markup=reply_markup)
         else:
-            keyboard = [[InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            reply_markup = BACK_TO_MENU
             await update.message.reply_text("Ссылка на занятие пока недоступна.", reply_markup=reply_markup)
         return STUDENT_MENU
 
     else:
-        keyboard = [[InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = BACK_TO_MENU
         await update.message.reply_text("Выберите действие из меню.", reply_markup=reply_markup)
         return STUDENT_MENU
 
@@ -206,35 +146,20 @@ async def show_variant(update: Update, context: CallbackContext):
     telegram_id = update.message.from_user.id
 
     # Получаем экзамен и актуальный вариант для ученика
-    with sqlite3.connect('your_database.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT exam FROM users WHERE telegram_id = ?', (telegram_id,))
-        exam = cursor.fetchone()
+    student = await repo.get_student_by_tg(telegram_id)
 
-    if not exam:
-        keyboard = [[InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    if not student:
+        reply_markup = BACK_TO_MENU
         await update.message.reply_text("Ошибка: экзамен не найден.", reply_markup=reply_markup)
         return STUDENT_MENU
 
-    exam = exam[0]  # Извлекаем название экзамена (ОГЭ или ЕГЭ)
-
-    # Получаем ссылку на актуальный вариант
-    with sqlite3.connect('your_database.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT link FROM variants WHERE exam = ?', (exam,))
-        variant = cursor.fetchone()
+    # Клавиатура с актуальным вариантом
+    reply_markup = await variant_keyboard(student.exam)
 
-    if variant and variant[0]:
-        keyboard = [
-            [InlineKeyboardButton("Открыть вариант", url=variant[0])],
-            [InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    if reply_markup:
         await update.message.reply_text("Вот ваш актуальный вариант экзамена:", reply_markup=reply_markup)
     else:
-        keyboard = [[InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = BACK_TO_MENU
         await update.message.reply_text("Актуальный вариант пока недоступен.", reply_markup=reply_markup)
 
     return STUDENT_MENU
@@ -245,16 +170,13 @@ async def show_class_link(update: Update, context: CallbackContext):
     telegram_id = update.message.from_user.id
 
     # Извлекаем ссылку на занятие для ученика
-    with sqlite3.connect('your_database.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT class_link FROM users WHERE telegram_id = ?', (telegram_id,))
-        class_link = cursor.fetchone()
+    student = await repo.get_student_by_tg(telegram_id)
 
-    if not class_link or not class_link[0]:
+    if not student or not student.class_link:
         await update.message.reply_text("Ссылка для подключения к занятию не найдена.")
     else:
         # Создаем inline-кнопку ссылкой
-        keyboard = [[InlineKeyboardButton("Перейти к занятию", url=class_link[0])]]
+        keyboard = [[InlineKeyboardButton("Перейти к занятию", url=student.class_link)]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         await update.message.reply_text("Нажмите на кнопку ниже, чтобы подключиться к занятию:",
                                         reply_markup=reply_markup)
@@ -262,12 +184,11 @@ async def show_class_link(update: Update, context: CallbackContext):
     return STUDENT_MENU
 
 
-async def handle_show_student_info(update: Update, context: CallbackContext):
+async def handle_show_student_info(update: Update, context: CallbackContext, student_id):
     query = update.callback_query
-    student_id = int(query.data.split(":")[1])  # Извлекаем ID ученика из callback_data
 
     # Получаем данные об ученике
-    student_info = get_student_info(student_id)
+    student_info = await repo.get_student_info(student_id)
     if not student_info:
         await query.answer("Ошибка: ученик не найден.")
         return
@@ -286,8 +207,7 @@ async def handle_show_student_info(update: Update, context: CallbackContext):
         )
 
     # Добавляем кнопку "Вернуться в меню"
-    keyboard = [[InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = BACK_TO_MENU
 
     await query.answer()
     await query.edit_message_text(message_text, reply_markup=reply_markup)
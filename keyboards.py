@@ -0,0 +1,191 @@
+from core import *
+from repository import repo
+from callbacks import pack
+
+# Статические меню собираются один раз при импорте. Объекты клавиатур python-telegram-bot
+# неизменяемы, поэтому один экземпляр можно отправлять в ответ на любое обновление.
+ADMIN_MENU = ReplyKeyboardMarkup(
+    [
+        ['Выдать домашнее задание', 'Добавить вариант'],
+        ['Внести изменения', "Информация об ученике"],
+        ['Добавить ученика', 'Удалить ученика'],
+        ['Работа с домашним заданием и конспектами']
+    ],
+    resize_keyboard=True
+)
+
+HOMEWORK_AND_NOTES_KEYBOARD = ReplyKeyboardMarkup(
+    [
+        ['Добавить домашнее задание', "Изменить домашнее задание", "Удалить домашнее задание"],
+        ['Добавить конспект', "Изменить конспект", "Удалить конспект"],
+        ['Назад']  # Кнопка для возврата в основное меню
+    ],
+    resize_keyboard=True
+)
+
+# Меню ученика ОГЭ/ЕГЭ
+EXAM_STUDENT_MENU = ReplyKeyboardMarkup(
+    [
+        ['Домашнее задание', 'Актуальный вариант'],
+        ['Конспекты', 'Подключиться к занятию']
+    ],
+    resize_keyboard=True
+)
+
+# Меню ученика школьной программы
+SCHOOL_STUDENT_MENU = ReplyKeyboardMarkup(
+    [
+        ['Домашнее задание'],
+        ['Подключиться к занятию']
+    ],
+    resize_keyboard=True
+)
+
+YES_NO_MENU = ReplyKeyboardMarkup([['Да', 'Нет']], one_time_keyboard=True, resize_keyboard=True)
+
+BACK_TO_MENU = InlineKeyboardMarkup([[InlineKeyboardButton("Вернуться в меню", callback_data=pack('return_to_menu'))]])
+
+
+class KeyboardCache:
+    """
+    Кэш клавиатур каталогов по ключу (таблица, экзамен, вид клавиатуры).
+
+    Клавиатура собирается при первом запросе и хранится, пока репозиторий не сообщит
+    об изменении соответствующей таблицы для этого экзамена (см. Repository.subscribe).
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._markups = {}
+
+    async def get(self, key, build):
+        """
+        :param key: Кортеж (table, exam, kind).
+        :param build: Корутина без аргументов, собирающая клавиатуру (или None, если каталог пуст).
+        """
+        if key in self._markups:
+            return self._markups[key]
+        version = self.version
+        markup = await build()
+        # Если каталог изменился, пока клавиатура собиралась, не сохраняем устаревшую версию
+        if version == self.version:
+            self._markups[key] = markup
+        return markup
+
+    def invalidate(self, table, exam):
+        self.version += 1
+        for key in [key for key in self._markups if key[0] == table and key[1] == exam]:
+            del self._markups[key]
+
+    def clear(self):
+        self.version += 1
+        self._markups.clear()
+
+
+catalog_keyboards = KeyboardCache()
+repo.subscribe(catalog_keyboards.invalidate)
+
+
+async def notes_keyboard(exam):
+    """Конспекты экзамена ссылками, по 2 в ряду, для меню ученика. None, если конспектов нет."""
+    async def build():
+        notes = await repo.get_notes_by_exam(exam)
+        if not notes:
+            return None
+        buttons = [InlineKeyboardButton(title, url=link) for _, title, link in notes]
+        keyboard = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+        keyboard.append([InlineKeyboardButton("Вернуться в меню", callback_data=pack('return_to_menu'))])
+        return InlineKeyboardMarkup(keyboard)
+
+    return await catalog_keyboards.get(('notes', exam, 'student'), build)
+
+
+async def variant_keyboard(exam, back_callback="return_to_menu"):
+    """Кнопка актуального варианта экзамена (back_callback — действие кнопки возврата). None, если вариант ещё не добавлен."""
+    async def build():
+        link = await repo.get_variant_link(exam)
+        if not link:
+            return None
+        return InlineKeyboardMarkup([
+            [InlineKeyboardButton("Открыть вариант", url=link)],
+            [InlineKeyboardButton("Вернуться в меню", callback_data=pack(back_callback))]
+        ])
+
+    return await catalog_keyboards.get(('variants', exam, back_callback), build)
+
+
+async def catalog_picker(table, exam, action):
+    """
+    Клавиатура выбора задания или конспекта для администратора.
+
+    :param table: 'tasks' или 'notes'.
+    :param exam: Экзамен.
+    :param action: Действие кнопок (callbacks.codec), аргумент — id задания или конспекта, например 'delete_task'.
+    :return: InlineKeyboardMarkup или None, если каталог пуст.
+    """
+    async def build():
+        if table == 'tasks':
+            items = await repo.get_task_titles(exam)
+        else:
+            items = await repo.get_note_titles(exam)
+        if not items:
+            return None
+        keyboard = [[InlineKeyboardButton(title, callback_data=pack(action, item_id))] for item_id, title in items]
+        keyboard.append([InlineKeyboardButton("Вернуться в меню", callback_data=pack('return_to_menu'))])
+        return InlineKeyboardMarkup(keyboard)
+
+    return await catalog_keyboards.get((table, exam, action), build)
+
+
+# Дополнительные строки клавиатуры выбора ученика для отдельных сценариев
+STUDENT_PICKER_EXTRA_ROWS = {
+    # Выдача домашнего задания: переход к массовой выдаче
+    'select_student': [[InlineKeyboardButton(f"Нескольким ученикам {exam}", callback_data=pack('bulk_exam', exam))
+                        for exam in ("ОГЭ", "ЕГЭ")]],
+}
+
+
+async def student_picker(action, cursor="n0", exam=None, selected=None, page_size=STUDENT_PAGE_SIZE):
+    """
+    Страница клавиатуры выбора ученика с кнопками «назад»/«вперёд».
+
+    Страницы выбираются по ключу id (см. database.get_students_page), поэтому открытие меню
+    читает из базы одну страницу, а не всю таблицу учеников.
+
+    :param action: Действие кнопок учеников (callbacks.PICKER_ACTION), аргумент — id ученика, например 'delete_student'.
+    :param cursor: Позиция страницы: 'n<id>' — после id, 'p<id>' — перед id. 'n0' — первая страница.
+    :param exam: Показывать только учеников этого экзамена.
+    :param selected: Множество отмеченных id для множественного выбора (отмеченные помечаются галочкой,
+                     добавляются кнопки «Выбрать всех» и «Готово»); None — обычный выбор одного ученика.
+    :param page_size: Размер страницы.
+    :return: InlineKeyboardMarkup или None, если на первой странице нет ни одного ученика.
+    """
+    rows, has_prev, has_next = await repo.get_students_page(int(cursor[1:]), cursor[0] == "p", page_size, exam)
+    if not rows:
+        # Страница опустела (учеников удалили, пока администратор листал) — показываем первую
+        if cursor == "n0":
+            return None
+        return await student_picker(action, "n0", exam, selected, page_size)
+
+    keyboard = []
+    for student_id, name, student_exam, description in rows:
+        if selected is None:
+            label = f"{name} ({student_exam}) {description or ''}".strip()
+        else:
+            label = f"✅ {name}" if student_id in selected else name
+        keyboard.append([InlineKeyboardButton(label, callback_data=pack(action, student_id))])
+
+    navigation = []
+    if has_prev and rows:
+        navigation.append(InlineKeyboardButton("◀️ Назад", callback_data=pack('students_page', action, f"p{rows[0][0]}")))
+    if has_next and rows:
+        navigation.append(InlineKeyboardButton("Вперёд ▶️", callback_data=pack('students_page', action, f"n{rows[-1][0]}")))
+    if navigation:
+        keyboard.append(navigation)
+
+    if selected is not None:
+        keyboard.append([InlineKeyboardButton("Выбрать всех", callback_data=pack('bulk_all')),
+                         InlineKeyboardButton(f"Готово ({len(selected)})", callback_data=pack('bulk_done'))])
+    keyboard.extend(STUDENT_PICKER_EXTRA_ROWS.get(action, []))
+    keyboard.append([InlineKeyboardButton("Вернуться в меню", callback_data=pack('return_to_menu'))])
+    return InlineKeyboardMarkup(keyboard)
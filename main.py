@@ -1,7 +1,24 @@
 import datetime
+import secrets
+import sqlite3
+import database
 from database import *
+from connection import init_pool, close_pool
+from repository import repo
+from broadcast import broadcaster
+from outbox import outbox
+from concurrency import PerChatUpdateProcessor
+from persistence import SQLitePersistence
+from callbacks import CallbackRouter, codec, pack
+from eviction import evictor, timeout_handler
+from recorder import recorder
+from metrics import metrics
+from querylog import tracer
+from keyboards import HOMEWORK_AND_NOTES_KEYBOARD, YES_NO_MENU, catalog_picker, student_picker, \
+    variant_keyboard
 from handlers.modify import *
-from handlers.student import student_menu, student_login, handle_student_menu, handle_show_student_info, return_to_student_menu
+from handlers.student import student_menu, student_login, handle_student_menu, handle_show_student_info
+from handlers.inline import handle_inline_query
 
 
 def create_reply_keyboard(buttons, row_width=2, one_time_keyboard=True, resize_keyboard=True):
@@ -91,72 +108,24 @@ async def start(update: Update, context: CallbackContext):
         return await return_to_menu(update, context)
     else:
         # Логика для учеников
-        user = get_user_by_telegram_id(user_id)
-        if user:
-            user_id, name, exam = user
-            await update.message.reply_text(f"Добро пожаловать, {name}!\nВы зарегистрированы на экзамен: {exam}.")
+        student = await repo.get_student_by_tg(user_id)
+        if student:
+            await update.message.reply_text(
+                f"Добро пожаловать, {student.name}!\nВы зарегистрированы на экзамен: {student.exam}."
+            )
             return await student_menu(update, context)
         else:
             await update.message.reply_text("Добро пожаловать в личный кабинет ученика. Введите пароль для входа:")
             return STUDENT_LOGIN
 
 
-async def return_to_menu(update: Update, context: CallbackContext):
-    user_id = update.callback_query.from_user.id if update.callback_query else update.message.from_user.id
-
-    if user_id in ADMIN_IDS:
-        # Меню администратора с реплай-кнопками
-        reply_markup = ReplyKeyboardMarkup(
-            [
-                ['Выдать домашнее задание', 'Добавить вариант'],
-                ['Внести изменения', "Информация об ученике"],
-                ['Добавить ученика', 'Удалить ученика'],
-                ['Работа с домашним заданием и конспектами']  # Новая кнопка
-            ],
-            resize_keyboard=True
-        )
-        message = "Вы в меню администратора:"
-
-        # Если это callback_query (нажатие на инлайн-кнопку)
-        if update.callback_query:
-            # Проверяем, что сообщение доступно и является доступным типом
-            if update.callback_query.message and isinstance(update.callback_query.message, Message):
-                # Удаляем старое сообщение с инлайн-кнопками
-                await context.bot.delete_message(
-                    chat_id=update.callback_query.message.chat_id,
-                    message_id=update.callback_query.message.message_id
-                )
-
-            # Отправляем новое сообщение с реплай-кнопками
-            await context.bot.send_message(
-                chat_id=update.callback_query.from_user.id,
-                text=message,
-                reply_markup=reply_markup
-            )
-        else:
-            # Если это обычное сообщение
-            await update.message.reply_text(message, reply_markup=reply_markup)
-
-        return CHOOSING  # Возвращаем состояние CHOOSING
-    else:
-        # Меню ученика
-        return await student_menu(update, context)
-
 # Добавьте новое состояние в список состояний
 HOMEWORK_AND_NOTES_MENU = "HOMEWORK_AND_NOTES_MENU"
 
 
 # Обработчик для кнопки "Работа с домашним заданием и конспектами"
 async def handle_homework_and_notes_menu(update: Update, context: CallbackContext):
-    reply_markup = ReplyKeyboardMarkup(
-        [
-            ['Добавить домашнее задание', "Изменить домашнее задание", "Удалить домашнее задание"],
-            ['Добавить конспект', "Изменить конспект", "Удалить конспект"],
-            ['Назад']  # Кнопка для возврата в основное меню
-        ],
-        resize_keyboard=True
-    )
-    await update.message.reply_text("Выберите действие:", reply_markup=reply_markup)
+    await update.message.reply_text("Выберите действие:", reply_markup=HOMEWORK_AND_NOTES_KEYBOARD)
     return HOMEWORK_AND_NOTES_MENU
 
 
@@ -237,14 +206,7 @@ async def handle_class_link(update: Update, context: CallbackContext):
         return await return_to_menu(update, context)
 
     # Генерация пароля и сохранение ученика в базу данных
-    password = add_user(student_name, exam)
-    with sqlite3.connect('your_database.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            'UPDATE users SET class_link = ?, class_date = ? WHERE name = ? AND exam = ?',
-            (class_link, class_date, student_name, exam)
-        )
-        conn.commit()
+    password = await repo.add_user(student_name, exam, class_date, class_link)
 
     await update.message.reply_text(
         f"Ученик добавлен:\n"
@@ -262,104 +224,219 @@ async def handle_class_link(update: Update, context: CallbackContext):
 
 # Обработка кнопки "Удалить ученика"
 async def delete_student(update: Update, context: CallbackContext):
-    students = get_all_users()
-    if not students:
+    # Постраничная клавиатура с именами учеников
+    reply_markup = await student_picker('delete_student')
+    if not reply_markup:
         await update.message.reply_text("Нет зарегистрированных учеников.")
         return await return_to_menu(update, context)
 
-    # Формируем Inline-клавиатуру с именами учеников
-    buttons = [
-        [InlineKeyboardButton(student[1], callback_data=f"delete_student:{student[0]}")]
-        for student in students
-    ]
-    buttons.append([InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")])
-    reply_markup = create_inline_keyboard(buttons, row_width=1)
-
     await update.message.reply_text("Выберите ученика для удаления или вернитесь в меню:", reply_markup=reply_markup)
     return None
 
 
+# Кнопка «Вернуться в меню» вне диалогов
+async def handle_menu_callback(update: Update, context: CallbackContext):
+    await update.callback_query.answer("Возврат в меню.")
+    await return_to_menu(update, context)
+    return CHOOSING  # Возвращаемся в состояние CHOOSING
+
+
+# Нажатие на кнопку, которую нельзя обработать: старая версия, завершённый диалог или перезапуск бота
+async def handle_stale_callback(update: Update, context: CallbackContext):
+    await update.callback_query.answer("Кнопка устарела. Откройте меню заново: /start", show_alert=True)
+
+
 # Обработка выбора для удаления ученика
-async def handle_delete_callback(update: Update, context: CallbackContext):
+async def handle_delete_callback(update: Update, context: CallbackContext, student_id):
     query = update.callback_query
-    data = query.data
 
-    if data == "return_to_menu":
-        await query.answer("Возврат в меню.")
-        await return_to_menu(update, context)
+    # Удаляем ученика и получаем информацию о нём (включая описание)
+    student = await repo.delete_user_by_id(student_id)
+
+    if not student:
+        await query.answer("Ученик не найден.")
         return CHOOSING  # Возвращаемся в состояние CHOOSING
 
-    if data.startswith("delete_student:"):
-        student_id = int(data.split(":")[1])
+    # Распаковка данных ученика
+    name, exam, description = student
+    description_text = f"\nОписание: {description}" if description else ""
 
-        # Получаем информацию об ученике (включая описание)
-        with sqlite3.connect('your_database.db') as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT name, exam, description FROM users WHERE id = ?', (student_id,))
-            student = cursor.fetchone()
+    # Отправляем сообщение об удалении ученика
+    await query.answer()
+    await query.edit_message_text(f"Ученик {name} с экзаменом {exam} был удален.{description_text}")
 
-            if not student:
-                await query.answer("Ученик не найден.")
-                return CHOOSING  # Возвращаемся в состояние CHOOSING
+    # Возвращаемся в меню администратора
+    await return_to_menu(update, context)
+    return CHOOSING  # Возвращаемся в состояние CHOOSING
 
-            # Распаковка данных ученика
-            name, exam, description = student
-            description_text = f"\nОписание: {description}" if description else ""
 
-            # Удаляем ученика из базы данных
-            cursor.execute('DELETE FROM users WHERE id = ?', (student_id,))
-            conn.commit()
+async def give_homework(update: Update, context: CallbackContext):
+    # Постраничная клавиатура с именами учеников и кнопками массовой выдачи
+    reply_markup = await student_picker('select_student')
+    if not reply_markup:
+        await update.message.reply_text("Нет зарегистрированных учеников.")
+        return
 
-        # Отправляем сообщение об удалении ученика
-        await query.answer()
-        await query.edit_message_text(f"Ученик {name} с экзаменом {exam} был удален.{description_text}")
+    await update.message.reply_text("Выберите ученика для выдачи задания:", reply_markup=reply_markup)
 
-        # Возвращаемся в меню администратора
-        await return_to_menu(update, context)
-        return CHOOSING  # Возвращаемся в состояние CHOOSING
 
+# Поиск ученика по фрагменту имени или описания: /find <текст>
+async def find_student(update: Update, context: CallbackContext):
+    if update.message.from_user.id not in ADMIN_IDS:
+        return
 
-async def give_homework(update: Update, context: CallbackContext):
-    students = get_all_users()
+    text = " ".join(context.args)
+    if not text:
+        await update.message.reply_text("Укажите часть имени или описания ученика, например: /find Иван")
+        return
+
+    students = await repo.search_students(text)
     if not students:
-        await update.message.reply_text("Нет зарегистрированных учеников.")
+        await update.message.reply_text(f"По запросу «{text}» ученики не найдены.")
         return
 
-    # Создаем инлайн-клавиатуру с именами учеников
-    buttons = [
-        [InlineKeyboardButton(student[1], callback_data=f"select_student:{student[0]}")]
-        for student in students
-    ]
-    buttons.append([InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")])
-    reply_markup = InlineKeyboardMarkup(buttons)
+    # Для каждого найденного ученика — те же действия, что и в меню администратора
+    keyboard = []
+    for student_id, name, exam, description in students:
+        keyboard.append([InlineKeyboardButton(f"{name} ({exam}) {description or ''}".strip(),
+                                              callback_data=pack('show_info', student_id))])
+        keyboard.append([InlineKeyboardButton("✏️ Изменить", callback_data=pack('edit_student', student_id)),
+                         InlineKeyboardButton("🗑 Удалить", callback_data=pack('delete_student', student_id))])
+    keyboard.append([InlineKeyboardButton("Вернуться в меню", callback_data=pack('return_to_menu'))])
 
-    await update.message.reply_text("Выберите ученика для выдачи задания:", reply_markup=reply_markup)
+    await update.message.reply_text(f"Найдено учеников: {len(students)}", reply_markup=InlineKeyboardMarkup(keyboard))
 
 
-# Обработка выбора ученика
-async def handle_select_student(update: Update, context: CallbackContext):
+# Переход между страницами клавиатуры выбора ученика
+async def handle_students_page(update: Update, context: CallbackContext, action, cursor):
+    query = update.callback_query
+
+    if action == 'bulk_toggle':
+        selected = context.user_data.get('bulk_selected')
+        if selected is None:
+            await query.answer("Выбор устарел, начните заново.")
+            return
+        context.user_data['bulk_page'] = cursor
+        reply_markup = await student_picker(action, cursor, context.user_data['bulk_exam'], selected)
+    else:
+        reply_markup = await student_picker(action, cursor)
+
+    await query.answer()
+    if reply_markup:
+        await query.edit_message_reply_markup(reply_markup=reply_markup)
+    else:
+        await query.edit_message_text("Нет зарегистрированных учеников.")
+
+
+# Массовая выдача задания: выбор экзамена
+async def handle_bulk_exam(update: Update, context: CallbackContext, exam):
+    query = update.callback_query
+
+    reply_markup = await student_picker('bulk_toggle', exam=exam, selected=set())
+    if not reply_markup:
+        await query.answer()
+        await query.edit_message_text(f"Нет учеников экзамена {exam}.")
+        return
+
+    context.user_data['bulk_exam'] = exam
+    context.user_data['bulk_selected'] = set()
+    context.user_data['bulk_page'] = "n0"
+
+    await query.answer()
+    await query.edit_message_text(f"Отметьте учеников {exam}, которым нужно выдать задание:",
+                                  reply_markup=reply_markup)
+
+
+# Массовая выдача задания: отметка одного ученика
+async def handle_bulk_toggle(update: Update, context: CallbackContext, student_id):
+    selected = context.user_data.get('bulk_selected')
+    if selected is None:
+        await update.callback_query.answer("Выбор устарел, начните заново.")
+        return
+    selected.symmetric_difference_update({student_id})
+    await _refresh_bulk_picker(update, context, selected)
+
+
+# Массовая выдача задания: отметка всех учеников экзамена
+async def handle_bulk_all(update: Update, context: CallbackContext):
+    selected = context.user_data.get('bulk_selected')
+    if selected is None:
+        await update.callback_query.answer("Выбор устарел, начните заново.")
+        return
+    exam = context.user_data.get('bulk_exam')
+    selected.update(student_id for student_id, _ in await repo.get_exam_students(exam))
+    await _refresh_bulk_picker(update, context, selected)
+
+
+async def _refresh_bulk_picker(update: Update, context: CallbackContext, selected):
+    query = update.callback_query
+    exam = context.user_data.get('bulk_exam')
+    reply_markup = await student_picker('bulk_toggle', context.user_data.get('bulk_page', "n0"), exam, selected)
+    await query.answer()
+    await query.edit_message_reply_markup(reply_markup=reply_markup)
+
+
+# Массовая выдача задания: выбор задания для отмеченных учеников
+async def handle_bulk_done(update: Update, context: CallbackContext):
     query = update.callback_query
-    data = query.data
+    exam = context.user_data.get('bulk_exam')
+
+    if not context.user_data.get('bulk_selected'):
+        await query.answer("Отметьте хотя бы одного ученика.")
+        return
 
-    if data == "return_to_menu":
-        await query.answer("Возврат в меню.")
+    reply_markup = await catalog_picker('tasks', exam, 'bulk_assign')
+    await query.answer()
+    if not reply_markup:
+        await query.edit_message_text(f"Для экзамена {exam} нет доступных заданий.")
         return
+    await query.edit_message_text(f"Выберите задание для отмеченных учеников "
+                                  f"({len(context.user_data['bulk_selected'])}):", reply_markup=reply_markup)
 
-    # Обработка выбора ученика
-    selected_student_id = int(data.split(":")[1])
+
+# Массовая выдача задания: запись всем отмеченным ученикам одной транзакцией
+async def handle_bulk_assign_callback(update: Update, context: CallbackContext, task_id):
+    query = update.callback_query
+    selected = context.user_data.get('bulk_selected')
+
+    if not selected:
+        await query.answer("Выбор устарел, начните заново.")
+        return
+
+    task = await repo.get_task_by_id(task_id)
+    if not task:
+        await query.answer("Ошибка: задание не найдено.")
+        return
+
+    _, task_title, task_link = task
+    reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("Открыть задание", url=task_link)]])
+    assigned, notified = await repo.assign_homework_bulk(
+        selected, task_link,
+        f"У вас новое домашнее задание: {task_title}. Нажмите на кнопку ниже, чтобы открыть:", reply_markup
+    )
+    # Уведомления отправляет outbox: параллельно, в пределах лимита скорости бота
+    if notified:
+        outbox.kick(context.job_queue)
+
+    for key in ('bulk_exam', 'bulk_selected', 'bulk_page'):
+        context.user_data.pop(key, None)
+
+    await query.answer()
+    await query.edit_message_text(f"Задание '{task_title}' назначено ученикам: {assigned}. "
+                                  f"Уведомления получат: {notified}.")
+
+
+# Обработка выбора ученика
+async def handle_select_student(update: Update, context: CallbackContext, selected_student_id):
+    query = update.callback_query
 
     # Получаем данные ученика
-    with sqlite3.connect('your_database.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT exam FROM users WHERE id = ?', (selected_student_id,))
-        result = cursor.fetchone()
+    exam = await repo.get_user_exam(selected_student_id)
 
-    if not result:
+    if not exam:
         await query.answer("Ошибка: данные ученика не найдены.")
         return
 
-    exam = result[0]
-
     # Если экзамен — "Школьная программа", запрашиваем ссылку на задание
     if exam == "Школьная программа":
         # Сохраняем ID ученика в context.user_data
@@ -387,10 +464,9 @@ async def handle_homework_link(update: Update, context: CallbackContext):
     print(f"Ссылка сохранена в context.user_data: {link}")
 
     # Запрашиваем подтверждение
-    markup = ReplyKeyboardMarkup([['Да', 'Нет']], one_time_keyboard=True, resize_keyboard=True)
     await update.message.reply_text(
         f"Вы ввели ссылку: {link}. Сохранить её?",
-        reply_markup=markup
+        reply_markup=YES_NO_MENU
     )
 
     # Переходим к состоянию подтверждения
@@ -405,42 +481,25 @@ async def handle_confirm_homework_link(update: Update, context: CallbackContext)
     if confirmation == "Да":
         # Сохраняем задание в базе данных для ученика
         try:
-            with sqlite3.connect('your_database.db') as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    'UPDATE users SET homework = ? WHERE id = ?',
-                    (homework_link, selected_student_id)
-                )
-                conn.commit()
-
-            await update.message.reply_text("Задание успешно добавлено!")
+            # Клавиатура уведомления с двумя кнопками
+            keyboard = [
+                [InlineKeyboardButton("Открыть задание", url=homework_link)],  # Кнопка со ссылкой
+                [InlineKeyboardButton("Вернуться в меню", callback_data=pack('return_to_student_menu'))]
+            ]
+            reply_markup = InlineKeyboardMarkup(keyboard)
 
-            # Уведомляем ученика о новом задании (если у него есть telegram_id)
-            with sqlite3.connect('your_database.db') as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT telegram_id FROM users WHERE id = ?', (selected_student_id,))
-                result = cursor.fetchone()
-
-            if result and result[0]:
-                try:
-                    # Создаем клавиатуру с двумя кнопками
-                    keyboard = [
-                        [InlineKeyboardButton("Открыть задание", url=homework_link)],  # Кнопка со ссылкой
-                        [InlineKeyboardButton("Вернуться в меню", callback_data="return_to_student_menu")]
-                    ]
-                    reply_markup = InlineKeyboardMarkup(keyboard)
-
-                    # Отправляем сообщение с кнопками
-                    await context.bot.send_message(
-                        chat_id=result[0],
-                        text=f"У вас новое домашнее задание. Нажмите на кнопку ниже, чтобы открыть:",
-                        reply_markup=reply_markup
-                    )
-                    print(f"Уведомление отправлено ученику с ID {result[0]}.")
-                except Exception as e:
-                    print(f"Не удалось уведомить ученика: {e}")
+            # Задание и уведомление ученику (если у него есть telegram_id) сохраняются одной транзакцией,
+            # само уведомление отправит outbox
+            telegram_id = await repo.assign_homework(
+                selected_student_id, homework_link,
+                "У вас новое домашнее задание. Нажмите на кнопку ниже, чтобы открыть:", reply_markup
+            )
+            if telegram_id:
+                outbox.kick(context.job_queue)
             else:
                 print("У ученика нет telegram_id.")
+
+            await update.message.reply_text("Задание успешно добавлено!")
         except sqlite3.Error as e:
             await update.message.reply_text(f"Ошибка при добавлении задания: {e}")
             print(f"Ошибка при сохранении в базу данных: {e}")
@@ -459,24 +518,13 @@ async def handle_confirm_homework_link(update: Update, context: CallbackContext)
 
 
 async def handle_assign_homework(update: Update, context: CallbackContext, selected_student_id: int, exam: str):
-    # Получаем список заданий для выбранного экзамена
-    with sqlite3.connect('your_database.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, title FROM tasks WHERE exam_type = ?', (exam,))
-        homework_options = cursor.fetchall()
+    # Клавиатура с заданиями для выбранного экзамена
+    reply_markup = await catalog_picker('tasks', exam, 'assign_homework')
 
-    if not homework_options:
+    if not reply_markup:
         await update.callback_query.edit_message_text(f"Для экзамена {exam} нет доступных заданий.")
         return
 
-    # Создаем инлайн-клавиатуру с заданиями
-    buttons = [
-        [InlineKeyboardButton(title, callback_data=f"assign_homework:{task_id}")]
-        for task_id, title in homework_options
-    ]
-    buttons.append([InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")])
-    reply_markup = InlineKeyboardMarkup(buttons)
-
     # Сохраняем ID ученика в context.user_data
     context.user_data['selected_student_id'] = selected_student_id
 
@@ -488,16 +536,8 @@ async def handle_assign_homework(update: Update, context: CallbackContext, selec
 
 
 # Обработка выбора задания
-async def handle_assign_homework_callback(update: Update, context: CallbackContext):
+async def handle_assign_homework_callback(update: Update, context: CallbackContext, task_id):
     query = update.callback_query
-    data = query.data
-
-    if data == "return_to_menu":
-        await query.answer("Возврат в меню.")
-        return
-
-    # Обработка выбора задания
-    task_id = int(data.split(":")[1])
     selected_student_id = context.user_data.get('selected_student_id')
 
     # if not selected_student_id:
@@ -505,40 +545,22 @@ async def handle_assign_homework_callback(update: Update, context: CallbackConte
     #     return
 
     # Получаем данные задания
-    with sqlite3.connect('your_database.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT title, link FROM tasks WHERE id = ?', (task_id,))
-        task = cursor.fetchone()
+    task = await repo.get_task_by_id(task_id)
 
     if not task:
         await query.answer("Ошибка: задание не найдено.")
         return
 
-    task_title, task_link = task
-
-    # Сохраняем задание в базе данных для ученика
-    with sqlite3.connect('your_database.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute('UPDATE users SET homework = ? WHERE id = ?', (task_link, selected_student_id))
-        conn.commit()
+    _, task_title, task_link = task
 
-    # Уведомляем ученика о новом задании (если у него есть telegram_id)
-    with sqlite3.connect('your_database.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT telegram_id FROM users WHERE id = ?', (selected_student_id,))
-        result = cursor.fetchone()
-
-    if result and result[0]:
-        try:
-            keyboard = [[InlineKeyboardButton("Открыть задание", url=task_link)]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await context.bot.send_message(
-                chat_id=result[0],
-                text=f"У вас новое домашнее задание: {task_title}. Нажмите на кнопку ниже, чтобы открыть:",
-                reply_markup=reply_markup
-            )
-        except Exception as e:
-            print(f"Не удалось уведомить ученика: {e}")
+    # Сохраняем задание для ученика вместе с уведомлением в outbox (если у него есть telegram_id)
+    reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("Открыть задание", url=task_link)]])
+    telegram_id = await repo.assign_homework(
+        selected_student_id, task_link,
+        f"У вас новое домашнее задание: {task_title}. Нажмите на кнопку ниже, чтобы открыть:", reply_markup
+    )
+    if telegram_id:
+        outbox.kick(context.job_queue)
 
     # Сообщение для администратора
     await query.answer()
@@ -596,38 +618,20 @@ async def handle_variant_link(update: Update, context: CallbackContext):
         return await return_to_menu(update, context)
 
     # Сохраняем или обновляем вариант в базе данных
-    db_execute('''
-        INSERT INTO variants (exam, link) 
-        VALUES (?, ?)
-        ON CONFLICT(exam) DO UPDATE SET link = excluded.link
-    ''', (exam, link))
+    await repo.set_variant_link(exam, link)
 
     # Уведомляем всех учеников, относящихся к этому экзамену
-    with sqlite3.connect('your_database.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT telegram_id FROM users WHERE exam = ?', (exam,))
-        students = cursor.fetchall()
-
-    for student in students:
-        telegram_id = student[0]
-        if telegram_id:
-            try:
-                # Создаем клавиатуру с двумя кнопками
-                keyboard = [
-                    [InlineKeyboardButton("Открыть вариант", url=link)],  # Кнопка со ссылкой
-                    [InlineKeyboardButton("Вернуться в меню", callback_data="return_to_student_menu")]
-                    # Кнопка для возврата
-                ]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-
-                # Отправляем сообщение с кнопками
-                await context.bot.send_message(
-                    chat_id=telegram_id,
-                    text=f"У вас обновился вариант экзамена ({exam}). Нажмите на кнопку ниже, чтобы открыть:",
-                    reply_markup=reply_markup
-                )
-            except Exception as e:
-                print(f"Не удалось уведомить ученика с ID {telegram_id}: {e}")
+    telegram_ids = await repo.get_exam_telegram_ids(exam)
+    reply_markup = await variant_keyboard(exam, back_callback="return_to_student_menu")
+
+    # Рассылка идёт в фоне, ход отправки бот показывает администратору отдельным сообщением
+    await broadcaster.start(
+        context.bot,
+        f"У вас обновился вариант экзамена ({exam}). Нажмите на кнопку ниже, чтобы открыть:",
+        telegram_ids,
+        reply_markup=reply_markup,
+        admin_chat_id=update.effective_chat.id
+    )
 
     await update.message.reply_text(f"Ссылка на вариант для {exam} успешно добавлена или обновлена!")
     return await return_to_menu(update, context)
@@ -635,28 +639,23 @@ async def handle_variant_link(update: Update, context: CallbackContext):
 
 # Функция для выбора поля
 async def modify_student(update: Update, context: CallbackContext):
-    students = get_all_users()
-    if not students:
+    # Постраничная клавиатура с учениками
+    reply_markup = await student_picker('edit_student')
+    if not reply_markup:
         await update.message.reply_text("Нет зарегистрированных учеников.")
         return await return_to_menu(update, context)
 
-    # Создаём клавиатуру с учениками
-    keyboard = [[InlineKeyboardButton(student[1], callback_data=f"edit_student:{student[0]}")] for student in students]
-    keyboard.append([InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
     await update.message.reply_text("Выберите ученика для изменения данных или вернитесь в меню:",
                                     reply_markup=reply_markup)
     return None
 
 
-async def handle_edit_student(update: Update, context: CallbackContext):
+async def handle_edit_student(update: Update, context: CallbackContext, student_id):
     query = update.callback_query
-    student_id = int(query.data.split(":")[1])
     context.user_data['editing_student_id'] = student_id  # Сохраняем ID ученика
 
     # Получаем информацию об ученике
-    student_info = get_student_info(student_id)
+    student_info = await repo.get_student_info(student_id)
     if not student_info:
         await query.answer("Ошибка: ученик не найден.")
         return
@@ -679,42 +678,18 @@ async def handle_edit_student(update: Update, context: CallbackContext):
     )
 
     keyboard = [
-        [InlineKeyboardButton("Имя", callback_data="edit_field:name")],
-        [InlineKeyboardButton("Экзамен", callback_data="edit_field:exam")],
-        [InlineKeyboardButton("Дата занятия", callback_data="edit_field:class_date")],
-        [InlineKeyboardButton("Ссылка на занятие", callback_data="edit_field:class_link")],
-        [InlineKeyboardButton("Добавить описание", callback_data="edit_field:description")],
-        [InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")]
+        [InlineKeyboardButton("Имя", callback_data=pack('edit_field', 'name'))],
+        [InlineKeyboardButton("Экзамен", callback_data=pack('edit_field', 'exam'))],
+        [InlineKeyboardButton("Дата занятия", callback_data=pack('edit_field', 'class_date'))],
+        [InlineKeyboardButton("Ссылка на занятие", callback_data=pack('edit_field', 'class_link'))],
+        [InlineKeyboardButton("Добавить описание", callback_data=pack('edit_field', 'description'))],
+        [InlineKeyboardButton("Вернуться в меню", callback_data=pack('return_to_menu'))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
     await query.edit_message_text(info_message, reply_markup=reply_markup)
 
 
-# Обработка подтверждения изменений
-async def handle_confirmation(update: Update, context: CallbackContext):
-    confirmation = update.message.text
-    student_id = context.user_data.get('editing_student_id')
-    field = context.user_data.get('editing_field')
-    new_value = context.user_data.get('new_value')
-
-    if confirmation == "Да":
-        try:
-            with sqlite3.connect('your_database.db') as conn:
-                cursor = conn.cursor()
-                cursor.execute(f"UPDATE users SET {field} = ? WHERE id = ?", (new_value, student_id))
-                conn.commit()
-
-            await update.message.reply_text("Данные успешно обновлены!")
-        except sqlite3.Error as e:
-            await update.message.reply_text(f"Ошибка при обновлении базы данных: {e}")
-    else:
-        await update.message.reply_text("Изменение данных отменено.")
-
-    context.user_data.clear()  # Очищаем контекст
-    return await return_to_menu(update, context)
-
-
 async def handle_delete_description(update: Update, context: CallbackContext):
     # Получаем ID ученика из контекста
     student_id = context.user_data.get('editing_student_id')
@@ -723,7 +698,7 @@ async def handle_delete_description(update: Update, context: CallbackContext):
         return
 
     # Удаляем описание (устанавливаем NULL)
-    update_student_field(student_id, "description", None)
+    await repo.update_student_field(student_id, "description", None)
 
     # Сообщаем пользователю об удалении описания
     await update.message.reply_text("Описание удалено. Вы возвращены в меню.")
@@ -731,24 +706,12 @@ async def handle_delete_description(update: Update, context: CallbackContext):
 
 
 async def show_student_info(update: Update, context: CallbackContext):
-    students = get_all_users()  # Извлекаем всех учеников
-    if not students:
+    # Постраничная клавиатура для выбора ученика
+    reply_markup = await student_picker('show_info')
+    if not reply_markup:
         await update.message.reply_text("Нет зарегистрированных учеников.")
         return await return_to_menu(update, context)
 
-    # Создаём Inline-клавиатуру для выбора ученика
-    keyboard = [
-        [
-            InlineKeyboardButton(
-                text=f"{student[1]}",  # Имя ученика
-                callback_data=f"show_info:{student[0]}"  # ID ученика
-            )
-        ]
-        for student in students
-    ]
-    keyboard.append([InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
     await update.message.reply_text(
         "Выберите ученика для просмотра информации или вернитесь в меню:",
         reply_markup=reply_markup
@@ -783,7 +746,7 @@ async def handle_task_title(update: Update, context: CallbackContext):
         return await return_to_menu(update, context)
 
     # Проверяем, уникально ли название задания
-    if not is_task_title_unique(title, exam_type):
+    if not await repo.is_task_title_unique(title, exam_type):
         await update.message.reply_text(
             f"Задание с названием '{title}' уже существует для экзамена {exam_type}. "
             "Пожалуйста, введите другое название:"
@@ -809,10 +772,15 @@ async def handle_task_link(update: Update, context: CallbackContext):
         return await return_to_menu(update, context)
 
     # Сохраняем задание в базу данных
-    with sqlite3.connect('your_database.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute('INSERT INTO tasks (title, link, exam_type) VALUES (?, ?, ?)', (title, link, exam))
-        conn.commit()
+    try:
+        await repo.add_task(title, link, exam)
+    except sqlite3.IntegrityError:
+        # Задание с таким названием успели добавить после проверки в handle_task_title
+        await update.message.reply_text(
+            f"Задание с названием '{title}' уже существует для экзамена {exam}. "
+            "Пожалуйста, введите другое название:"
+        )
+        return ADD_TASK_TITLE
 
     await update.message.reply_text(f"Задание '{title}' для {exam} успешно добавлено!")
     return await return_to_menu(update, context)
@@ -823,9 +791,9 @@ async def handle_delete_task_exam(update: Update, context: CallbackContext):
     Шаг 1: Выбор экзамена для удаления задания через инлайн-кнопки.
     """
     keyboard = [
-        [InlineKeyboardButton("ОГЭ", callback_data="delete_exam:ОГЭ")],
-        [InlineKeyboardButton("ЕГЭ", callback_data="delete_exam:ЕГЭ")],
-        [InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")]
+        [InlineKeyboardButton("ОГЭ", callback_data=pack('delete_exam', 'ОГЭ'))],
+        [InlineKeyboardButton("ЕГЭ", callback_data=pack('delete_exam', 'ЕГЭ'))],
+        [InlineKeyboardButton("Вернуться в меню", callback_data=pack('return_to_menu'))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
@@ -836,20 +804,19 @@ async def handle_delete_task_exam(update: Update, context: CallbackContext):
     return None
 
 
-async def handle_select_task_to_delete_callback(update: Update, context: CallbackContext):
+async def handle_select_task_to_delete_callback(update: Update, context: CallbackContext, exam):
     """
     Шаг 2: Выбор задания для удаления через инлайн-кнопки.
     """
     query = update.callback_query
-    exam = query.data.split(":")[1]
 
     # Сохраняем выбранный экзамен
     context.user_data['selected_exam'] = exam
 
-    # Загружаем задания из базы данных
-    tasks = get_tasks_by_exam(exam)
+    # Клавиатура с заданиями экзамена
+    reply_markup = await catalog_picker('tasks', exam, 'delete_task')
 
-    if not tasks:
+    if not reply_markup:
         await query.answer()  # Закрываем всплывающее уведомление
 
         # Отправляем сообщение об отсутствии заданий
@@ -860,14 +827,7 @@ async def handle_select_task_to_delete_callback(update: Update, context: Callbac
                 chat_id=query.from_user.id,
                 text=f"Нет доступных заданий для экзамена {exam}."
             )
-
-    # Формируем Inline-клавиатуру с заданиями
-    keyboard = [
-        [InlineKeyboardButton(title, callback_data=f"delete_task:{task_id}")]
-        for task_id, title, _ in tasks
-    ]
-    keyboard.append([InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
+        return None
 
     await query.answer()
     await query.edit_message_text(
@@ -877,58 +837,42 @@ async def handle_select_task_to_delete_callback(update: Update, context: Callbac
     return None
 
 
-async def handle_task_deletion_callback(update: Update, context: CallbackContext):
+async def handle_task_deletion_callback(update: Update, context: CallbackContext, task_id):
     query = update.callback_query
-    data = query.data
-
-    if data == "return_to_menu":
-        await query.answer("Возврат в меню.")
-        # Очищаем context.user_data
-        context.user_data.clear()
-        # Возвращаем пользователя в главное меню
-        return await return_to_menu(update, context)
-
-    if data.startswith("delete_task:"):
-        task_id = int(data.split(":")[1])
 
-        # Удаляем задание из базы данных
-        with sqlite3.connect('your_database.db') as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT title FROM tasks WHERE id = ?', (task_id,))
-            task = cursor.fetchone()
+    # Удаляем задание из базы данных
+    task = await repo.delete_task(task_id)
 
-            if not task:
-                await query.answer("Ошибка: задание не найдено.")
-                return None
+    if not task:
+        await query.answer("Ошибка: задание не найдено.")
+        return None
 
-            task_title = task[0]
-            cursor.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
-            conn.commit()
+    task_title = task[0]
 
-        # Сообщение об успешном удалении
-        await query.answer()
-        if query.message:
-            await query.edit_message_text(f"Задание '{task_title}' было успешно удалено.")
-        else:
-            await context.bot.send_message(
-                chat_id=query.from_user.id,
-                text=f"Задание '{task_title}' было успешно удалено."
-            )
+    # Сообщение об успешном удалении
+    await query.answer()
+    if query.message:
+        await query.edit_message_text(f"Задание '{task_title}' было успешно удалено.")
+    else:
+        await context.bot.send_message(
+            chat_id=query.from_user.id,
+            text=f"Задание '{task_title}' было успешно удалено."
+        )
 
-        # Очищаем context.user_data
-        context.user_data.clear()
+    # Очищаем context.user_data
+    context.user_data.clear()
 
-        # Возвращаем пользователя в главное меню
-        await return_to_menu(update, context)
-        return ConversationHandler.END
+    # Возвращаем пользователя в главное меню
+    await return_to_menu(update, context)
+    return ConversationHandler.END
 
 
 # Начало процесса редактирования
 async def start_edit_task(update: Update, context: CallbackContext):
     buttons = [
-        [InlineKeyboardButton("ОГЭ", callback_data="exam:ОГЭ")],
-        [InlineKeyboardButton("ЕГЭ", callback_data="exam:ЕГЭ")],
-        [InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")]
+        [InlineKeyboardButton("ОГЭ", callback_data=pack('exam', 'ОГЭ'))],
+        [InlineKeyboardButton("ЕГЭ", callback_data=pack('exam', 'ЕГЭ'))],
+        [InlineKeyboardButton("Вернуться в меню", callback_data=pack('return_to_menu'))]
     ]
     reply_markup = create_inline_keyboard(buttons, row_width=2)
     await update.message.reply_text("Выберите экзамен:", reply_markup=reply_markup)
@@ -936,35 +880,27 @@ async def start_edit_task(update: Update, context: CallbackContext):
 
 
 # Обработка выбора экзамена
-async def choose_exam(update: Update, context: CallbackContext):
+async def choose_exam(update: Update, context: CallbackContext, exam_type):
     query = update.callback_query
-    exam_type = query.data.split(":")[1]
     context.user_data['exam_type'] = exam_type
 
-    tasks = get_tasks_by_exam(exam_type)
-    if not tasks:
+    reply_markup = await catalog_picker('tasks', exam_type, 'task')
+    if not reply_markup:
         await query.edit_message_text(f"Нет заданий для экзамена {exam_type}.")
         return ConversationHandler.END
-
-    keyboard = [
-        [InlineKeyboardButton(task[1], callback_data=f"task:{task[0]}")] for task in tasks
-    ]
-    keyboard.append([InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")])  # Добавляем кнопку
-    reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text("Выберите задание для редактирования:", reply_markup=reply_markup)
     return EDIT_TASK_CHOOSE_TASK
 
 
 # Обработка выбора задания
-async def choose_task(update: Update, context: CallbackContext):
+async def choose_task(update: Update, context: CallbackContext, task_id):
     query = update.callback_query
-    task_id = int(query.data.split(":")[1])
     context.user_data['task_id'] = task_id
 
     buttons = [
-        [InlineKeyboardButton("Название", callback_data="field:title")],
-        [InlineKeyboardButton("Ссылка", callback_data="field:link")],
-        [InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")]
+        [InlineKeyboardButton("Название", callback_data=pack('field', 'title'))],
+        [InlineKeyboardButton("Ссылка", callback_data=pack('field', 'link'))],
+        [InlineKeyboardButton("Вернуться в меню", callback_data=pack('return_to_menu'))]
     ]
     reply_markup = create_inline_keyboard(buttons, row_width=2)
     await query.edit_message_text("Что вы хотите изменить?", reply_markup=reply_markup)
@@ -972,9 +908,8 @@ async def choose_task(update: Update, context: CallbackContext):
 
 
 # Обработка выбора поля
-async def choose_field(update: Update, context: CallbackContext):
+async def choose_field(update: Update, context: CallbackContext, field):
     query = update.callback_query
-    field = query.data.split(":")[1]
     context.user_data['field'] = field
 
     # Добавляем кнопку "Вернуться в меню" в текстовом сообщении
@@ -990,8 +925,7 @@ async def update_task_field(update: Update, context: CallbackContext):
     new_value = update.message.text
     context.user_data['new_value'] = new_value
 
-    markup = ReplyKeyboardMarkup([['Да', 'Нет']], one_time_keyboard=True, resize_keyboard=True)
-    await update.message.reply_text(f"Вы ввели: {new_value}. Подтвердить изменения?", reply_markup=markup)
+    await update.message.reply_text(f"Вы ввели: {new_value}. Подтвердить изменения?", reply_markup=YES_NO_MENU)
     return EDIT_TASK_CONFIRM_UPDATE  # Возвращаем новое состояние
 
 
@@ -1004,12 +938,13 @@ async def confirm_task_update(update: Update, context: CallbackContext):
         new_value = context.user_data.get('new_value')
 
         try:
-            with sqlite3.connect('your_database.db') as conn:
-                cursor = conn.cursor()
-                cursor.execute(f"UPDATE tasks SET {field} = ? WHERE id = ?", (new_value, task_id))
-                conn.commit()
+            await repo.update_task_field(task_id, field, new_value)
 
             await update.message.reply_text("Задание успешно обновлено!")
+        except sqlite3.IntegrityError:
+            await update.message.reply_text(
+                f"Задание с названием '{new_value}' уже существует. Изменения не сохранены."
+            )
         except sqlite3.Error as e:
             await update.message.reply_text(f"Ошибка при обновлении базы данных: {e}")
     else:
@@ -1057,7 +992,7 @@ async def handle_note_title(update: Update, context: CallbackContext):
         return await return_to_menu(update, context)
 
     # Проверяем, уникально ли название конспекта
-    if not is_note_title_unique(title, exam_type):
+    if not await repo.is_note_title_unique(title, exam_type):
         await update.message.reply_text(
             f"Конспект с названием '{title}' уже существует для экзамена {exam_type}. "
             "Пожалуйста, введите другое название:"
@@ -1079,10 +1014,15 @@ async def handle_note_link(update: Update, context: CallbackContext):
         return await return_to_menu(update, context)
 
     # Сохраняем конспект в базу данных
-    with sqlite3.connect('your_database.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute('INSERT INTO notes (title, link, exam_type) VALUES (?, ?, ?)', (title, link, exam))
-        conn.commit()
+    try:
+        await repo.add_note(title, link, exam)
+    except sqlite3.IntegrityError:
+        # Конспект с таким названием успели добавить после проверки в handle_note_title
+        await update.message.reply_text(
+            f"Конспект с названием '{title}' уже существует для экзамена {exam}. "
+            "Пожалуйста, введите другое название:"
+        )
+        return ADD_NOTE_TITLE
 
     await update.message.reply_text(f"Конспект '{title}' для {exam} успешно добавлен!")
 
@@ -1095,9 +1035,9 @@ async def handle_note_link(update: Update, context: CallbackContext):
 
 async def handle_delete_note_exam(update: Update, context: CallbackContext):
     keyboard = [
-        [InlineKeyboardButton("ОГЭ", callback_data="delete_note_exam:ОГЭ")],
-        [InlineKeyboardButton("ЕГЭ", callback_data="delete_note_exam:ЕГЭ")],
-        [InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")]
+        [InlineKeyboardButton("ОГЭ", callback_data=pack('delete_note_exam', 'ОГЭ'))],
+        [InlineKeyboardButton("ЕГЭ", callback_data=pack('delete_note_exam', 'ЕГЭ'))],
+        [InlineKeyboardButton("Вернуться в меню", callback_data=pack('return_to_menu'))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
@@ -1108,34 +1048,22 @@ async def handle_delete_note_exam(update: Update, context: CallbackContext):
     return None
 
 
-async def handle_select_note_to_delete_callback(update: Update, context: CallbackContext):
+async def handle_select_note_to_delete_callback(update: Update, context: CallbackContext, exam):
     query = update.callback_query
-    exam = query.data.split(":")[1]
 
     # Сохраняем выбранный экзамен
     context.user_data['selected_exam'] = exam
 
-    # Загружаем конспекты из базы данных
-    with sqlite3.connect('your_database.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, title FROM notes WHERE exam_type = ?', (exam,))
-        notes = cursor.fetchall()
+    # Клавиатура с конспектами экзамена
+    reply_markup = await catalog_picker('notes', exam, 'delete_note')
 
-    if not notes:
+    if not reply_markup:
         await query.answer()
         await query.edit_message_text(f"Нет доступных конспектов для экзамена {exam}.")
         context.user_data.clear()
         await return_to_menu(update, context)
         return ConversationHandler.END
 
-    # Формируем Inline-клавиатуру с конспектами
-    keyboard = [
-        [InlineKeyboardButton(title, callback_data=f"delete_note:{note_id}")]
-        for note_id, title in notes
-    ]
-    keyboard.append([InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
     await query.answer()
     await query.edit_message_text(
         f"Выберите конспект для удаления ({exam}):",
@@ -1144,108 +1072,80 @@ async def handle_select_note_to_delete_callback(update: Update, context: Callbac
     return None
 
 
-async def handle_note_deletion_callback(update: Update, context: CallbackContext):
+async def handle_note_deletion_callback(update: Update, context: CallbackContext, note_id):
     query = update.callback_query
-    data = query.data
 
-    if data == "return_to_menu":
-        await query.answer("Возврат в меню.")
+    # Удаляем конспект из базы данных
+    note = await repo.delete_note(note_id)
+
+    if not note:
+        await query.answer("Ошибка: конспект не найден.")
         await return_to_menu(update, context)
         return ConversationHandler.END
 
-    if data.startswith("delete_note:"):
-        note_id = int(data.split(":")[1])
-
-        # Удаляем конспект из базы данных
-        with sqlite3.connect('your_database.db') as conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT title FROM notes WHERE id = ?', (note_id,))
-            note = cursor.fetchone()
-
-            if not note:
-                await query.answer("Ошибка: конспект не найден.")
-                await return_to_menu(update, context)
-                return ConversationHandler.END
-
-            note_title = note[0]
-            cursor.execute('DELETE FROM notes WHERE id = ?', (note_id,))
-            conn.commit()
+    note_title = note[0]
 
-        # Сообщение об успешном удалении
-        await query.answer()
-        # Отправляем сообщение об успешном удалении
-        if query.message:
-            await query.edit_message_text(f"Конспект '{note_title}' был успешно удален.")
-        else:
-            await context.bot.send_message(
-                chat_id=query.from_user.id,
-                text=f"Конспект '{note_title}' был успешно удален."
-            )
+    # Сообщение об успешном удалении
+    await query.answer()
+    # Отправляем сообщение об успешном удалении
+    if query.message:
+        await query.edit_message_text(f"Конспект '{note_title}' был успешно удален.")
+    else:
+        await context.bot.send_message(
+            chat_id=query.from_user.id,
+            text=f"Конспект '{note_title}' был успешно удален."
+        )
 
-        # Очищаем context.user_data
-        context.user_data.clear()
+    # Очищаем context.user_data
+    context.user_data.clear()
 
-        # Возвращаемся в меню
-        await return_to_menu(update, context)
-        return ConversationHandler.END
+    # Возвращаемся в меню
+    await return_to_menu(update, context)
+    return ConversationHandler.END
 
 
 async def start_edit_note(update: Update, context: CallbackContext):
     buttons = [
-        [InlineKeyboardButton("ОГЭ", callback_data="note_exam:ОГЭ")],
-        [InlineKeyboardButton("ЕГЭ", callback_data="note_exam:ЕГЭ")],
-        [InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")]
+        [InlineKeyboardButton("ОГЭ", callback_data=pack('note_exam', 'ОГЭ'))],
+        [InlineKeyboardButton("ЕГЭ", callback_data=pack('note_exam', 'ЕГЭ'))],
+        [InlineKeyboardButton("Вернуться в меню", callback_data=pack('return_to_menu'))]
     ]
     reply_markup = create_inline_keyboard(buttons, row_width=2)
     await update.message.reply_text("Выберите экзамен:", reply_markup=reply_markup)
     return EDIT_NOTE_CHOOSE_EXAM
 
 
-async def choose_note_exam(update: Update, context: CallbackContext):
+async def choose_note_exam(update: Update, context: CallbackContext, exam_type):
     query = update.callback_query
-    exam_type = query.data.split(":")[1]
     context.user_data['note_exam'] = exam_type
 
-    # Получаем конспекты для выбранного экзамена
-    with sqlite3.connect('your_database.db') as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, title FROM notes WHERE exam_type = ?', (exam_type,))
-        notes = cursor.fetchall()
+    # Клавиатура с конспектами для выбранного экзамена
+    reply_markup = await catalog_picker('notes', exam_type, 'note')
 
-    if not notes:
+    if not reply_markup:
         await query.edit_message_text(f"Нет конспектов для экзамена {exam_type}.")
-        return return_to_menu(update, context)  # Возвращаемся в меню
-
-    # Формируем Inline-клавиатуру с конспектами
-    keyboard = [
-        [InlineKeyboardButton(title, callback_data=f"note:{note_id}")]
-        for note_id, title in notes
-    ]
-    keyboard.append([InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")])
-    reply_markup = InlineKeyboardMarkup(keyboard)
+        return await return_to_menu(update, context)  # Возвращаемся в меню
 
     await query.edit_message_text("Выберите конспект для редактирования:", reply_markup=reply_markup)
     return EDIT_NOTE_CHOOSE_NOTE
 
 
-async def choose_note(update: Update, context: CallbackContext):
+async def choose_note(update: Update, context: CallbackContext, note_id):
     query = update.callback_query
-    note_id = int(query.data.split(":")[1])
     context.user_data['note_id'] = note_id
 
     buttons = [
-        [InlineKeyboardButton("Название", callback_data="note_field:title")],
-        [InlineKeyboardButton("Ссылка", callback_data="note_field:link")],
-        [InlineKeyboardButton("Вернуться в меню", callback_data="return_to_menu")],
+        [InlineKeyboardButton("Название", callback_data=pack('note_field', 'title'))],
+        [InlineKeyboardButton("Ссылка", callback_data=pack('note_field', 'link'))],
+        [InlineKeyboardButton("Вернуться в меню", callback_data=pack('return_to_menu'))],
     ]
     reply_markup = create_inline_keyboard(buttons, row_width=2)
     await query.edit_message_text("Что вы хотите изменить?", reply_markup=reply_markup)
     return EDIT_NOTE_CHOOSE_FIELD
 
 
-async def choose_note_field(update: Update, context: CallbackContext):
+async def choose_note_field(update: Update, context: CallbackContext, field):
     query = update.callback_query
-    field = query.data.split(":")[1]
     context.user_data['note_field'] = field
 
     markup = ReplyKeyboardMarkup([['Вернуться в меню']], one_time_keyboard=True, resize_keyboard=True)
@@ -1259,8 +1159,7 @@ async def update_note_field(update: Update, context: CallbackContext):
     new_value = update.message.text
     context.user_data['new_value'] = new_value
 
-    markup = ReplyKeyboardMarkup([['Да', 'Нет']], one_time_keyboard=True, resize_keyboard=True)
-    await update.message.reply_text(f"Вы ввели: {new_value}. Подтвердить изменения?", reply_markup=markup)
+    await update.message.reply_text(f"Вы ввели: {new_value}. Подтвердить изменения?", reply_markup=YES_NO_MENU)
     return EDIT_NOTE_CONFIRM_UPDATE
 
 
@@ -1278,12 +1177,13 @@ async def confirm_note_update(update: Update, context: CallbackContext):
             return await return_to_menu(update, context)
 
         try:
-            with sqlite3.connect('your_database.db') as conn:
-                cursor = conn.cursor()
-                cursor.execute(f"UPDATE notes SET {field} = ? WHERE id = ?", (new_value, note_id))
-                conn.commit()
+            await repo.update_note_field(note_id, field, new_value)
 
             await update.message.reply_text("Конспект успешно обновлен!")
+        except sqlite3.IntegrityError:
+            await update.message.reply_text(
+                f"Конспект с названием '{new_value}' уже существует. Изменения не сохранены."
+            )
         except sqlite3.Error as e:
             await update.message.reply_text(f"Ошибка при обновлении базы данных: {e}")
     elif confirmation == "Нет":
@@ -1300,11 +1200,117 @@ async def confirm_note_update(update: Update, context: CallbackContext):
     return await return_to_menu(update, context)
 
 
-def main():
-    create_tables()
+async def memory_report(update: Update, context: CallbackContext):
+    """Команда /memory: сколько памяти занимает бот и данные пользователей, загрузка очереди обновлений."""
+    if update.message.from_user.id not in ADMIN_IDS:
+        return
+
+    report = evictor.report(context.application)
+    updates = context.application.update_processor.stats()
+    cache = repo.student_cache.stats()
+    conversations = ", ".join(f"{name}: {count}" for name, count in (report['conversations'] or {}).items())
+    in_memory = ", ".join(f"{name}: {count} (выгружено {report['conversations_unloaded'][name]})"
+                          for name, count in report['conversations_in_memory'].items())
+    await update.message.reply_text(
+        f"Память процесса: {report['rss_mb']} МБ\n"
+        f"user_data: {report['user_data']} пользователей, {report['user_data_keys']} ключей\n"
+        f"chat_data: {report['chat_data']} чатов\n"
+        f"Незавершённые диалоги: {conversations or 'нет данных'}\n"
+        f"Диалоги в памяти: {in_memory or 'нет данных'}\n"
+        f"Кэш учеников: {cache['size']} записей, попаданий {cache['hits']}, промахов {cache['misses']} "
+        f"({cache['hit_rate']:.0%} попаданий), кэш кнопок: {codec.stats()['cached']}\n"
+        f"Обновления: в обработке {updates['active']}, ждут {updates['pending']} "
+        f"(чатов в очереди {updates['chats']}, самая длинная очередь {updates['max_chat_depth']})\n"
+        f"Удалено неактивных: пользователей {report['evicted']['user']}, чатов {report['evicted']['chat']}, "
+        f"выгружено диалогов {report['evicted']['conversation']}"
+    )
+
+
+async def slow_queries_report(update: Update, context: CallbackContext):
+    """Команда /slow [N]: N запросов к базе с наибольшим суммарным временем с момента запуска."""
+    if update.message.from_user.id not in ADMIN_IDS:
+        return
+    if not tracer.enabled:
+        await update.message.reply_text("Замер запросов выключен (SLOW_QUERY_THRESHOLD в core/config.py)")
+        return
+
+    limit = int(context.args[0]) if context.args and context.args[0].isdigit() else SLOW_QUERY_TOP
+    report = tracer.report(limit)
+    # Сообщение Telegram не длиннее 4096 символов
+    await update.message.reply_text(report[:4096] if report else "Запросов ещё не было")
+
+
+async def on_startup(application: Application):
+    await repo.start()
+    # Продолжаем рассылки, прерванные предыдущей остановкой бота
+    await broadcaster.resume(application.bot)
+    # Уведомления, оставшиеся в outbox с прошлого запуска, отправятся при первом запуске job
+    outbox.schedule(application.job_queue)
+    evictor.schedule(application.job_queue)
 
-    # Ваш токен для бота
-    application = Application.builder().token(BOT_TOKEN).build()
+
+async def on_stop(application: Application):
+    # Прерываем рассылки (продолжатся после запуска) и, пока бот ещё доступен,
+    # отправляем накопившиеся уведомления до закрытия соединения с Telegram
+    await broadcaster.stop()
+    await outbox.flush(application.bot)
+
+
+async def on_shutdown(application: Application):
+    # Дожидаемся фиксации всех поставленных в очередь изменений
+    await repo.stop()
+
+
+def build_application(builder=None, update_processor=None, persistence=None):
+    """
+    Собирает приложение со всеми обработчиками.
+
+    :param builder: ApplicationBuilder (по умолчанию — с токеном из конфигурации). Бенчмарки передают
+        свой, например с фейковым Bot API.
+    :param update_processor: Обработчик очереди обновлений (по умолчанию — PerChatUpdateProcessor:
+        обновления разных чатов параллельно, одного чата — по порядку).
+    :param persistence: Хранилище состояний диалогов и user_data (по умолчанию — SQLitePersistence
+        в базе бота).
+    :return: Объект Application.
+    """
+    if builder is None:
+        builder = Application.builder().token(BOT_TOKEN)
+    if update_processor is None:
+        update_processor = PerChatUpdateProcessor(UPDATE_CONCURRENCY)
+    if persistence is None:
+        persistence = SQLitePersistence()
+    application = builder.concurrent_updates(update_processor).persistence(persistence) \
+        .post_init(on_startup).post_stop(on_stop).post_shutdown(on_shutdown).build()
+
+    # Нажатия на inline-кнопки: действие из callback_data -> обработчик с аргументами (схема — в callbacks.py)
+    router = CallbackRouter()
+    router.on_stale(handle_stale_callback)
+    router.add('return_to_menu', handle_menu_callback)
+    router.add('return_to_student_menu', return_to_student_menu_callback)
+    router.add('delete_student', handle_delete_callback)
+    router.add('select_student', handle_select_student)
+    router.add('assign_homework', handle_assign_homework_callback)
+    router.add('students_page', handle_students_page)
+    router.add('bulk_exam', handle_bulk_exam)
+    router.add('bulk_toggle', handle_bulk_toggle)
+    router.add('bulk_all', handle_bulk_all)
+    router.add('bulk_done', handle_bulk_done)
+    router.add('bulk_assign', handle_bulk_assign_callback)
+    router.add('edit_student', handle_edit_student)
+    router.add('edit_field', handle_edit_field)
+    router.add('new_exam', handle_new_exam)
+    router.add('show_info', handle_show_student_info)
+    router.add('delete_exam', handle_select_task_to_delete_callback)
+    router.add('delete_task', handle_task_deletion_callback)
+    router.add('delete_note_exam', handle_select_note_to_delete_callback)
+    router.add('delete_note', handle_note_deletion_callback)
+    router.add('note_exam', choose_note_exam)
+    router.add('note', choose_note)
+    router.add('note_field', choose_note_field)
+    # Только внутри диалога редактирования заданий
+    router.add('exam', choose_exam, top_level=False)
+    router.add('task', choose_task, top_level=False)
+    router.add('field', choose_field, top_level=False)
 
     # Определение ConversationHandler
     conversation_handler = ConversationHandler(
@@ -1348,16 +1354,16 @@ def main():
             ADD_NOTE_TITLE: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_note_title)],
             ADD_NOTE_LINK: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_note_link)],
             EDIT_NOTE_CHOOSE_EXAM: [
-                CallbackQueryHandler(choose_note_exam, pattern=r"^note_exam:"),
-                CallbackQueryHandler(handle_return_to_menu, pattern=r"^return_to_menu$")
+                router.handler('note_exam'),
+                router.handler('return_to_menu', callback=handle_return_to_menu)
             ],
             EDIT_NOTE_CHOOSE_NOTE: [
-                CallbackQueryHandler(choose_note, pattern=r"^note:"),
-                CallbackQueryHandler(handle_return_to_menu, pattern=r"^return_to_menu$")
+                router.handler('note'),
+                router.handler('return_to_menu', callback=handle_return_to_menu)
             ],
             EDIT_NOTE_CHOOSE_FIELD: [
-                CallbackQueryHandler(choose_note_field, pattern=r"^note_field:"),
-                CallbackQueryHandler(handle_return_to_menu, pattern=r"^return_to_menu$")
+                router.handler('note_field'),
+                router.handler('return_to_menu', callback=handle_return_to_menu)
             ],
             EDIT_NOTE_UPDATE_FIELD: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, update_note_field),
@@ -1369,18 +1375,18 @@ def main():
             ],
 
             EDIT_TASK_CHOOSE_EXAM: [
-                CallbackQueryHandler(choose_exam, pattern=r"^exam:"),
-                CallbackQueryHandler(handle_return_to_menu, pattern=r"^return_to_menu$")
+                router.handler('exam'),
+                router.handler('return_to_menu', callback=handle_return_to_menu)
                 # Обработчик для возврата в меню
             ],
             EDIT_TASK_CHOOSE_TASK: [
-                CallbackQueryHandler(choose_task, pattern=r"^task:"),
-                CallbackQueryHandler(handle_return_to_menu, pattern=r"^return_to_menu$")
+                router.handler('task'),
+                router.handler('return_to_menu', callback=handle_return_to_menu)
                 # Обработчик для возврата в меню
             ],
             EDIT_TASK_CHOOSE_FIELD: [
-                CallbackQueryHandler(choose_field, pattern=r"^field:"),
-                CallbackQueryHandler(handle_return_to_menu, pattern=r"^return_to_menu$")
+                router.handler('field'),
+                router.handler('return_to_menu', callback=handle_return_to_menu)
                 # Обработчик для возврата в меню
             ],
             EDIT_TASK_UPDATE_FIELD: [
@@ -1393,69 +1399,109 @@ def main():
                 MessageHandler(filters.Regex("^Вернуться в меню$"), handle_return_to_menu)
                 # Обработчик для возврата в меню
             ],
+            # Брошенный диалог завершается по тайм-ауту вместе с данными
+            ConversationHandler.TIMEOUT: [timeout_handler()],
         },
         fallbacks=[CommandHandler('start', return_to_menu)],
+        name="main",
+        persistent=True,
+        conversation_timeout=CONVERSATION_TIMEOUTS["main"],
     )
 
     modify_user_handler = ConversationHandler(
-        entry_points=[CallbackQueryHandler(handle_edit_student,  pattern=r"^edit_student:\d+$")],
+        entry_points=[router.handler('edit_student')],
         states={
-                CHOOSING_FIELD: [CallbackQueryHandler(handle_edit_field,
-                                                      pattern=r"^edit_field:(name|exam|class_date|class_link)$")],
+                CHOOSING_FIELD: [router.handler('edit_field')],
                 UPDATING_FIELD: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_new_value)],
-                CONFIRMATION: [MessageHandler(filters.Regex("^(Да|Нет)$"), handle_confirmation)]
+                CONFIRMATION: [MessageHandler(filters.Regex("^(Да|Нет)$"), handle_confirmation)],
+                ConversationHandler.TIMEOUT: [timeout_handler('editing_student_id', 'editing_field', 'new_value',
+                                                              'state')]
                 },
         fallbacks=[
             CommandHandler('start', return_to_menu)
-        ]
+        ],
+        name="modify_student",
+        persistent=True,
+        conversation_timeout=CONVERSATION_TIMEOUTS["modify_student"],
     )
 
     homework_link_handler = ConversationHandler(
-        entry_points=[CallbackQueryHandler(handle_select_student, pattern=r"^select_student:\d+$")],
+        entry_points=[router.handler('select_student')],
         # Начинаем с выбора ученика
         states={
             HOMEWORK_LINK: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_homework_link)],
             # Ожидаем ввод ссылки
-            CONFIRM_HOMEWORK_LINK: [MessageHandler(filters.Regex("^(Да|Нет)$"), handle_confirm_homework_link)]
+            CONFIRM_HOMEWORK_LINK: [MessageHandler(filters.Regex("^(Да|Нет)$"), handle_confirm_homework_link)],
             # Ожидаем подтверждение
+            ConversationHandler.TIMEOUT: [timeout_handler('selected_student_id', 'homework_link')]
         },
         fallbacks=[
             CommandHandler('start', return_to_menu)  # Возврат в меню в случае ошибки
-        ]
+        ],
+        name="homework_link",
+        persistent=True,
+        conversation_timeout=CONVERSATION_TIMEOUTS["homework_link"],
     )
 
+    # Время последнего обновления каждого пользователя — до всех остальных обработчиков
+    application.add_handler(evictor.handler(), group=-1)
+    evictor.add_conversation(conversation_handler)
     # Добавление основного ConversationHandler
     application.add_handler(conversation_handler)  # Основной обработчик
     application.add_handler(modify_user_handler)  # Изолированный обработчик
     application.add_handler(homework_link_handler)
+    application.add_handler(CommandHandler('find', find_student))
+    application.add_handler(CommandHandler('memory', memory_report))
+    application.add_handler(CommandHandler('slow', slow_queries_report))
+    application.add_handler(InlineQueryHandler(handle_inline_query))
     # application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_homework_link))
 
     # Обработчики для CallbackQuery
-    application.add_handler(CallbackQueryHandler(handle_delete_callback, pattern=r"^delete_student:"))
-    application.add_handler(CallbackQueryHandler(handle_select_student, pattern=r"^select_student:"))
-    application.add_handler(CallbackQueryHandler(handle_assign_homework_callback, pattern=r"^assign_homework:"))
-    application.add_handler(CallbackQueryHandler(handle_delete_callback, pattern="^return_to_menu$"))
-    application.add_handler(CallbackQueryHandler(handle_edit_student, pattern=r"^edit_student:\d+$"))
-    application.add_handler(CallbackQueryHandler(handle_edit_field, pattern=r"^edit_field:.*"))
-    application.add_handler(CallbackQueryHandler(handle_new_exam, pattern=r"^new_exam:.*"))
-    application.add_handler(CallbackQueryHandler(handle_show_student_info, pattern=r"^show_info:\d+$"))
-    application.add_handler(CallbackQueryHandler(handle_select_task_to_delete_callback,
-                                                 pattern=r"^delete_exam:(ОГЭ|ЕГЭ)$"))
-    application.add_handler(CallbackQueryHandler(handle_task_deletion_callback, pattern=r"^delete_task:\d+$"))
-    application.add_handler(
-        CallbackQueryHandler(handle_select_note_to_delete_callback, pattern=r"^delete_note_exam:(ОГЭ|ЕГЭ)$"))
-    application.add_handler(CallbackQueryHandler(handle_note_deletion_callback, pattern=r"^delete_note:\d+$"))
-    application.add_handler(CallbackQueryHandler(choose_note_exam, pattern=r"^note_exam:"))
-    application.add_handler(CallbackQueryHandler(choose_note, pattern=r"^note:"))
-    application.add_handler(CallbackQueryHandler(choose_note_field, pattern=r"^note_field:"))
-
-    application.add_handler(CallbackQueryHandler(return_to_student_menu, pattern="^return_to_menu$"))
-    application.add_handler(CallbackQueryHandler(return_to_student_menu_callback, pattern="^return_to_student_menu$"))
+    application.add_handler(router.handler())
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, global_message_handler))
     application.add_handler(MessageHandler(filters.Regex("^/start$"), start))
+    return application
+
+
+def main():
+    init_pool()
+    create_tables()
+    application = build_application()
+    if RECORD_UPDATES_DIR:
+        # Снимок базы и запись обновлений для воспроизведения (python -m benchmarks.replay)
+        print(f"Обновления записываются в {recorder.start()}")
+        application.add_handler(recorder.handler(), group=-2)
+    if METRICS_PORT:
+        # Обёртки ставятся после регистрации всех обработчиков
+        metrics.instrument_database(database)
+        metrics.instrument_application(application)
+        metrics.instrument_cache(repo.student_cache)
+        metrics.serve(METRICS_LISTEN, METRICS_PORT)
+        print(f"Метрики: http://{METRICS_LISTEN}:{METRICS_PORT}/metrics")
 
     # Запуск приложения
-    application.run_polling()
+    if RUN_MODE == "webhook":
+        # Telegram присылает обновления на WEBHOOK_URL; встроенный HTTP-сервер отвечает 403 на запросы
+        # без верного секретного токена
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET_TOKEN or secrets.token_urlsafe(32),
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            cert=WEBHOOK_CERT,
+            key=WEBHOOK_KEY,
+        )
+    elif RUN_MODE == "polling":
+        application.run_polling()
+    else:
+        raise ValueError(f"Неизвестный RUN_MODE: {RUN_MODE!r} (ожидается 'polling' или 'webhook')")
+    recorder.close()
+    metrics.stop()
+    repo.close()
+    close_pool()
+    tracer.close()
 
 
 if __name__ == '__main__':
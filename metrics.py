@@ -0,0 +1,281 @@
+import bisect
+import functools
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telegram.ext import ApplicationHandlerStop, ConversationHandler
+
+import core.config
+from core.config import METRICS_BUCKETS
+
+
+def _state_names():
+    """Имена состояний диалогов по значению: целые состояния перечислены в core.config.__all__ начиная с CHOOSING."""
+    names = core.config.__all__[core.config.__all__.index("CHOOSING"):]
+    states = {getattr(core.config, name): name for name in names}
+    states[ConversationHandler.TIMEOUT] = "TIMEOUT"
+    return states
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """
+    Гистограмма длительностей с метками, как histogram в Prometheus: число наблюдений по корзинам,
+    их сумма и количество. Наблюдения приходят и из цикла событий, и из потоков SQLite, поэтому под блокировкой.
+    """
+
+    def __init__(self, name, documentation, labelnames, buckets=METRICS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}  # значения меток -> [наблюдений по корзинам (последняя — +Inf), сумма]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in sorted(self._series.items())]
+        for labels, counts, total in series:
+            label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels))
+            prefix = f"{label_text}," if label_text else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float('inf') else repr(float(bound))
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Счётчик с метками, как counter в Prometheus."""
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels))
+            lines.append(f"{self.name}{{{label_text}}} {value}")
+        return lines
+
+
+class Gauge:
+    """Показатель без меток, значение которого читается при каждом запросе метрик (gauge или counter)."""
+
+    def __init__(self, name, documentation, read, kind="gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+        self.kind = kind
+
+    def render(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}",
+                f"{self.name} {self.read()}"]
+
+
+# Показатели PerChatUpdateProcessor.stats: ключ, имя, описание, тип
+UPDATE_PROCESSOR_GAUGES = (
+    ('active', "bot_updates_active", "Обновления, которые обрабатываются сейчас", "gauge"),
+    ('pending', "bot_updates_waiting", "Обновления, ждущие очереди своего чата или свободного места", "gauge"),
+    ('chats', "bot_update_chats", "Чаты, у которых есть обновления в обработке или в очереди", "gauge"),
+    ('max_chat_depth', "bot_update_chat_queue_max_depth", "Самая длинная очередь обновлений одного чата", "gauge"),
+    ('processed', "bot_updates_processed_total", "Обработанные обновления", "counter"),
+)
+
+# Показатели StudentCache.stats: ключ, имя, описание, тип
+STUDENT_CACHE_GAUGES = (
+    ('size', "bot_student_cache_entries", "Записи учеников в кэше", "gauge"),
+    ('hits', "bot_student_cache_hits_total", "Обращения к кэшу учеников, найденные в кэше", "counter"),
+    ('misses', "bot_student_cache_misses_total", "Обращения к кэшу учеников, ушедшие в базу", "counter"),
+    ('hit_rate', "bot_student_cache_hit_ratio", "Доля попаданий в кэш учеников с момента запуска", "gauge"),
+)
+
+
+class Metrics:
+    """
+    Метрики обработчиков и запросов к базе в текстовом формате Prometheus.
+
+    instrument_application оборачивает callback каждого зарегистрированного обработчика, в том числе
+    внутри состояний ConversationHandler и маршрутов CallbackRouter: время выполнения и ошибки
+    с метками handler (имя функции) и state (состояние диалога, entry / fallback для точек входа
+    и выхода, пусто вне диалогов), — и добавляет загрузку очереди обновлений (UPDATE_PROCESSOR_GAUGES).
+    instrument_database оборачивает функции database.py: время и ошибки с меткой query.
+    instrument_cache добавляет попадания и промахи кэша учеников (STUDENT_CACHE_GAUGES).
+    Количество вызовов — _count гистограмм. serve отдаёт метрики по HTTP с отдельного потока,
+    поэтому они доступны, даже если цикл событий занят.
+    """
+
+    def __init__(self):
+        self.handler_seconds = Histogram("bot_handler_duration_seconds", "Время выполнения обработчиков",
+                                         ("handler", "state"))
+        self.handler_errors = Counter("bot_handler_errors_total", "Исключения в обработчиках", ("handler", "state"))
+        self.query_seconds = Histogram("bot_db_query_duration_seconds", "Время выполнения функций database.py",
+                                       ("query",))
+        self.query_errors = Counter("bot_db_query_errors_total", "Исключения в функциях database.py", ("query",))
+        self.gauges = {}  # имя -> Gauge
+        self._server = None
+
+    def render(self):
+        lines = []
+        for metric in (self.handler_seconds, self.handler_errors, self.query_seconds, self.query_errors,
+                       *self.gauges.values()):
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+    # Обработчики
+
+    def instrument_application(self, application):
+        """
+        Оборачивает обработчики приложения; вызывается после регистрации всех обработчиков.
+        Уже обёрнутые обработчики пропускаются, поэтому повторный вызов не удваивает замеры.
+        """
+        states = _state_names()
+        seen = set()
+        for handlers in application.handlers.values():
+            for handler in handlers:
+                self._instrument_handler(handler, "", states, seen)
+        processor = application.update_processor
+        if hasattr(processor, 'stats'):
+            for key, name, documentation, kind in UPDATE_PROCESSOR_GAUGES:
+                self.gauges[name] = Gauge(name, documentation, lambda key=key: processor.stats()[key], kind)
+
+    def instrument_cache(self, cache):
+        """Добавляет показатели кэша учеников (cache.StudentCache)."""
+        for key, name, documentation, kind in STUDENT_CACHE_GAUGES:
+            self.gauges[name] = Gauge(name, documentation, lambda key=key: cache.stats()[key], kind)
+
+    def _instrument_handler(self, handler, state, states, seen):
+        if id(handler) in seen:
+            return
+        seen.add(id(handler))
+        if isinstance(handler, ConversationHandler):
+            for inner in handler.entry_points:
+                self._instrument_handler(inner, "entry", states, seen)
+            for key, inner_handlers in handler.states.items():
+                for inner in inner_handlers:
+                    self._instrument_handler(inner, states.get(key, str(key)), states, seen)
+            for inner in handler.fallbacks:
+                self._instrument_handler(inner, "fallback", states, seen)
+        elif hasattr(handler, 'route_callback'):
+            # Нажатия CallbackRouter: обработчик известен только после разбора callback_data
+            if 'handle_update' in vars(handler):
+                return  # Уже обёрнут
+            handle_update = handler.handle_update
+
+            async def timed_route(update, application, check_result, context):
+                name = handler.route_callback(check_result).__name__
+                return await self._timed_handler(name, state, handle_update(update, application, check_result,
+                                                                            context))
+
+            handler.handle_update = timed_route
+        elif not getattr(handler.callback, '_timed', False):
+            callback = handler.callback
+            name = getattr(callback, '__name__', type(callback).__name__)
+
+            @functools.wraps(callback)
+            async def timed(update, context):
+                return await self._timed_handler(name, state, callback(update, context))
+
+            timed._timed = True
+            handler.callback = timed
+
+    async def _timed_handler(self, name, state, coroutine):
+        started = time.perf_counter()
+        try:
+            return await coroutine
+        except ApplicationHandlerStop:
+            raise
+        except Exception:
+            self.handler_errors.inc((name, state))
+            raise
+        finally:
+            self.handler_seconds.observe((name, state), time.perf_counter() - started)
+
+    # База данных
+
+    def instrument_database(self, module):
+        """
+        Оборачивает функции модуля (database.py). Обращения через атрибут модуля (database.func, как в
+        repository.py) и вызовы между функциями модуля идут уже через обёртки.
+        """
+        for name, func in list(vars(module).items()):
+            if callable(func) and getattr(func, '__module__', None) == module.__name__ \
+                    and not name.startswith('_') and not isinstance(func, type) and not getattr(func, '_timed', False):
+                setattr(module, name, self._timed_query(name, func))
+
+    def _timed_query(self, name, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                self.query_errors.inc((name,))
+                raise
+            finally:
+                self.query_seconds.observe((name,), time.perf_counter() - started)
+
+        timed._timed = True
+        return timed
+
+    # HTTP
+
+    def serve(self, listen, port):
+        """Запускает HTTP-сервер метрик (GET /metrics) на отдельном потоке."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Prometheus опрашивает каждые несколько секунд: журнал запросов не нужен
+
+        self._server = ThreadingHTTPServer((listen, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+        return self._server.server_address
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+metrics = Metrics()
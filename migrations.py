@@ -0,0 +1,309 @@
+from connection import get_connection
+from utils import natural_sort_key
+
+
+def table_columns(conn, table):
+    """Список колонок таблицы (пустой, если таблицы нет)."""
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+
+
+def add_column(conn, table, column, definition):
+    """Добавляет колонку, если её ещё нет."""
+    if column not in table_columns(conn, table):
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+def rebuild_table(conn, table, create_sql):
+    """
+    Пересоздаёт таблицу по новому определению с сохранением данных.
+
+    SQLite не умеет менять существующие колонки через ALTER TABLE, поэтому таблица
+    создаётся заново под временным именем, данные общих колонок переносятся,
+    а старая таблица заменяется новой. Индексы старой таблицы удаляются вместе с ней
+    и должны быть созданы заново следующими миграциями.
+
+    :param conn: Соединение с открытой транзакцией.
+    :param table: Имя таблицы.
+    :param create_sql: CREATE TABLE с плейсхолдером {table} вместо имени.
+    """
+    new_table = f'{table}__new'
+    conn.execute(f'DROP TABLE IF EXISTS {new_table}')
+    conn.execute(create_sql.format(table=new_table))
+
+    old_columns = table_columns(conn, table)
+    common = ', '.join(column for column in table_columns(conn, new_table) if column in old_columns)
+    conn.execute(f'INSERT INTO {new_table} ({common}) SELECT {common} FROM {table}')
+    conn.execute(f'DROP TABLE {table}')
+    conn.execute(f'ALTER TABLE {new_table} RENAME TO {table}')
+
+
+def dedupe_titles(conn, table):
+    """
+    Переименовывает задания или конспекты, название которых повторяется в пределах экзамена:
+    первая по id запись сохраняет название, остальные получают «Название (2)», «Название (3)» и т.д.
+    Без этого уникальный индекс по (exam_type, title) не создаётся на базах с повторами.
+
+    :param conn: Соединение с открытой транзакцией.
+    :param table: 'tasks' или 'notes'.
+    """
+    rows = conn.execute(f'SELECT id, exam_type, title FROM {table} ORDER BY id').fetchall()
+    taken = {(exam_type, title) for _, exam_type, title in rows}
+    seen = set()
+    renamed = []
+    for row_id, exam_type, title in rows:
+        if (exam_type, title) not in seen:
+            seen.add((exam_type, title))
+            continue
+        number = 2
+        while (exam_type, f'{title} ({number})') in taken:
+            number += 1
+        new_title = f'{title} ({number})'
+        taken.add((exam_type, new_title))
+        renamed.append((new_title, row_id))
+    conn.executemany(f'UPDATE {table} SET title = ? WHERE id = ?', renamed)
+
+
+USERS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        exam TEXT,
+        password TEXT,
+        telegram_id INTEGER,
+        homework TEXT,
+        class_link TEXT,
+        class_date TEXT,
+        description TEXT
+    )
+'''
+
+VARIANTS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        exam TEXT UNIQUE,
+        link TEXT,
+        class_date TEXT
+    )
+'''
+
+TASKS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        link TEXT NOT NULL,
+        exam_type TEXT NOT NULL
+    )
+'''
+
+NOTES_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        link TEXT NOT NULL,
+        exam_type TEXT NOT NULL
+    )
+'''
+
+BROADCASTS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        text TEXT NOT NULL,
+        reply_markup TEXT,
+        admin_chat_id INTEGER,
+        status TEXT NOT NULL DEFAULT 'running',
+        created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+BROADCAST_RECIPIENTS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        broadcast_id INTEGER NOT NULL REFERENCES broadcasts (id) ON DELETE CASCADE,
+        telegram_id INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        error TEXT,
+        PRIMARY KEY (broadcast_id, telegram_id)
+    ) WITHOUT ROWID
+'''
+
+OUTBOX_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        reply_markup TEXT,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at REAL NOT NULL DEFAULT 0,
+        last_error TEXT,
+        created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+# Данные python-telegram-bot (context.user_data, chat_data, bot_data, callback_data) в виде pickle:
+# kind — 'user', 'chat', 'bot' или 'callback', key — ID пользователя или чата (0 для bot и callback)
+PERSISTENCE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        kind TEXT NOT NULL,
+        key INTEGER NOT NULL,
+        data BLOB NOT NULL,
+        PRIMARY KEY (kind, key)
+    ) WITHOUT ROWID
+'''
+
+# Состояния ConversationHandler: key — ключ диалога (кортеж ID) в виде JSON, state — pickle
+CONVERSATIONS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        name TEXT NOT NULL,
+        key TEXT NOT NULL,
+        state BLOB NOT NULL,
+        PRIMARY KEY (name, key)
+    ) WITHOUT ROWID
+'''
+
+# Полнотекстовый индекс по имени и описанию учеников. Индекс хранит только токены (content=''),
+# сами строки читаются из users; синхронизацию обеспечивают триггеры. Токенизатор не отождествляет
+# «ё» и «е», поэтому текст попадает в индекс уже с заменой ё на е (см. database.search_students).
+def _fts_text(column):
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+USERS_FTS = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5("
+    "name, description, content='', tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')",
+    f'''CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts (rowid, name, description)
+        VALUES (new.id, {_fts_text('new.name')}, {_fts_text('new.description')});
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+        INSERT INTO users_fts (users_fts, rowid, name, description)
+        VALUES ('delete', old.id, {_fts_text('old.name')}, {_fts_text('old.description')});
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF name, description ON users BEGIN
+        INSERT INTO users_fts (users_fts, rowid, name, description)
+        VALUES ('delete', old.id, {_fts_text('old.name')}, {_fts_text('old.description')});
+        INSERT INTO users_fts (rowid, name, description)
+        VALUES (new.id, {_fts_text('new.name')}, {_fts_text('new.description')});
+    END''',
+]
+
+
+# Индексы под горячие запросы. Колонки после ключа поиска делают индекс покрывающим:
+# SQLite отвечает на запрос из индекса, не обращаясь к самой таблице.
+INDEXES = [
+    # get_user_by_telegram_id, student_menu, show_variant, handle_student_menu
+    'CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users (telegram_id, exam, name)',
+    # get_user_by_password
+    'CREATE INDEX IF NOT EXISTS idx_users_password ON users (password, name, exam)',
+    # handle_variant_link: рассылка ученикам экзамена
+    'CREATE INDEX IF NOT EXISTS idx_users_exam ON users (exam, telegram_id)',
+    # get_tasks_by_exam, is_task_title_unique
+    'CREATE UNIQUE INDEX IF NOT EXISTS idx_tasks_exam_title ON tasks (exam_type, title)',
+    # get_notes_by_exam, is_note_title_unique
+    'CREATE UNIQUE INDEX IF NOT EXISTS idx_notes_exam_title ON notes (exam_type, title)',
+]
+
+
+def _base_schema(conn):
+    """Базовые таблицы; для старых баз догоняет колонки, добавленные вручную."""
+    for template, table in ((USERS_TABLE, 'users'), (VARIANTS_TABLE, 'variants'),
+                            (TASKS_TABLE, 'tasks'), (NOTES_TABLE, 'notes')):
+        conn.execute(template.format(table=table))
+
+    add_column(conn, 'users', 'class_date', 'TEXT')
+    add_column(conn, 'users', 'description', 'TEXT')
+
+    if 'id' not in table_columns(conn, 'variants'):
+        rebuild_table(conn, 'variants', VARIANTS_TABLE)
+
+
+def _hot_indexes(conn):
+    """Индексы под горячие запросы (см. INDEXES)."""
+    # Уникальные индексы названий не создаются, пока в таблице есть повторы
+    for table in ('tasks', 'notes'):
+        dedupe_titles(conn, table)
+    for statement in INDEXES:
+        conn.execute(statement)
+
+
+def _natural_sort_keys(conn):
+    """Колонка sort_key для заданий и конспектов: каталоги сортируются индексом, а не в Python."""
+    for table in ('tasks', 'notes'):
+        add_column(conn, table, 'sort_key', 'TEXT')
+        rows = conn.execute(f'SELECT id, title FROM {table} WHERE sort_key IS NULL').fetchall()
+        conn.executemany(f'UPDATE {table} SET sort_key = ? WHERE id = ?',
+                         [(natural_sort_key(title), row_id) for row_id, title in rows])
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_exam_sort ON {table} (exam_type, sort_key, title)')
+
+
+def _broadcasts(conn):
+    """Таблицы рассылок: по строке на получателя, чтобы прерванную рассылку можно было продолжить."""
+    conn.execute(BROADCASTS_TABLE.format(table='broadcasts'))
+    conn.execute(BROADCAST_RECIPIENTS_TABLE.format(table='broadcast_recipients'))
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_broadcasts_status ON broadcasts (status)')
+
+
+def _outbox(conn):
+    """Очередь исходящих уведомлений: сообщение пишется в той же транзакции, что и изменение данных."""
+    conn.execute(OUTBOX_TABLE.format(table='outbox'))
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at)')
+
+
+def _student_pages(conn):
+    """Индекс для постраничного выбора учеников экзамена (keyset по id, см. database.get_students_page)."""
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_exam_id ON users (exam, id)')
+
+
+def _student_search(conn):
+    """Полнотекстовый поиск учеников (FTS5) и триггеры, поддерживающие индекс в актуальном состоянии."""
+    for statement in USERS_FTS:
+        conn.execute(statement)
+    # Индексируем учеников, добавленных до появления триггеров
+    # (contentless-таблицу FTS5 очищает только специальная команда 'delete-all')
+    conn.execute("INSERT INTO users_fts (users_fts) VALUES ('delete-all')")
+    conn.execute(f"INSERT INTO users_fts (rowid, name, description) "
+                 f"SELECT id, {_fts_text('name')}, {_fts_text('description')} FROM users")
+
+
+def _persistence(conn):
+    """Состояние диалогов и данные пользователей бота, чтобы перезапуск не прерывал начатые действия."""
+    conn.execute(PERSISTENCE_TABLE.format(table='persistence'))
+    conn.execute(CONVERSATIONS_TABLE.format(table='conversations'))
+
+
+# Миграции применяются строго по порядку. Номер версии схемы — длина списка,
+# поэтому новые миграции только добавляются в конец и никогда не меняются задним числом.
+MIGRATIONS = [
+    _base_schema,
+    _hot_indexes,
+    _natural_sort_keys,
+    _broadcasts,
+    _outbox,
+    _student_pages,
+    _student_search,
+    _persistence,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate():
+    """
+    Приводит схему базы к актуальной версии.
+
+    Текущая версия хранится в PRAGMA user_version. Если схема уже актуальна,
+    функция ограничивается одним чтением PRAGMA. Иначе все недостающие миграции
+    выполняются в одной транзакции: при ошибке база остаётся в исходном состоянии.
+
+    :return: Версия схемы после миграции.
+    """
+    with get_connection() as conn:
+        if conn.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+            return SCHEMA_VERSION
+
+        conn.execute('BEGIN IMMEDIATE')
+        # Перечитываем версию под блокировкой: её мог поднять другой процесс
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for migration in MIGRATIONS[version:]:
+            migration(conn)
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    return SCHEMA_VERSION
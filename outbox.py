@@ -0,0 +1,96 @@
+import asyncio
+import json
+import time
+
+from telegram import InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+from broadcast import broadcaster, retry_after_seconds
+from core.config import OUTBOX_INTERVAL, OUTBOX_BATCH, OUTBOX_MAX_ATTEMPTS, OUTBOX_BACKOFF, OUTBOX_MAX_BACKOFF, \
+    OUTBOX_FLUSH_TIMEOUT
+from repository import repo
+
+
+class OutboxDispatcher:
+    """
+    Отправка уведомлений из таблицы outbox.
+
+    Обработчики не обращаются к Telegram сами: уведомление записывается в outbox в той же
+    транзакции, что и изменение данных (см. database.assign_homework), а диспетчер,
+    запущенный в job queue приложения, периодически забирает готовые к отправке сообщения.
+    Отправленное сообщение удаляется из outbox. После ошибки сообщение откладывается
+    с экспоненциально растущей паузой, после max_attempts попыток помечается как failed.
+    Отправки расходуют общий с рассылками лимит скорости (broadcaster.limiter).
+    """
+
+    def __init__(self, batch=OUTBOX_BATCH, max_attempts=OUTBOX_MAX_ATTEMPTS, backoff=OUTBOX_BACKOFF,
+                 max_backoff=OUTBOX_MAX_BACKOFF, limiter=None):
+        self.batch = batch
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limiter = limiter or broadcaster.limiter
+        self._lock = asyncio.Lock()
+
+    def schedule(self, job_queue):
+        """Запускает периодическую отправку в job queue приложения."""
+        job_queue.run_repeating(self._job, interval=OUTBOX_INTERVAL, first=0, name="outbox")
+
+    def kick(self, job_queue):
+        """Просит отправить outbox сразу, не дожидаясь очередного запуска по расписанию."""
+        if job_queue is not None:
+            job_queue.run_once(self._job, 0, name="outbox-kick")
+
+    async def _job(self, context):
+        await self.dispatch(context.bot, wait=False)
+
+    async def dispatch(self, bot, wait=True):
+        """
+        Отправляет все сообщения, время которых подошло.
+
+        :param bot: Объект Bot.
+        :param wait: Если False и отправка уже идёт (например, предыдущий запуск job), сразу выходит.
+        :return: Количество обработанных сообщений.
+        """
+        if not wait and self._lock.locked():
+            return 0
+        processed = 0
+        async with self._lock:
+            while True:
+                messages = await repo.get_due_outbox_messages(time.time(), self.batch)
+                if not messages:
+                    return processed
+                await asyncio.gather(*(self._send(bot, *message) for message in messages))
+                processed += len(messages)
+
+    async def flush(self, bot, timeout=OUTBOX_FLUSH_TIMEOUT):
+        """Отправляет накопившиеся сообщения при остановке бота, но не дольше timeout секунд."""
+        try:
+            await asyncio.wait_for(self.dispatch(bot), timeout)
+        except asyncio.TimeoutError:
+            print("Не все уведомления отправлены до остановки: они будут отправлены после запуска.")
+
+    async def _send(self, bot, message_id, chat_id, text, markup, attempts):
+        reply_markup = InlineKeyboardMarkup.de_json(json.loads(markup), bot) if markup else None
+        await self.limiter.acquire()
+        try:
+            await bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
+        except RetryAfter as retry:
+            # Превышен лимит Telegram: попытку не засчитываем, откладываем на указанное время
+            delay = retry_after_seconds(retry.retry_after)
+            self.limiter.pause(delay)
+            await repo.reschedule_outbox_message(message_id, time.time() + delay, str(retry), count_attempt=False)
+        except (Forbidden, BadRequest) as rejected:
+            await repo.fail_outbox_message(message_id, str(rejected))
+        except TelegramError as error:
+            if attempts + 1 >= self.max_attempts:
+                await repo.fail_outbox_message(message_id, str(error))
+            else:
+                delay = min(self.max_backoff, self.backoff * 2 ** attempts)
+                await repo.reschedule_outbox_message(message_id, time.time() + delay, str(error))
+        else:
+            await repo.delete_outbox_message(message_id)
+
+
+# Общий экземпляр для всех обработчиков
+outbox = OutboxDispatcher()
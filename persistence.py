@@ -0,0 +1,149 @@
+import asyncio
+import json
+import pickle
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from core.config import PERSISTENCE_INTERVAL
+from repository import repo
+
+# Отметка в очереди записи: запись нужно удалить
+_DELETED = object()
+
+
+class SQLitePersistence(BasePersistence):
+    """
+    Хранение состояний ConversationHandler и context.user_data / chat_data в той же базе SQLite.
+
+    Без него перезапуск бота сбрасывает начатые диалоги: администратор, выбравший ученика или
+    введший ссылку на задание, оказывается «ни в одном состоянии». Данные загружаются один раз
+    при запуске приложения.
+
+    Запись отложенная (write-behind). Приложение раз в update_interval секунд передаёт только
+    изменившиеся с прошлого раза данные (см. Application.update_persistence); методы update_*
+    лишь запоминают их, а вся порция записывается одной транзакцией через писателя репозитория.
+    Обработка обновления базу не трогает вовсе. При штатной остановке остаток записывается
+    в flush; при аварийной теряются изменения не больше чем за update_interval секунд.
+
+    Значения хранятся в pickle, как в PicklePersistence: в user_data бывают множества и другие
+    объекты, которые не переводятся в JSON.
+    """
+
+    def __init__(self, store_data=None, update_interval=PERSISTENCE_INTERVAL):
+        # bot_data и callback_data бот не использует: не переписываем их каждые update_interval секунд
+        store_data = store_data or PersistenceInput(bot_data=False, callback_data=False)
+        super().__init__(store_data=store_data, update_interval=update_interval)
+        self._data = {}  # (kind, key) -> данные или _DELETED
+        self._conversations = {}  # (name, key) -> состояние или None (диалог завершён)
+        self._write_task = None
+        self._active = {}  # имя диалога -> ключи незавершённых диалогов (для отчёта о памяти)
+
+    async def _load(self, kind):
+        return {key: pickle.loads(data) for key, data in await repo.load_persistent_data(kind)}
+
+    async def get_user_data(self):
+        return await self._load('user')
+
+    async def get_chat_data(self):
+        return await self._load('chat')
+
+    async def get_bot_data(self):
+        return (await self._load('bot')).get(0, {})
+
+    async def get_callback_data(self):
+        return (await self._load('callback')).get(0)
+
+    async def get_conversations(self, name):
+        conversations = {tuple(json.loads(key)): pickle.loads(state)
+                         for key, state in await repo.load_conversations(name)}
+        self._active[name] = set(conversations)
+        return conversations
+
+    async def get_conversation(self, name, key):
+        """
+        Состояние одного диалога: из ещё не записанной порции или из базы. Через него IdleEvictor
+        возвращает в память диалог, выгруженный за неактивностью.
+
+        :return: Состояние или None, если диалога нет.
+        """
+        if (name, key) in self._conversations:
+            return self._conversations[(name, key)]
+        state = await repo.load_conversation(name, json.dumps(key))
+        return pickle.loads(state) if state is not None else None
+
+    async def update_user_data(self, user_id, data):
+        self._mark(self._data, ('user', user_id), data)
+
+    async def update_chat_data(self, chat_id, data):
+        self._mark(self._data, ('chat', chat_id), data)
+
+    async def update_bot_data(self, data):
+        self._mark(self._data, ('bot', 0), data)
+
+    async def update_callback_data(self, data):
+        self._mark(self._data, ('callback', 0), data)
+
+    async def update_conversation(self, name, key, new_state):
+        active = self._active.setdefault(name, set())
+        if new_state is None:
+            active.discard(key)
+        else:
+            active.add(key)
+        self._mark(self._conversations, (name, key), new_state)
+
+    async def drop_user_data(self, user_id):
+        self._mark(self._data, ('user', user_id), _DELETED)
+
+    async def drop_chat_data(self, chat_id):
+        self._mark(self._data, ('chat', chat_id), _DELETED)
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    def conversation_counts(self):
+        """Число незавершённых диалогов каждого ConversationHandler по последним сохранённым состояниям."""
+        return {name: len(keys) for name, keys in self._active.items()}
+
+    async def flush(self):
+        """Записывает всё накопленное. Вызывается приложением при остановке."""
+        if self._write_task is not None:
+            await self._write_task
+        await self._write()
+
+    def _mark(self, pending, key, value):
+        pending[key] = value
+        if self._write_task is None:
+            self._write_task = asyncio.get_running_loop().create_task(self._write_soon())
+
+    async def _write_soon(self):
+        # Приложение вызывает update_* для всех изменившихся записей одновременно (asyncio.gather):
+        # даём им всем отметиться и записываем порцию целиком
+        await asyncio.sleep(0)
+        self._write_task = None
+        await self._write()
+
+    async def _write(self):
+        if not self._data and not self._conversations:
+            return
+        data, self._data = self._data, {}
+        conversations, self._conversations = self._conversations, {}
+        try:
+            await repo.save_persistence(
+                [(kind, key, None if value is _DELETED else pickle.dumps(value))
+                 for (kind, key), value in data.items()],
+                [(name, json.dumps(key), None if state is None else pickle.dumps(state))
+                 for (name, key), state in conversations.items()],
+            )
+        except Exception as e:
+            # Вернём записи в очередь (если за это время не появились более новые) и повторим в следующий раз
+            print(f"Не удалось сохранить состояние бота: {e}")
+            for key, value in data.items():
+                self._data.setdefault(key, value)
+            for key, state in conversations.items():
+                self._conversations.setdefault(key, state)
@@ -0,0 +1,278 @@
+import logging
+import logging.handlers
+import os
+import sqlite3
+import sys
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from core.config import SLOW_QUERY_THRESHOLD, SLOW_QUERY_LOG, SLOW_QUERY_LOG_MAX_BYTES, SLOW_QUERY_LOG_BACKUPS, \
+    SLOW_QUERY_TOP
+
+# Файлы, кадры которых не считаются местом вызова: обвязка соединений и сам журнал
+_PLUMBING = (os.path.abspath(__file__), os.path.join(os.path.dirname(os.path.abspath(__file__)), "connection.py"))
+_PROJECT = os.path.dirname(os.path.abspath(__file__))
+# Общие обёртки, за которыми интереснее их вызывающий
+_HELPERS = frozenset({'db_execute'})
+# Запросы, для которых EXPLAIN QUERY PLAN имеет смысл
+_EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'WITH')
+
+
+def _normalize(sql):
+    return " ".join(sql.split())
+
+
+def _call_site(depth=3):
+    """Несколько ближайших кадров кода проекта, из которых выполняется запрос."""
+    frames = []
+    frame = sys._getframe(1)
+    while frame is not None and len(frames) < depth:
+        path = frame.f_code.co_filename
+        if path.startswith(_PROJECT) and path not in _PLUMBING and 'site-packages' not in path \
+                and frame.f_code.co_name not in _HELPERS:
+            frames.append(f"{os.path.relpath(path, _PROJECT)}:{frame.f_lineno} {frame.f_code.co_name}")
+        frame = frame.f_back
+    return " <- ".join(frames) or "?"
+
+
+class QueryTracer:
+    """
+    Замер времени каждого SQL-запроса и журнал медленных.
+
+    Соединения, открытые connection.open_connection при включённом журнале (threshold не None),
+    создаются как TracedConnection: время запроса — выполнение execute и чтение результата до конца
+    (fetch*, итерация) или до закрытия курсора; фиксация транзакции при выходе из with conn
+    замеряется как COMMIT. Для каждого текста запроса копятся число вызовов, суммарное и
+    максимальное время (top / report). Запросы дольше threshold записываются в ротируемый файл
+    вместе с планом (EXPLAIN QUERY PLAN на том же соединении) и местом вызова. Параметры запросов
+    в журнал не попадают: среди них пароли учеников.
+    """
+
+    def __init__(self, threshold=SLOW_QUERY_THRESHOLD, path=SLOW_QUERY_LOG, max_bytes=SLOW_QUERY_LOG_MAX_BYTES,
+                 backups=SLOW_QUERY_LOG_BACKUPS):
+        self.threshold = threshold
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._stats = {}  # текст запроса -> [вызовов, суммарное время, максимальное время, медленных]
+        self._plans = {}  # текст запроса -> план, уже записанный в журнал
+        self._lock = threading.Lock()
+        self._logger = None
+
+    @property
+    def enabled(self):
+        return self.threshold is not None
+
+    def record(self, conn, sql, params, elapsed):
+        """Учитывает выполненный запрос; медленный записывается в журнал."""
+        key = _normalize(sql)
+        slow = elapsed >= self.threshold
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = [0, 0.0, 0.0, 0]
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+            stats[3] += slow
+        if slow:
+            self._log(key, self._plan(conn, key, sql, params), elapsed)
+
+    def _plan(self, conn, key, sql, params):
+        plan = self._plans.get(key)
+        if plan is None:
+            if not key.upper().startswith(_EXPLAINABLE) or params is None:
+                return None
+            try:
+                # Курсор базового класса: сам EXPLAIN не замеряется
+                rows = sqlite3.Cursor(conn).execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+            except sqlite3.Error as error:
+                return f"недоступен: {error}"
+            plan = self._plans[key] = "; ".join(row[-1] for row in rows)
+        return plan
+
+    def _log(self, key, plan, elapsed):
+        with self._lock:
+            if self._logger is None:
+                # Файл создаётся при первом медленном запросе
+                handler = logging.handlers.RotatingFileHandler(self.path, maxBytes=self.max_bytes,
+                                                               backupCount=self.backups, encoding='utf-8')
+                handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+                self._logger = logging.getLogger("slow_queries")
+                self._logger.propagate = False
+                self._logger.setLevel(logging.INFO)
+                self._logger.addHandler(handler)
+        message = f"{elapsed * 1000:.1f} мс  {_call_site()}\n  {key}"
+        if plan:
+            message += f"\n  план: {plan}"
+        self._logger.info(message)
+
+    def top(self, limit=SLOW_QUERY_TOP):
+        """
+        Запросы с наибольшим суммарным временем.
+
+        :param limit: Сколько запросов вернуть.
+        :return: Список словарей с ключами sql, calls, total_ms, mean_ms, max_ms, slow.
+        """
+        with self._lock:
+            rows = sorted(self._stats.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        return [{'sql': sql, 'calls': calls, 'total_ms': round(total * 1000, 1),
+                 'mean_ms': round(total / calls * 1000, 3), 'max_ms': round(longest * 1000, 1), 'slow': slow}
+                for sql, (calls, total, longest, slow) in rows]
+
+    def report(self, limit=SLOW_QUERY_TOP, width=200):
+        """Текст отчёта по top: для команды /slow."""
+        lines = []
+        for number, row in enumerate(self.top(limit), 1):
+            sql = row['sql'] if len(row['sql']) <= width else row['sql'][:width - 1] + "…"
+            lines.append(f"{number}. {row['total_ms']} мс всего, {row['calls']} вызовов, среднее {row['mean_ms']} мс, "
+                         f"максимум {row['max_ms']} мс, медленных {row['slow']}\n{sql}")
+        return "\n\n".join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._plans.clear()
+
+    def close(self):
+        with self._lock:
+            if self._logger is not None:
+                for handler in list(self._logger.handlers):
+                    self._logger.removeHandler(handler)
+                    handler.close()
+                self._logger = None
+
+
+tracer = QueryTracer()
+
+
+class TracedCursor(sqlite3.Cursor):
+    """Курсор, который замеряет запрос от execute до конца чтения результата."""
+
+    _sql = None
+
+    def _finish(self, explain=True):
+        if self._sql is not None:
+            sql, self._sql = self._sql, None
+            self.connection.pending.discard(self)
+            tracer.record(self.connection, sql, self._params if explain else None, self._elapsed)
+
+    def _timed(self, method, sql, params, plan_params):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            result = method(sql, params)
+        except BaseException:
+            self._sql, self._params, self._elapsed = sql, None, time.perf_counter() - started
+            self._finish()
+            raise
+        self._sql, self._params, self._elapsed = sql, plan_params, time.perf_counter() - started
+        if self.description is None:
+            self._finish()  # Запрос без строк результата выполнен полностью
+        else:
+            self.connection.pending.add(self)
+        return result
+
+    def execute(self, sql, params=()):
+        return self._timed(super().execute, sql, params, params)
+
+    def executemany(self, sql, seq_of_params):
+        # Для плана нужен один набор параметров: у итератора его не взять, не израсходовав
+        seq_of_params = seq_of_params if isinstance(seq_of_params, (list, tuple)) else list(seq_of_params)
+        return self._timed(super().executemany, sql, seq_of_params, seq_of_params[0] if seq_of_params else None)
+
+    def executescript(self, script):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            return super().executescript(script)
+        finally:
+            tracer.record(self.connection, script, None, time.perf_counter() - started)
+
+    def _fetch(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            if self._sql is not None:
+                self._elapsed += time.perf_counter() - started
+
+    def fetchone(self):
+        row = self._fetch(super().fetchone)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        rows = self._fetch(super().fetchmany, size)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(super().fetchall)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            return self._fetch(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # Курсор собран сборщиком мусора: соединение могло уже уйти другому потоку, поэтому
+        # учитывается только время, без EXPLAIN (обычно замер завершает TracedConnection.statements)
+        self._finish(explain=False)
+
+
+class TracedConnection(sqlite3.Connection):
+    """Соединение, все запросы которого идут через TracedCursor (см. QueryTracer)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pending = weakref.WeakSet()  # Курсоры, результат которых прочитан не до конца
+
+    @contextmanager
+    def statements(self):
+        """
+        Завершает замер запросов, начатых в блоке with, при выходе из него — пока соединение ещё
+        у этого потока. Так медленный запрос, результат которого прочитан одним fetchone и курсор
+        не закрыт, получает план на своём соединении, а не в __del__ неизвестно когда.
+        """
+        before = set(self.pending)
+        try:
+            yield self
+        finally:
+            for cursor in list(self.pending):
+                if cursor not in before:
+                    cursor._finish()
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None or not self.in_transaction:
+            return super().__exit__(exc_type, exc_value, traceback)
+        started = time.perf_counter()
+        try:
+            return super().__exit__(exc_type, exc_value, traceback)
+        finally:
+            tracer.record(self, "COMMIT", None, time.perf_counter() - started)
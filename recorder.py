@@ -0,0 +1,97 @@
+import json
+import os
+import sqlite3
+import time
+
+from telegram import Update
+from telegram.ext import TypeHandler
+
+from core.config import DB_PATH, RECORD_UPDATES_DIR, RECORD_FLUSH_INTERVAL
+
+# Флаги служебных сообщений, которые python-telegram-bot выводит в to_dict всегда; false в Bot API
+# равносилен отсутствию поля, поэтому в запись они попадают, только если выставлены
+_MESSAGE_FLAGS = ('channel_chat_created', 'delete_chat_photo', 'group_chat_created', 'supergroup_chat_created')
+
+
+class UpdateRecorder:
+    """
+    Запись входящих обновлений для воспроизведения (benchmarks.replay).
+
+    При запуске (start) делается снимок базы, затем обработчик из handler() в группе -2 — раньше
+    всех остальных — дописывает каждое обновление строкой JSON: {"t": время получения (unix, с),
+    "update": обновление в формате Bot API}. Снимок и запись называются одинаково (updates-<время
+    запуска>.db и .jsonl), поэтому воспроизведение начинается с того же состояния базы и диалогов,
+    что было у бота. Время — начало обработки обновления: если чат ещё занят предыдущими, оно
+    позже прихода обновления.
+
+    Запись содержит всё, что присылают пользователи, в том числе пароли учеников: храните её
+    так же, как саму базу.
+    """
+
+    def __init__(self, directory=RECORD_UPDATES_DIR, flush_interval=RECORD_FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.recorded = 0
+        self.path = None
+        self._file = None
+        self._flushed = 0.0
+
+    def start(self, db_path=DB_PATH):
+        """
+        Делает снимок базы и открывает файл записи. Вызывается до запуска приложения,
+        пока обновления ещё не обрабатываются.
+
+        :return: Путь к файлу записи.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, time.strftime("updates-%Y%m%d-%H%M%S"))
+        source, snapshot = sqlite3.connect(db_path), sqlite3.connect(f"{base}.db")
+        try:
+            source.backup(snapshot)
+        finally:
+            snapshot.close()
+            source.close()
+        self.path = f"{base}.jsonl"
+        self._file = open(self.path, 'a', encoding='utf-8')
+        return self.path
+
+    def handler(self):
+        """Обработчик для группы -2: записывает обновление до остальных обработчиков."""
+        return TypeHandler(Update, self._record)
+
+    async def _record(self, update, context):
+        if self._file is None:
+            return
+        data = update.to_dict()
+        for message in data.values():
+            if isinstance(message, dict):
+                for flag in _MESSAGE_FLAGS:
+                    if message.get(flag) is False:
+                        del message[flag]
+        record = {'t': round(time.time(), 3), 'update': data}
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.recorded += 1
+        now = time.monotonic()
+        if now - self._flushed >= self.flush_interval:
+            self._file.flush()
+            self._flushed = now
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_recording(path):
+    """
+    Читает запись обновлений.
+
+    :param path: Файл, записанный UpdateRecorder.
+    :return: Список (время получения, обновление в формате Bot API) в порядке записи.
+    """
+    with open(path, encoding='utf-8') as file:
+        records = [json.loads(line) for line in file if line.strip()]
+    return [(record['t'], record['update']) for record in records]
+
+
+recorder = UpdateRecorder()
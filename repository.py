@@ -0,0 +1,255 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+from cache import StudentCache
+from core.config import DB_POOL_SIZE
+from writer import WriteQueue
+
+
+class Repository:
+    """
+    Асинхронный доступ к базе данных для обработчиков.
+
+    Обращения к SQLite не выполняются в цикле событий, поэтому медленный запрос не блокирует
+    обработку обновлений других пользователей. Чтения идут параллельно на потоках-исполнителях
+    через соединения пула, а все изменения проходят через единственного писателя (WriteQueue).
+    Методы повторяют функции database.py и возвращают те же значения.
+
+    Записи учеников кэшируются по Telegram ID (StudentCache); каждый метод, меняющий
+    данные ученика, сбрасывает его запись после фиксации изменения. Об изменениях
+    каталогов (tasks, notes, variants) репозиторий сообщает подписчикам (см. subscribe).
+    """
+
+    def __init__(self, writer=None, student_cache=None):
+        self._executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="sqlite")
+        self.writer = writer or WriteQueue()
+        self.student_cache = student_cache or StudentCache()
+        self._listeners = []
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+
+    async def _write(self, func, *args):
+        return await self.writer.submit(func, *args)
+
+    async def start(self):
+        self.writer.start()
+
+    async def stop(self):
+        await self.writer.stop()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def subscribe(self, listener):
+        """
+        Регистрирует обработчик изменений каталогов.
+
+        :param listener: Функция listener(table, exam), вызывается после фиксации изменения
+                         в таблице tasks, notes или variants для указанного экзамена.
+        """
+        self._listeners.append(listener)
+
+    def _changed(self, table, exam):
+        for listener in self._listeners:
+            listener(table, exam)
+
+    # Ученики
+
+    async def get_student_by_tg(self, telegram_id):
+        student = self.student_cache.get(telegram_id)
+        if student is None:
+            version = self.student_cache.version
+            student = await self._run(database.get_student_by_telegram_id, telegram_id)
+            if student is not None:
+                self.student_cache.put(telegram_id, student, version)
+        return student
+
+    async def get_user_by_password(self, password):
+        return await self._run(database.get_user_by_password, password)
+
+    async def update_user_telegram_id(self, user_id, telegram_id):
+        try:
+            return await self._write(database.update_user_telegram_id, user_id, telegram_id)
+        finally:
+            self.student_cache.invalidate_student(user_id)
+            self.student_cache.invalidate(telegram_id)
+
+    async def get_all_users(self):
+        return await self._run(database.get_all_users)
+
+    async def get_students_page(self, cursor_id=0, backward=False, limit=20, exam=None):
+        return await self._run(database.get_students_page, cursor_id, backward, limit, exam)
+
+    async def search_students(self, text, limit=20):
+        return await self._run(database.search_students, text, limit)
+
+    async def get_student_info(self, student_id):
+        return await self._run(database.get_student_info, student_id)
+
+    async def get_user_exam(self, student_id):
+        return await self._run(database.get_user_exam, student_id)
+
+    async def get_exam_telegram_ids(self, exam):
+        return await self._run(database.get_exam_telegram_ids, exam)
+
+    async def get_exam_students(self, exam):
+        return await self._run(database.get_exam_students, exam)
+
+    async def add_user(self, name, exam, class_date=None, class_link=None):
+        return await self._write(database.add_user, name, exam, class_date, class_link)
+
+    async def delete_user_by_id(self, student_id):
+        try:
+            return await self._write(database.delete_user_by_id, student_id)
+        finally:
+            self.student_cache.invalidate_student(student_id)
+
+    async def update_student_field(self, student_id, field, value):
+        try:
+            return await self._write(database.update_student_field, student_id, field, value)
+        finally:
+            self.student_cache.invalidate_student(student_id)
+
+    async def assign_homework(self, student_id, homework, notification=None, reply_markup=None):
+        markup = reply_markup.to_json() if reply_markup else None
+        try:
+            return await self._write(database.assign_homework, student_id, homework, notification, markup)
+        finally:
+            self.student_cache.invalidate_student(student_id)
+
+    async def assign_homework_bulk(self, student_ids, homework, notification=None, reply_markup=None):
+        markup = reply_markup.to_json() if reply_markup else None
+        try:
+            return await self._write(database.assign_homework_bulk, list(student_ids), homework, notification, markup)
+        finally:
+            for student_id in student_ids:
+                self.student_cache.invalidate_student(student_id)
+
+    # Варианты
+
+    async def set_variant_link(self, exam, link):
+        result = await self._write(database.set_variant_link, exam, link)
+        self._changed('variants', exam)
+        return result
+
+    async def get_variant_link(self, exam):
+        return await self._run(database.get_variant_link, exam)
+
+    # Задания
+
+    async def add_task(self, title, link, exam_type):
+        result = await self._write(database.add_task, title, link, exam_type)
+        self._changed('tasks', exam_type)
+        return result
+
+    async def get_task_by_id(self, task_id):
+        return await self._run(database.get_task_by_id, task_id)
+
+    async def get_tasks_by_exam(self, exam_type):
+        return await self._run(database.get_tasks_by_exam, exam_type)
+
+    async def get_task_titles(self, exam_type):
+        return await self._run(database.get_task_titles, exam_type)
+
+    async def is_task_title_unique(self, title, exam_type):
+        return await self._run(database.is_task_title_unique, title, exam_type)
+
+    async def update_task_field(self, task_id, field, value):
+        exam_type = await self._write(database.update_task_field, task_id, field, value)
+        if exam_type:
+            self._changed('tasks', exam_type)
+        return exam_type
+
+    async def delete_task(self, task_id):
+        deleted = await self._write(database.delete_task, task_id)
+        if deleted:
+            self._changed('tasks', deleted[1])
+        return deleted
+
+    # Конспекты
+
+    async def add_note(self, title, link, exam_type):
+        result = await self._write(database.add_note, title, link, exam_type)
+        self._changed('notes', exam_type)
+        return result
+
+    async def get_notes_by_exam(self, exam_type):
+        return await self._run(database.get_notes_by_exam, exam_type)
+
+    async def get_note_titles(self, exam_type):
+        return await self._run(database.get_note_titles, exam_type)
+
+    async def is_note_title_unique(self, title, exam_type):
+        return await self._run(database.is_note_title_unique, title, exam_type)
+
+    async def update_note_field(self, note_id, field, value):
+        exam_type = await self._write(database.update_note_field, note_id, field, value)
+        if exam_type:
+            self._changed('notes', exam_type)
+        return exam_type
+
+    async def delete_note(self, note_id):
+        deleted = await self._write(database.delete_note, note_id)
+        if deleted:
+            self._changed('notes', deleted[1])
+        return deleted
+
+    # Рассылки
+
+    async def create_broadcast(self, text, reply_markup, telegram_ids, admin_chat_id=None):
+        return await self._write(database.create_broadcast, text, reply_markup, telegram_ids, admin_chat_id)
+
+    async def get_broadcast(self, broadcast_id):
+        return await self._run(database.get_broadcast, broadcast_id)
+
+    async def get_unfinished_broadcasts(self):
+        return await self._run(database.get_unfinished_broadcasts)
+
+    async def get_pending_broadcast_recipients(self, broadcast_id):
+        return await self._run(database.get_pending_broadcast_recipients, broadcast_id)
+
+    async def get_broadcast_progress(self, broadcast_id):
+        return await self._run(database.get_broadcast_progress, broadcast_id)
+
+    async def mark_broadcast_recipient(self, broadcast_id, telegram_id, status, error=None):
+        return await self._write(database.mark_broadcast_recipient, broadcast_id, telegram_id, status, error)
+
+    async def finish_broadcast(self, broadcast_id):
+        return await self._write(database.finish_broadcast, broadcast_id)
+
+    # Outbox
+
+    async def get_due_outbox_messages(self, now, limit):
+        return await self._run(database.get_due_outbox_messages, now, limit)
+
+    async def delete_outbox_message(self, message_id):
+        return await self._write(database.delete_outbox_message, message_id)
+
+    async def reschedule_outbox_message(self, message_id, next_attempt_at, error, count_attempt=True):
+        return await self._write(database.reschedule_outbox_message, message_id, next_attempt_at, error,
+                                 count_attempt)
+
+    async def fail_outbox_message(self, message_id, error):
+        return await self._write(database.fail_outbox_message, message_id, error)
+
+    # Состояние бота (persistence.SQLitePersistence)
+
+    async def load_persistent_data(self, kind):
+        return await self._run(database.load_persistent_data, kind)
+
+    async def load_conversations(self, name):
+        return await self._run(database.load_conversations, name)
+
+    async def load_conversation(self, name, key):
+        return await self._run(database.load_conversation, name, key)
+
+    async def save_persistence(self, data, conversations):
+        return await self._write(database.save_persistence, data, conversations)
+
+
+# Общий экземпляр для всех обработчиков
+repo = Repository()
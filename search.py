@@ -0,0 +1,119 @@
+from collections import defaultdict
+from itertools import islice
+
+from repository import repo
+
+
+def _fold(text):
+    """Приводит текст к виду для сравнения: без учёта регистра и различия «ё»/«е»."""
+    return text.casefold().replace('ё', 'е')
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TitleIndex:
+    """
+    Индекс названий одного каталога (заданий или конспектов одного экзамена) в памяти.
+
+    Запрос из трёх и более символов ищется как подстрока: кандидаты — пересечение списков
+    позиций всех триграмм запроса, затем подстрока проверяется у каждого кандидата.
+    Более короткий запрос ищется как начало любого слова названия.
+    """
+
+    def __init__(self, items):
+        """
+        :param items: Список (id, title, link) в порядке вывода (естественная сортировка названий).
+        """
+        self.items = items
+        self._titles = [_fold(title) for _, title, _ in items]
+        self._trigrams = defaultdict(set)
+        self._prefixes = defaultdict(set)
+        for position, title in enumerate(self._titles):
+            for trigram in _trigrams(title):
+                self._trigrams[trigram].add(position)
+            for word in title.split():
+                self._prefixes[word[:1]].add(position)
+                self._prefixes[word[:2]].add(position)
+
+    def search(self, text, limit):
+        """
+        :return: Список (id, title, link) подходящих элементов в порядке каталога, не больше limit.
+        """
+        text = _fold(text).strip()
+        if not text:
+            return self.items[:limit]
+        if len(text) < 3:
+            return self._first(self._prefixes.get(text, set()), limit)
+
+        candidates = None
+        for trigram in _trigrams(text):
+            found = self._trigrams.get(trigram)
+            if not found:
+                return []
+            candidates = found if candidates is None else candidates & found
+        return self._first(candidates, limit, text)
+
+    def _first(self, candidates, limit, text=None):
+        # Если кандидатов много, быстрее пройти каталог по порядку и остановиться на limit-м совпадении,
+        # чем сортировать всё множество
+        ordered = sorted(candidates) if len(candidates) <= 8 * limit else range(len(self.items))
+        matches = (position for position in ordered
+                   if position in candidates and (text is None or text in self._titles[position]))
+        return [self.items[position] for position in islice(matches, limit)]
+
+
+class CatalogSearch:
+    """
+    Поиск по названиям заданий и конспектов для inline-режима.
+
+    Индекс каждого каталога (таблица, экзамен) строится из базы при первом запросе.
+    При добавлении, изменении или удалении задания или конспекта репозиторий сообщает
+    об изменении (см. Repository.subscribe), и перестраивается только индекс этого каталога.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._indexes = {}  # (table, exam) -> TitleIndex
+
+    def invalidate(self, table, exam):
+        self.version += 1
+        self._indexes.pop((table, exam), None)
+
+    async def _index(self, table, exam):
+        index = self._indexes.get((table, exam))
+        if index is None:
+            version = self.version
+            if table == 'tasks':
+                items = await repo.get_tasks_by_exam(exam)
+            else:
+                items = await repo.get_notes_by_exam(exam)
+            index = TitleIndex(items)
+            # Если каталог изменился, пока индекс строился, не сохраняем устаревший индекс
+            if version == self.version:
+                self._indexes[(table, exam)] = index
+        return index
+
+    async def search(self, exams, text, limit):
+        """
+        Ищет задания и конспекты по части названия.
+
+        :param exams: Экзамены, по каталогам которых идёт поиск.
+        :param text: Строка поиска (пустая — первые элементы каталогов).
+        :param limit: Максимальное количество результатов.
+        :return: Список (table, id, title, link): сначала задания, затем конспекты.
+        """
+        results = []
+        for table in ('tasks', 'notes'):
+            for exam in exams:
+                index = await self._index(table, exam)
+                for item_id, title, link in index.search(text, limit - len(results)):
+                    results.append((table, item_id, title, link))
+                if len(results) >= limit:
+                    return results
+        return results
+
+
+catalog_search = CatalogSearch()
+repo.subscribe(catalog_search.invalidate)
@@ -1,7 +1,22 @@
 import random
+import re
 import string
 
 
 # Функция для генерации случайного пароля
 def generate_password(length=8):
     return ''.join(random.choice(string.ascii_letters + string.digits) for _ in range(length))
+
+
+_NUMBER_RE = re.compile(r'\d+')
+
+
+# Ключ естественной сортировки: "Задание 2" < "Задание 10" при обычном сравнении строк.
+# Каждое число заменяется на свою длину (две цифры) и само число без ведущих нулей,
+# поэтому более короткое число всегда меньше длинного, а числа одной длины сравниваются посимвольно.
+def natural_sort_key(title):
+    def encode(match):
+        number = match.group().lstrip('0') or '0'
+        return f"{len(number):02d}{number}"
+
+    return _NUMBER_RE.sub(encode, title.casefold())
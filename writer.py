@@ -0,0 +1,119 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from connection import get_pool, open_connection, use_connection
+from core.config import WRITER_FLUSH_INTERVAL, WRITER_MAX_BATCH
+
+
+class WriteQueue:
+    """
+    Единственный писатель в базу с групповой фиксацией (group commit).
+
+    Все изменения ставятся в asyncio-очередь и выполняются одним потоком на отдельном
+    соединении. Писатель собирает операции, пришедшие в течение flush_interval секунд
+    (но не больше max_batch), и фиксирует их одной транзакцией — один fsync на пачку
+    вместо одного на каждую запись и никаких "database is locked" между писателями.
+
+    Если путь не указан, писатель работает с той же базой, что и пул соединений.
+    Каждая операция выполняется внутри собственного SAVEPOINT: ошибка в одной операции
+    откатывает только её, остальные операции пачки фиксируются.
+    """
+
+    def __init__(self, path=None, flush_interval=WRITER_FLUSH_INTERVAL, max_batch=WRITER_MAX_BATCH):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue = None
+        self._task = None
+        self._executor = None
+        self._conn = None
+
+    def start(self):
+        """Запускает задачу писателя в текущем цикле событий."""
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-writer")
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Дожидается записи всех поставленных операций и останавливает писателя."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close_connection)
+        self._executor.shutdown(wait=True)
+        self._task = None
+        self._queue = None
+
+    async def submit(self, func, *args):
+        """
+        Ставит операцию в очередь на запись.
+
+        :param func: Функция database.py, выполняющая изменение.
+        :param args: Аргументы функции.
+        :return: Результат функции после того, как пачка с ней зафиксирована на диске.
+        """
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((functools.partial(func, *args), future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                try:
+                    item = self._queue.get_nowait() if timeout <= 0 else \
+                        await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                results = await loop.run_in_executor(self._executor, self._commit_batch, [op for op, _ in batch])
+            except Exception as error:
+                results = [error] * len(batch)
+
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _commit_batch(self, operations):
+        if self._conn is None:
+            # Писатель фиксирует с FULL: пачка подтверждается вызывающим только после fsync
+            self._conn = open_connection(self.path or get_pool().path, synchronous="FULL")
+
+        results = []
+        with use_connection(self._conn), self._conn:
+            self._conn.execute('BEGIN IMMEDIATE')
+            for operation in operations:
+                self._conn.execute('SAVEPOINT write_op')
+                try:
+                    results.append(operation())
+                except Exception as error:
+                    self._conn.execute('ROLLBACK TO write_op')
+                    results.append(error)
+                self._conn.execute('RELEASE write_op')
+        return results
+
+    def _close_connection(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None